@@ -0,0 +1,285 @@
+import os
+import csv
+import json
+import time
+import queue
+import shutil
+import platform
+import itertools
+import multiprocessing as mp
+import cv2
+import numpy as np
+from frame_extractor import (ExtractionConfig, ProgressCallback, STAGES, SHARPNESS_PRESETS, TOPOLOGIES, PROCESSING_MODES,
+                             OUTPUT_FORMATS, OUTPUT_CONTAINERS, extract_frames, output_costs, peak_rss_mb)
+
+# 🧪 Synthetic test videos
+BENCH_FPS = 30
+BENCH_FRAMES = 150
+BENCH_SEED = 1234
+BENCH_RESOLUTIONS = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080), "2160p": (3840, 2160)}
+BENCH_CODECS = {"mp4v": ".mp4", "MJPG": ".avi"}
+BLUR_PROFILES = ("sharp", "blurry", "mixed")
+
+# Default matrix; every option can be overridden from the command line
+BENCH_VIDEOS = ["720p/mp4v/mixed"]
+BENCH_WORKERS = [1, 2, 4]
+BENCH_STEPS = [1, 5]
+BENCH_SCORING = ["Exact", "Fast"]
+BENCH_TOPOLOGIES = ["seek", "ring"]
+BENCH_PROCESSING_MODES = ["CPU"]
+# format[:quality or PNG level][/container], e.g. jpg:80, png:1, webp:80/tar, npy/stack
+BENCH_OUTPUTS = ["jpg"]
+BENCH_TOLERANCE = 0.10
+
+RESULT_FIELDS = ["video", "resolution", "codec", "blur", "workers", "topology", "step", "scoring", "processing_mode", "backend", "output", "frames", "saved",
+                 "time", "fps", "output_bytes", "encode_ms", "write_ms", "kb_per_frame", "peak_rss_mb", "worker_peak_rss_mb"] + [f"{stage}_s" for stage in STAGES]
+
+class QuietProgress(ProgressCallback):
+    def log(self, msg):
+        pass
+
+def blur_sigma(profile, index):
+    # "mixed" cycles sharp / soft / very blurry every half second so the threshold has something to reject
+    if profile == "sharp":
+        return 0.0
+    if profile == "blurry":
+        return 4.0
+    return (0.0, 1.5, 4.0)[(index // (BENCH_FPS // 2)) % 3]
+
+def synthetic_frame(texture, index, size, profile):
+    # A slow diagonal pan over a fixed noise texture, so consecutive frames differ like real footage
+    width, height = size
+    x, y = (index * 3) % (texture.shape[1] - width), (index * 2) % (texture.shape[0] - height)
+    frame = texture[y:y + height, x:x + width].copy()
+    cv2.putText(frame, f"{index:05}", (20, height - 20), cv2.FONT_HERSHEY_SIMPLEX, height / 360, (255, 255, 255), 2)
+    sigma = blur_sigma(profile, index)
+    if sigma:
+        frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+    return frame
+
+def make_synthetic_video(path, resolution, codec, profile, frames=BENCH_FRAMES, seed=BENCH_SEED):
+    # Same seed and parameters always produce the same pixels; existing files are reused
+    if os.path.isfile(path):
+        return path
+    size = BENCH_RESOLUTIONS[resolution]
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (size[1] // 4 + 64, size[0] // 4 + 64, 3), dtype=np.uint8)
+    texture = cv2.resize(noise, (noise.shape[1] * 4, noise.shape[0] * 4), interpolation=cv2.INTER_CUBIC)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = cv2.VideoWriter(path + ".part" + BENCH_CODECS[codec], cv2.VideoWriter_fourcc(*codec), BENCH_FPS, size)
+    if not writer.isOpened():
+        raise ValueError(f"Codec '{codec}' is not available in this OpenCV build.")
+    for index in range(frames):
+        writer.write(synthetic_frame(texture, index, size, profile))
+    writer.release()
+    os.replace(path + ".part" + BENCH_CODECS[codec], path)
+    return path
+
+def parse_video_spec(spec):
+    resolution, codec, profile = spec.split("/")
+    if resolution not in BENCH_RESOLUTIONS or codec not in BENCH_CODECS or profile not in BLUR_PROFILES:
+        raise ValueError(f"Unknown video spec '{spec}' (expected resolution/codec/blur, e.g. 720p/mp4v/mixed).")
+    return resolution, codec, profile
+
+def video_name(resolution, codec, profile, frames):
+    return f"{resolution}_{codec}_{profile}_{frames}{BENCH_CODECS[codec]}"
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            # Allocated size where the OS reports it, so a sparse frames.npy counts what is actually written
+            st = os.stat(os.path.join(root, name))
+            total += st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+    return total
+
+def parse_output_spec(spec):
+    # "png:1/tar" -> ExtractionConfig output fields
+    fmt, _, container = spec.partition("/")
+    fmt, _, level = fmt.partition(":")
+    container = container or "files"
+    if fmt not in OUTPUT_FORMATS or container not in OUTPUT_CONTAINERS or (level and not level.isdigit()):
+        raise ValueError(f"Unknown output spec '{spec}' (expected format[:level][/container], e.g. jpg:80/tar).")
+    settings = {"output_format": fmt, "container": container}
+    if level:
+        settings["png_compression" if fmt == "png" else "quality"] = int(level)
+    return settings
+
+def run_case(case, results):
+    try:
+        results.put(measure_in_process(case))
+    except Exception as e:
+        # Reported instead of raised, so the parent doesn't wait forever for a result
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+def measure_in_process(case):
+    output_dir = case["output_dir"]
+    shutil.rmtree(output_dir, ignore_errors=True)
+    config = ExtractionConfig(
+        video_path=case["video_path"],
+        output_dir=output_dir,
+        fps=BENCH_FPS / case["step"],
+        blur_scoring=case["scoring"],
+        reset=True,
+        use_multicore=case["workers"] > 1,
+        worker_count=case["workers"],
+        topology=case["topology"],
+        processing_mode=case["processing_mode"],
+        session_path=os.path.join(output_dir, "session.json"),
+        memory_budget_mb=case["memory_budget"],
+        **parse_output_spec(case["output"])
+    )
+    start = time.perf_counter()
+    summary = extract_frames(config, QuietProgress())
+    elapsed = time.perf_counter() - start
+    encode_ms, write_ms, frame_bytes = output_costs(summary["stages"], directory_size(output_dir))
+    # Largest single process: the in-process run, or the busiest pool worker
+    peaks = [stats["peak_rss_mb"] for stats in summary.get("workers", {}).values()] or [summary.get("peak_rss_mb")]
+    peaks = [peak for peak in peaks if peak is not None]
+    return {"encode_ms": round(encode_ms, 3), "write_ms": round(write_ms, 3), "kb_per_frame": round(frame_bytes / 1024, 1), "frames": summary["frames"], "saved": summary["saved"], "time": elapsed, "backend": summary["backend"],
+            "stages": summary["stages"], "output_bytes": directory_size(output_dir), "peak_rss_mb": peak_rss_mb(children=True),
+            "worker_peak_rss_mb": max(peaks) if peaks else None}
+
+def measure_case(case):
+    # Each case runs in a fresh process so peak RSS belongs to that case alone
+    results = mp.Queue()
+    process = mp.Process(target=run_case, args=(case, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # Died without reporting, e.g. killed or crashed in native code; one last look for a late result
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            result = {"error": f"benchmark process exited with code {process.exitcode}"}
+        break
+    process.join()
+    shutil.rmtree(case["output_dir"], ignore_errors=True)
+    return result
+
+def run_matrix(videos, workers, steps, scorings, out_dir, frames=BENCH_FRAMES, topologies=BENCH_TOPOLOGIES,
+               processing_modes=BENCH_PROCESSING_MODES, outputs=BENCH_OUTPUTS, memory_budget=0, log=print):
+    rows = []
+    for spec in videos:
+        resolution, codec, profile = parse_video_spec(spec)
+        video_path = make_synthetic_video(os.path.join(out_dir, "videos", video_name(resolution, codec, profile, frames)),
+                                          resolution, codec, profile, frames)
+        for worker_count, topology, step, scoring, processing_mode, output in itertools.product(workers, topologies, steps, scorings,
+                                                                                             processing_modes, outputs):
+            # A single worker runs in-process, where the topology makes no difference
+            if worker_count == 1 and topology != topologies[0]:
+                continue
+            case = {"video_path": video_path, "workers": worker_count, "topology": topology, "step": step, "scoring": scoring,
+                    "processing_mode": processing_mode, "output": output, "memory_budget": memory_budget,
+                    "output_dir": os.path.join(out_dir, "run")}
+            result = measure_case(case)
+            if "error" in result:
+                log(f"{spec:>18} | workers {worker_count:>2} {topology:>4} | step {step:>3} | {scoring:>9} | {output} | ❌ {result['error']}")
+                continue
+            row = {"video": spec, "resolution": resolution, "codec": codec, "blur": profile,
+                   "workers": worker_count, "topology": topology, "step": step, "scoring": scoring,
+                   "processing_mode": processing_mode, "backend": result["backend"], "output": output,
+                   "frames": result["frames"], "saved": result["saved"], "time": round(result["time"], 3),
+                   "fps": round(result["frames"] / result["time"], 1) if result["time"] else 0.0,
+                   "output_bytes": result["output_bytes"], "encode_ms": result["encode_ms"], "write_ms": result["write_ms"],
+                   "kb_per_frame": result["kb_per_frame"], "peak_rss_mb": result["peak_rss_mb"],
+                   "worker_peak_rss_mb": result["worker_peak_rss_mb"]}
+            for stage, entry in result["stages"].items():
+                row[f"{stage}_s"] = entry["time"]
+            rows.append(row)
+            log(f"{spec:>18} | workers {worker_count:>2} {topology:>4} | step {step:>3} | {scoring:>9} | {row['backend']} | {output} | {row['fps']:>8} frames/s | "
+                f"saved {row['saved']:>4} | {row['output_bytes'] / 1e6:.1f} MB | encode {row['encode_ms']} ms/frame | peak {row['peak_rss_mb']} MB, "
+                f"{row['worker_peak_rss_mb']} MB per process")
+    return rows
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            "opencv": cv2.__version__, "numpy": np.__version__}
+
+def write_results(rows, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    json_path = os.path.join(out_dir, "results.json")
+    with open(json_path, "w") as f:
+        json.dump({"machine": machine_info(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": rows}, f, indent=2)
+    csv_path = os.path.join(out_dir, "results.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+def case_key(row):
+    return (row["video"], row["workers"], row.get("topology", "seek"), row["step"], row["scoring"], row.get("processing_mode", "CPU"),
+            row.get("output", "jpg"))
+
+def compare_to_baseline(rows, baseline, tolerance=BENCH_TOLERANCE):
+    # Throughput change per case present in both runs; a drop beyond the tolerance is a regression
+    previous = {case_key(row): row for row in baseline["results"]}
+    changes = []
+    for row in rows:
+        old = previous.get(case_key(row))
+        if not old or not old["fps"]:
+            continue
+        change = (row["fps"] - old["fps"]) / old["fps"]
+        changes.append({"case": case_key(row), "baseline_fps": old["fps"], "fps": row["fps"],
+                        "change": round(change, 3), "regression": change < -tolerance})
+    return changes
+
+def split_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+def add_benchmark_args(parser):
+    parser.add_argument("-o", "--output", default="benchmark", help="folder for synthetic videos and results (default: benchmark)")
+    parser.add_argument("--videos", default=",".join(BENCH_VIDEOS),
+                        help=f"comma-separated resolution/codec/blur specs; resolutions {', '.join(BENCH_RESOLUTIONS)}, "
+                             f"codecs {', '.join(BENCH_CODECS)}, blur {', '.join(BLUR_PROFILES)}")
+    parser.add_argument("--frames", type=int, default=BENCH_FRAMES, help="frames per synthetic video")
+    parser.add_argument("--workers", default=",".join(map(str, BENCH_WORKERS)), help="comma-separated worker counts")
+    parser.add_argument("--topology", default=",".join(BENCH_TOPOLOGIES), help=f"comma-separated multi-core topologies from {', '.join(TOPOLOGIES)}")
+    parser.add_argument("--processing-mode", default=",".join(BENCH_PROCESSING_MODES), help=f"comma-separated modes from {', '.join(PROCESSING_MODES)}")
+    parser.add_argument("--outputs", default=",".join(BENCH_OUTPUTS),
+                        help="comma-separated output specs format[:quality or PNG level][/container], e.g. jpg:80,png:1,npy/stack")
+    parser.add_argument("--steps", default=",".join(map(str, BENCH_STEPS)), help="comma-separated frame steps")
+    parser.add_argument("--scoring", default=",".join(BENCH_SCORING), help=f"comma-separated presets from {', '.join(SHARPNESS_PRESETS)}")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB", help="memory budget applied to every case (default: none)")
+    parser.add_argument("--baseline", help="results.json from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE, help="allowed fractional fps drop before a case counts as a regression")
+
+def run_benchmark(args):
+    scorings = split_list(args.scoring)
+    unknown = [name for name in scorings if name not in SHARPNESS_PRESETS]
+    if unknown:
+        raise ValueError(f"Unknown blur scoring preset(s): {', '.join(unknown)}")
+    topologies = split_list(args.topology)
+    unknown = [name for name in topologies if name not in TOPOLOGIES]
+    if unknown:
+        raise ValueError(f"Unknown topology: {', '.join(unknown)}")
+    processing_modes = split_list(args.processing_mode)
+    unknown = [name for name in processing_modes if name not in PROCESSING_MODES]
+    if unknown:
+        raise ValueError(f"Unknown processing mode: {', '.join(unknown)}")
+    outputs = split_list(args.outputs)
+    for spec in outputs:
+        parse_output_spec(spec)
+    rows = run_matrix(split_list(args.videos), split_list(args.workers, int), split_list(args.steps, int),
+                      scorings, args.output, args.frames, topologies, processing_modes, outputs, args.memory_budget)
+    json_path, csv_path = write_results(rows, args.output)
+    print(f"\n📁 Results saved as '{json_path}' and '{csv_path}'")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    changes = compare_to_baseline(rows, baseline, args.tolerance)
+    for change in changes:
+        flag = "⚠️ regression" if change["regression"] else ""
+        print(f"{' / '.join(map(str, change['case'])):>40}: {change['baseline_fps']:>8} → {change['fps']:>8} frames/s ({change['change']:+.1%}) {flag}")
+    regressions = sum(change["regression"] for change in changes)
+    print(f"\n{len(changes)} cases compared, {regressions} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
@@ -0,0 +1,3421 @@
+import io
+import os
+import sys
+import cv2
+import numpy as np
+import glob
+import json
+import bisect
+import hashlib
+import math
+import queue
+import time
+import platform
+import tempfile
+import zlib
+import struct
+import tarfile
+import zipfile
+import argparse
+import cProfile
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import dataclasses
+from collections import deque
+from dataclasses import dataclass
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: peak memory is reported as empty
+
+SESSION_FILE = "session.json"
+LOG_CSV = "log.csv"
+# Append-only JSONL index of every frame written, kept in the output folder
+INDEX_FILE = "frames.jsonl"
+
+# 💾 Output: the image format of each frame, and whether frames are written as
+# one file each, packed into a tar/zip, or copied raw into one mmap-able .npy stack
+OUTPUT_FORMATS = {"jpg": ".jpg", "png": ".png", "webp": ".webp", "npy": ".npy"}
+OUTPUT_CONTAINERS = ("files", "tar", "zip", "stack")
+STACK_FILE = "frames.npy"
+
+# Frame sampling: "grab" decodes through skipped frames without retrieving them,
+# "seek" jumps straight to each kept frame, "auto" picks per container by measuring both
+SAMPLING_MODE = "auto"
+# Sampling by "time" emits the first frame at or after each target time k / fps,
+# read from the decoder's presentation timestamps, so 29.97 fps footage or
+# variable-frame-rate phone video keeps the exact output rate. Gaps to the next
+# target longer than TIME_SEEK_GAP_SEC are skipped with a seek
+SAMPLE_BY = ("frame", "time")
+TIME_SEEK_GAP_SEC = 2.0
+TIME_SEEK_MARGIN_FRAMES = 2
+GRAB_PROBE_FRAMES = 30
+SEEK_PROBE_COUNT = 3
+
+# "Keep sharpest frame per interval" ranks every frame of a step-sized window at this scale
+BEST_OF_WINDOW_SCALE = 0.25
+
+# 🗺 Two-pass mode: one scan decodes the whole video and records every frame's
+# sharpness, timestamp and keyframe flag in a .npy sidecar, cached per video content
+# and scoring preset; extractions then decode only the frames it selects
+SCAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "frame_extractor", "scans")
+SCAN_DTYPE = np.dtype([("score", "f4"), ("timestamp", "f8"), ("keyframe", "?")])
+# Bumped when stored scores change meaning (2: rank-matched preset calibration)
+SCAN_CACHE_VERSION = 2
+SCAN_HASH_CHUNKS = 16
+SCAN_HASH_CHUNK_BYTES = 1 << 20
+SCAN_MIN_SEEK_GAP = 16
+
+# Multi-core work is handed out as small GOP-aligned segments from a shared queue
+MIN_SEGMENT_FRAMES = 120
+SEEK_OVERHEAD_TARGET = 0.05
+GOP_PROBE_FRAMES = 300
+
+# Multi-core topology: "seek" gives every worker its own decoder and segments;
+# "ring" has one decoder process fill a shared-memory ring of frames that the workers score
+TOPOLOGIES = ("seek", "ring")
+RING_MEMORY_CAP_MB = 256
+RING_SLOTS_PER_WORKER = 4
+
+# ⚙️ Auto worker count: a short calibration on the video itself times decode, score
+# and encode at several worker counts and OpenCV thread settings and keeps the
+# fastest. Every trial covers the same slices of the video, so their rates compare.
+# Worker counts stop growing once the best rate drops below TUNING_STOP_RATIO of
+# the best so far. Results are cached per machine and codec profile in TUNING_FILE
+TUNING_FILE = os.path.join(os.path.expanduser("~"), ".cache", "frame_extractor", "tuning.json")
+TUNING_SLICE_FRAMES = 48
+TUNING_SLICES_PER_WORKER = 2
+TUNING_STOP_RATIO = 0.9
+
+# JPEG encode/write runs on a thread pool per process, fed through a bounded queue
+ENCODER_THREADS = 2
+ENCODER_MEMORY_CAP_MB = 256
+
+# 🧠 Memory budget: memory_budget_mb is split across the processes of a run. Each
+# pays PROCESS_BASE_MB for the interpreter and libraries plus WORKING_SET_FRAMES
+# decoded frames for decode, grayscale, the float64 Laplacian and encode; what is
+# left of its share caps its encode queue. Resident memory is sampled every
+# MEMORY_CHECK_INTERVAL_SEC, and a process over its share keeps one frame in flight
+PROCESS_BASE_MB = 80
+WORKING_SET_FRAMES = 6
+MEMORY_CHECK_INTERVAL_SEC = 0.25
+# Decode buffers kept free for reuse between decodes
+FRAME_POOL_SPARE = 2
+
+# Processing Mode: "GPU" runs colour conversion, resizing and the Laplacian as
+# OpenCL kernels through cv2.UMat and asks the decoder for hardware acceleration.
+# Without an OpenCL device it falls back to the CPU backend
+PROCESSING_MODES = ("CPU", "GPU")
+
+# Blur scoring presets; anything other than "Exact" is mapped onto the
+# full-resolution float64 Laplacian variance so blur_thresh keeps its meaning.
+# The map pairs both scores by rank over SHARPNESS_CALIBRATION_SAMPLES frames
+# of the video, so it also fits metrics that are not proportional to the
+# Laplacian variance, such as FFT's bounded high-frequency energy ratio
+SHARPNESS_PRESETS = {
+    "Exact": {},
+    "Fast": {"scale": 0.5, "depth": "float32"},
+    "Fastest": {"scale": 0.25, "roi": "center", "depth": "float32"},
+    "Tiles": {"scale": 0.5, "roi": "tiles", "depth": "float32"},
+    "Tenengrad": {"metric": "tenengrad", "scale": 0.5, "depth": "float32"},
+    "FFT": {"metric": "fft", "scale": 0.25, "depth": "float32"},
+    "Tile Max": {"metric": "tile_max", "scale": 0.5, "depth": "float32"},
+}
+DEFAULT_BLUR_SCORING = "Exact"
+SHARPNESS_CALIBRATION_SAMPLES = 24
+FFT_HIGH_FREQ_CUTOFF = 0.15
+TILE_MAX_GRID = 4
+
+# 🎚 Adaptive blur threshold: besides the fixed floor, "percentile" keeps the top
+# keep_percent of scores seen so far and "local" keeps frames scoring at least
+# local_ratio x the median of the last ADAPTIVE_WINDOW samples. Scores go into a
+# log-binned sketch (bin width SKETCH_GAMMA, so about 1% relative error) that all
+# workers share, so the percentile is over the whole run, not one worker's share
+BLUR_MODES = ("fixed", "percentile", "local")
+SKETCH_MIN_SCORE = 1e-2
+SKETCH_GAMMA = 1.02
+SKETCH_BINS = 1200
+ADAPTIVE_MIN_SAMPLES = 30
+ADAPTIVE_REFRESH = 8
+ADAPTIVE_WINDOW = 45
+
+# Near-duplicate suppression: frames whose dHash is within this many bits
+# (out of 64) of the last kept frame are dropped
+DEDUP_MAX_DISTANCE = 4
+
+# Session checkpoints are flushed at most this often (whichever limit is hit first)
+CHECKPOINT_INTERVAL_SEC = 5.0
+CHECKPOINT_INTERVAL_FRAMES = 1000
+
+# 📡 Worker progress: one row of shared int64 counters per worker, read by a single monitor thread
+PROGRESS_FIELDS = ("frames", "sampled", "kept", "bytes", "seg_start", "seg_end", "seg_done")
+PROGRESS_INTERVAL_SEC = 0.5
+
+# ⏱ Pipeline stages timed on every run; the last four are time spent waiting on a queue
+STAGES = ("seek", "decode", "score", "encode", "write", "writer_stall", "encoder_idle", "task_wait", "ring_stall")
+# Instrumented runs add a log2 latency histogram per stage (bucket b holds durations below 2**b µs)
+HISTOGRAM_BUCKETS = 32
+TRACE_MAX_EVENTS = 500000
+PROFILE_FILE = "profile_worker{}.prof"
+
+@dataclass
+class ExtractionConfig:
+    video_path: str
+    output_dir: str
+    fps: float = 30
+    blur_threshold: float = 5.0
+    blur_scoring: str = DEFAULT_BLUR_SCORING
+    blur_mode: str = "fixed"
+    keep_percent: float = 50.0
+    local_ratio: float = 1.0
+    best_of_window: bool = False
+    sample_by: str = "frame"
+    dedup: bool = False
+    reset: bool = False
+    use_multicore: bool = False
+    worker_count: int = 4
+    save_csv_log: bool = False
+    csv_log_path: str = LOG_CSV
+    processing_mode: str = "CPU"
+    session_path: str = SESSION_FILE
+    topology: str = "seek"
+    instrument: bool = False
+    trace_path: str = ""
+    profile_worker: int = -1
+    profile_path: str = PROFILE_FILE
+    scan: bool = False
+    output_format: str = "jpg"
+    quality: int = -1
+    png_compression: int = -1
+    jpeg_optimize: bool = False
+    container: str = "files"
+    memory_budget_mb: int = 0
+    resize_width: int = 0
+    crop: str = ""
+    auto_workers: bool = False
+    retune: bool = False
+    cv_threads: int = 0
+
+    @property
+    def selection(self):
+        return "best" if self.best_of_window else "stride"
+
+    @property
+    def timed(self):
+        # Best-of-window keeps its frame-count windows, so segments never split one
+        return self.sample_by == "time" and not self.best_of_window
+
+    @property
+    def blur_policy(self):
+        if self.blur_mode == "percentile":
+            return f"percentile {self.keep_percent:g}"
+        if self.blur_mode == "local":
+            return f"local {self.local_ratio:g}"
+        return "fixed"
+
+class ProgressCallback:
+    # Receives everything an extraction reports; the GUI and CLI override what they display
+    def log(self, msg):
+        print(msg)
+
+    def status(self, text):
+        pass
+
+    def progress(self, percent, text):
+        pass
+
+    def workers_started(self, count):
+        pass
+
+    def worker_progress(self, worker, percent, text):
+        pass
+
+    def cancelled(self):
+        # Polled at progress-report cadence; once True, the run checkpoints what it has and stops
+        return False
+
+class ConsoleProgress(ProgressCallback):
+    # One line per `every` percent, so output stays readable when piped into job logs
+    def __init__(self, every=5):
+        self.every = every
+        self.last_bucket = None
+
+    def status(self, text):
+        print(text)
+
+    def progress(self, percent, text):
+        bucket = percent // self.every
+        if percent < 100 and bucket != self.last_bucket:
+            self.last_bucket = bucket
+            print(text, flush=True)
+
+def write_json_atomic(path, data):
+    # Write to a temp file in the same directory and rename over the target,
+    # so a crash mid-write never leaves a truncated session behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_session(data, path=SESSION_FILE):
+    write_json_atomic(path, data)
+
+def load_session(path=SESSION_FILE):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    return None
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def subtract_ranges(start, end, done):
+    pending = []
+    cursor = start
+    for done_start, done_end in merge_ranges(done):
+        if done_end <= cursor or done_start >= end:
+            continue
+        if done_start > cursor:
+            pending.append([cursor, done_start])
+        cursor = max(cursor, done_end)
+    if cursor < end:
+        pending.append([cursor, end])
+    return pending
+
+def session_completed_ranges(session):
+    # Sessions from before range checkpoints only have last_frame: everything before it is done
+    legacy = [[0, session["last_frame"]]] if session.get("last_frame") else []
+    return merge_ranges(session.get("completed", []) + legacy)
+
+def video_fingerprint(video_path, total_frames):
+    stat = os.stat(video_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "frame_count": total_frames}
+
+def session_matches(existing, session):
+    # A session is only reused for the exact same file, settings and output folder
+    return all(existing.get(key) == session[key] for key in ("video_path", "video", "output_dir", "fps", "blur_threshold", "blur_scoring", "blur_policy",
+                                                         "selection", "sample_by", "dedup", "scan", "output_format", "quality",
+                                                         "png_compression", "jpeg_optimize", "container", "crop", "resize_width"))
+
+def worker_session_path(proc_id, session_path=SESSION_FILE):
+    base, ext = os.path.splitext(session_path)
+    return f"{base}.worker{proc_id}{ext}"
+
+def worker_session_paths(session_path=SESSION_FILE):
+    base, ext = os.path.splitext(session_path)
+    return sorted(glob.glob(f"{glob.escape(base)}.worker*{ext}"))
+
+def clear_sessions(session_path=SESSION_FILE):
+    for path in [session_path] + worker_session_paths(session_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def merge_worker_sessions(session, session_path=SESSION_FILE):
+    # Fold per-worker checkpoints (left behind by a finished or crashed
+    # multi-core run) into the main session, then drop them
+    paths = worker_session_paths(session_path)
+    completed = session_completed_ranges(session)
+    for path in paths:
+        worker = load_session(path)
+        if worker and session_matches(worker, session):
+            completed += session_completed_ranges(worker)
+            session["saved"] = session.get("saved", 0) + worker.get("saved", 0)
+    session["completed"] = merge_ranges(completed)
+    if paths:
+        save_session(session, session_path)
+        for path in paths:
+            os.remove(path)
+    return session
+
+def new_session(video_path, output_dir, fps, blur_threshold, total_frames, blur_scoring=DEFAULT_BLUR_SCORING, selection="stride", dedup=False,
+                scan=False, blur_policy="fixed", sample_by="frame", output_format="jpg", quality=-1, png_compression=-1, jpeg_optimize=False,
+                container="files", crop="", resize_width=0):
+    return {
+        "video_path": video_path,
+        "video": video_fingerprint(video_path, total_frames),
+        "output_dir": output_dir,
+        "fps": fps,
+        "blur_threshold": blur_threshold,
+        "blur_scoring": blur_scoring,
+        "blur_policy": blur_policy,
+        "selection": selection,
+        "sample_by": sample_by,
+        "dedup": dedup,
+        "scan": scan,
+        "output_format": output_format,
+        "quality": quality,
+        "png_compression": png_compression,
+        "jpeg_optimize": jpeg_optimize,
+        "container": container,
+        "crop": crop,
+        "resize_width": resize_width,
+        "completed": [],
+        "saved": 0
+    }
+
+def prepare_session(session, reset, session_path=SESSION_FILE):
+    if reset:
+        clear_sessions(session_path)
+        return session
+    existing = load_session(session_path)
+    if existing and session_matches(existing, session):
+        session["completed"] = session_completed_ranges(existing)
+        session["saved"] = existing.get("saved", 0)
+    return merge_worker_sessions(session, session_path)
+
+class SessionCheckpoint:
+    def __init__(self, session, path=SESSION_FILE, interval_sec=CHECKPOINT_INTERVAL_SEC, interval_frames=CHECKPOINT_INTERVAL_FRAMES, before_flush=None):
+        self.session = session
+        self.path = path
+        self.before_flush = before_flush
+        self.interval_sec = interval_sec
+        self.interval_frames = interval_frames
+        self.completed = session_completed_ranges(session)
+        self.open_range = None
+        self.frames_since_flush = 0
+        self.last_flush = time.time()
+        self.flush_count = 0
+
+    def mark_done(self, start, end, saved=0):
+        # Consecutive calls extend one open range instead of growing the list per frame
+        if self.open_range and start <= self.open_range[1]:
+            self.open_range[1] = max(self.open_range[1], end)
+        else:
+            if self.open_range:
+                self.completed.append(self.open_range)
+            self.open_range = [start, end]
+        self.session["saved"] = self.session.get("saved", 0) + saved
+        self.frames_since_flush += end - start
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if (self.frames_since_flush >= self.interval_frames
+                or time.time() - self.last_flush >= self.interval_sec):
+            self.flush()
+
+    def completed_ranges(self):
+        if self.open_range:
+            return merge_ranges(self.completed + [self.open_range])
+        return merge_ranges(self.completed)
+
+    def pending_ranges(self, start, end):
+        return subtract_ranges(start, end, self.completed_ranges())
+
+    def flush(self):
+        # Frames still queued for writing must land on disk before their range is recorded
+        if self.before_flush:
+            self.before_flush()
+        self.session["completed"] = self.completed_ranges()
+        save_session(self.session, self.path)
+        self.frames_since_flush = 0
+        self.last_flush = time.time()
+        self.flush_count += 1
+
+def format_eta(seconds):
+    days, rem = divmod(seconds, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, secs = divmod(rem, 60)
+    if days > 0:
+        return f"{days}d {hours:02}:{minutes:02}:{secs:02}"
+    elif hours > 0:
+        return f"{hours:02}:{minutes:02}:{secs:02}"
+    else:
+        return f"{minutes:02}:{secs:02}"
+
+def progress_counters(worker_count):
+    # Plain shared memory, no lock: each worker only ever writes its own row
+    return mp.Array("q", worker_count * len(PROGRESS_FIELDS), lock=False)
+
+class WorkerCounters:
+    def __init__(self, counters, proc_id):
+        self.counters = counters
+        self.base = proc_id * len(PROGRESS_FIELDS)
+
+    def set(self, **values):
+        for field, value in values.items():
+            self.counters[self.base + PROGRESS_FIELDS.index(field)] = value
+
+    def snapshot(self):
+        row = self.counters[self.base:self.base + len(PROGRESS_FIELDS)]
+        return dict(zip(PROGRESS_FIELDS, row))
+
+class StageTimer:
+    # Wall time and call count per stage; a couple of perf_counter calls per frame.
+    # Histograms and trace events are opt-in since they cost more per call
+    def __init__(self, histogram=False, trace=False):
+        self.time = dict.fromkeys(STAGES, 0.0)
+        self.count = dict.fromkeys(STAGES, 0)
+        self.histogram = {stage: [0] * HISTOGRAM_BUCKETS for stage in STAGES} if histogram else None
+        self.events = [] if trace else None
+
+    def add(self, stage, start, end):
+        seconds = end - start
+        self.time[stage] += seconds
+        self.count[stage] += 1
+        if self.histogram is not None:
+            self.histogram[stage][min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        if self.events is not None and len(self.events) < TRACE_MAX_EVENTS:
+            self.events.append((stage, start, seconds, threading.get_native_id()))
+
+    def summary(self):
+        summary = {stage: {"time": round(self.time[stage], 4), "count": self.count[stage]} for stage in STAGES}
+        if self.histogram is not None:
+            for stage in STAGES:
+                summary[stage]["histogram"] = list(self.histogram[stage])
+        return summary
+
+def merge_stage_summaries(summaries):
+    merged = StageTimer()
+    for summary in summaries:
+        for stage, entry in summary.items():
+            merged.time[stage] += entry["time"]
+            merged.count[stage] += entry["count"]
+            if "histogram" in entry:
+                if merged.histogram is None:
+                    merged.histogram = {name: [0] * HISTOGRAM_BUCKETS for name in STAGES}
+                merged.histogram[stage] = [a + b for a, b in zip(merged.histogram[stage], entry["histogram"])]
+    return merged.summary()
+
+def histogram_percentile(buckets, q):
+    # Upper edge of the bucket holding the q-th quantile, in milliseconds
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    seen = 0
+    for b, count in enumerate(buckets):
+        seen += count
+        if seen >= q * total:
+            return (1 << b) / 1000
+    return (1 << (len(buckets) - 1)) / 1000
+
+def format_histograms(summary):
+    lines = []
+    for stage, entry in summary.items():
+        if entry["count"] and "histogram" in entry:
+            p50, p95, p99 = (histogram_percentile(entry["histogram"], q) for q in (0.5, 0.95, 0.99))
+            lines.append(f"   {stage:>13}: {entry['count']:>7} calls | p50 ≤{p50:g}ms | p95 ≤{p95:g}ms | p99 ≤{p99:g}ms")
+    return lines
+
+def trace_events(timer, pid, name):
+    # Chrome trace "complete" events; perf_counter is a system-wide monotonic clock,
+    # so timestamps from different worker processes line up
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}]
+    for stage, start, seconds, tid in timer.events or []:
+        events.append({"name": stage, "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+                       "ts": round(start * 1e6, 1), "dur": round(seconds * 1e6, 1)})
+    return events
+
+def worker_trace_path(proc_id, trace_path):
+    return f"{trace_path}.worker{proc_id}"
+
+def write_trace(trace_path, events):
+    # Loads in chrome://tracing and ui.perfetto.dev
+    timed = [event["ts"] for event in events if "ts" in event]
+    origin = min(timed) if timed else 0
+    for event in events:
+        if "ts" in event:
+            event["ts"] = round(event["ts"] - origin, 1)
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def merge_worker_traces(trace_path, proc_ids):
+    events = []
+    for proc_id in proc_ids:
+        part = worker_trace_path(proc_id, trace_path)
+        if os.path.exists(part):
+            with open(part, "r") as f:
+                events.extend(json.load(f))
+            os.remove(part)
+    write_trace(trace_path, events)
+    return len(events)
+
+def format_stages(summary):
+    return " | ".join(f"{stage} {entry['time']:.2f}s" for stage, entry in summary.items())
+
+def measure_sampling_costs(cap, start_frame, end_frame, step):
+    # Average cost of advancing one frame with grab()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    probe = min(step, end_frame - start_frame, GRAB_PROBE_FRAMES)
+    grabbed = 0
+    t0 = time.perf_counter()
+    for _ in range(probe):
+        if not cap.grab():
+            break
+        grabbed += 1
+    grab_cost = (time.perf_counter() - t0) / max(grabbed, 1)
+
+    # Average cost of a random-access seek plus decoding the target frame
+    span = end_frame - start_frame
+    targets = [start_frame + span * (i + 1) // (SEEK_PROBE_COUNT + 1) for i in range(SEEK_PROBE_COUNT)]
+    t0 = time.perf_counter()
+    for target in targets:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        cap.grab()
+    seek_cost = (time.perf_counter() - t0) / len(targets)
+
+    return grab_cost, seek_cost
+
+def pick_sampling_mode(grab_cost, seek_cost, step):
+    # One seek replaces the `step` grabs needed to reach the next kept frame
+    return "seek" if step > 1 and seek_cost < grab_cost * step else "grab"
+
+def can_probe(start_frame, end_frame, step):
+    return end_frame - start_frame >= step * (SEEK_PROBE_COUNT + 1)
+
+def choose_sampling_mode(cap, start_frame, end_frame, step, mode="auto"):
+    if mode != "auto":
+        return mode
+    if step <= 1 or not can_probe(start_frame, end_frame, step):
+        return "grab"
+
+    grab_cost, seek_cost = measure_sampling_costs(cap, start_frame, end_frame, step)
+    return pick_sampling_mode(grab_cost, seek_cost, step)
+
+def estimate_gop_size(cap, start_frame, video_fps):
+    # Keyframe flags are only reported by some backends; fall back to a
+    # one-second GOP, which is what most cameras and phones write
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    keyframes = []
+    for i in range(GOP_PROBE_FRAMES):
+        if not cap.grab():
+            break
+        if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0:
+            keyframes.append(i)
+    gaps = sorted(b - a for a, b in zip(keyframes, keyframes[1:]))
+    if gaps and gaps[len(gaps) // 2] > 1:
+        return gaps[len(gaps) // 2]
+    return max(int(round(video_fps)), 1)
+
+def split_segments(ranges, segment_size):
+    # Boundaries fall on absolute multiples of segment_size so segments stay GOP-aligned
+    segments = []
+    for start, end in ranges:
+        while start < end:
+            boundary = min((start // segment_size + 1) * segment_size, end)
+            segments.append([start, boundary])
+            start = boundary
+    return segments
+
+def plan_segments(cap, pending, step, video_fps, sampling_mode=SAMPLING_MODE):
+    start_frame, end_frame = pending[0][0], pending[-1][1]
+    gop = estimate_gop_size(cap, start_frame, video_fps)
+    segment_size = max(MIN_SEGMENT_FRAMES, step)
+    mode = "grab" if sampling_mode == "auto" else sampling_mode
+
+    if can_probe(start_frame, end_frame, step):
+        grab_cost, seek_cost = measure_sampling_costs(cap, start_frame, end_frame, step)
+        if sampling_mode == "auto":
+            mode = pick_sampling_mode(grab_cost, seek_cost, step)
+        # Keep the seek that starts every segment a small fraction of its decode time
+        if grab_cost > 0:
+            segment_size = max(segment_size, int(seek_cost / (grab_cost * SEEK_OVERHEAD_TARGET)))
+
+    # Best-of-window segments also end on window boundaries so no window is split
+    align = math.lcm(gop, step) if mode == "best" else gop
+    segment_size = -(-segment_size // align) * align
+    return split_segments(pending, segment_size), mode
+
+def iter_best_of_window(cap, start_frame, end_frame, step, ranker, timer=None):
+    # Every frame in each step-sized window is ranked with a cheap downscaled
+    # score; only the current leader is held, so memory stays at one frame
+    timer = timer or StageTimer()
+    t0 = time.perf_counter()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    timer.add("seek", t0, time.perf_counter())
+    frame_id = start_frame
+    best_id, best_frame, best_score = None, None, -1.0
+    window_end = min((start_frame // step + 1) * step, end_frame)
+    while frame_id < end_frame:
+        t0 = time.perf_counter()
+        if not cap.grab():
+            break
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        t1 = time.perf_counter()
+        score = ranker.score(frame)
+        timer.add("decode", t0, t1)
+        timer.add("score", t1, time.perf_counter())
+        if score > best_score:
+            best_id, best_frame, best_score = frame_id, frame, score
+        frame_id += 1
+        if frame_id == window_end:
+            yield best_id, best_frame, window_end
+            best_id, best_frame, best_score = None, None, -1.0
+            window_end = min(window_end + step, end_frame)
+    if best_frame is not None:
+        yield best_id, best_frame, frame_id
+
+def window_ranker(sharpness, backend=None):
+    return SharpnessScorer(metric=sharpness.get("metric", "laplacian"), scale=BEST_OF_WINDOW_SCALE, depth="float32", backend=backend)
+
+def iter_sampled_frames(cap, start_frame, end_frame, step, mode="grab", timer=None):
+    # Kept frames stay aligned to frame_id % step == 0 regardless of the range start
+    timer = timer or StageTimer()
+    first = -(-start_frame // step) * step
+
+    if mode == "seek":
+        for frame_id in range(first, end_frame, step):
+            t0 = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            t1 = time.perf_counter()
+            ret, frame = cap.read()
+            timer.add("seek", t0, t1)
+            timer.add("decode", t1, time.perf_counter())
+            if not ret:
+                break
+            yield frame_id, frame
+        return
+
+    # grab() only demuxes/decodes; the BGR conversion in retrieve() is paid for kept frames only
+    t0 = time.perf_counter()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    timer.add("seek", t0, time.perf_counter())
+    frame_id = first
+    while frame_id < end_frame:
+        t0 = time.perf_counter()
+        if not cap.grab():
+            break
+        if frame_id % step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            timer.add("decode", t0, time.perf_counter())
+            yield frame_id, frame
+        else:
+            timer.add("decode", t0, time.perf_counter())
+        frame_id += 1
+
+def target_index(timestamp, fps):
+    # How many target times k / fps (k >= 1) lie at or before the timestamp
+    return math.floor(timestamp * fps + 1e-6)
+
+class TimeSampler:
+    # Frame ids and decoder timestamps of the first frame at or after each target
+    # time. A frame is kept when its target index passes the previous frame's,
+    # so the answer doesn't depend on where a segment starts
+    def __init__(self, fps, video_fps):
+        self.fps = fps
+        self.video_fps = video_fps
+
+    def frames(self, cap, start_frame, end_frame, timer):
+        position = max(start_frame - 1, 0)
+        t0 = time.perf_counter()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        timer.add("seek", t0, time.perf_counter())
+        last = -1
+        if start_frame > 0:
+            # The frame before the range tells whether the first one crosses a target
+            if not cap.grab():
+                return
+            last = target_index(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, self.fps)
+            position += 1
+        while position < end_frame:
+            t0 = time.perf_counter()
+            if not cap.grab():
+                break
+            timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            k = target_index(timestamp, self.fps)
+            if k > last:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                timer.add("decode", t0, time.perf_counter())
+                yield position, frame, timestamp
+            else:
+                timer.add("decode", t0, time.perf_counter())
+            last = max(last, k)
+            position += 1
+            gap = (last + 1) / self.fps - timestamp
+            if gap > TIME_SEEK_GAP_SEC:
+                position = self.skip(cap, position, min(position + int(gap * self.video_fps) - TIME_SEEK_MARGIN_FRAMES, end_frame), last, timer)
+
+    def skip(self, cap, position, jump, last, timer):
+        # Seek to just before the frame the nominal rate predicts for the next target.
+        # If variable frame rate put a target in between, go back and decode through
+        if jump - position <= TIME_SEEK_MARGIN_FRAMES:
+            return position
+        t0 = time.perf_counter()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, jump - 1)
+        landed = cap.grab() and target_index(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, self.fps) <= last
+        if not landed:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        timer.add("seek", t0, time.perf_counter())
+        return jump if landed else position
+
+def parse_crop(crop):
+    # "W:H:X:Y" in source pixels, as in ffmpeg's crop filter
+    try:
+        width, height, x, y = (int(v) for v in crop.split(":"))
+    except ValueError:
+        raise ValueError(f"Invalid crop '{crop}' (expected W:H:X:Y in pixels).")
+    if width <= 0 or height <= 0 or x < 0 or y < 0:
+        raise ValueError(f"Invalid crop '{crop}' (expected W:H:X:Y in pixels).")
+    return width, height, x, y
+
+class OutputTransform:
+    # Crop, then downscale to a maximum width, applied to kept frames just before
+    # encode; scoring and dedup still see the full decoded frame
+    def __init__(self, crop="", width=0):
+        self.crop = parse_crop(crop) if crop else None
+        self.width = width
+
+    def __bool__(self):
+        return self.crop is not None or self.width > 0
+
+    def describe(self):
+        # Recorded with every frame it changed, so a run with other settings writes the frame again
+        parts = []
+        if self.crop:
+            parts.append("crop {}:{}:{}:{}".format(*self.crop))
+        if self.width:
+            parts.append(f"width {self.width}")
+        return ", ".join(parts)
+
+    def shape(self, frame_shape):
+        h, w = frame_shape[:2]
+        if self.crop:
+            cw, ch, x, y = self.crop
+            if x + cw > w or y + ch > h:
+                raise ValueError(f"Crop {cw}:{ch}:{x}:{y} does not fit {w}x{h} frames.")
+            h, w = ch, cw
+        return self.scaled(h, w) + tuple(frame_shape[2:])
+
+    def scaled(self, h, w):
+        # Only ever downscales
+        if 0 < self.width < w:
+            return max(int(round(h * self.width / w)), 1), self.width
+        return h, w
+
+    def apply(self, frame):
+        # Always a new array when anything changes: the decode buffer goes back to the pool
+        if not self:
+            return frame
+        if self.crop:
+            cw, ch, x, y = self.crop
+            frame = frame[y:y + ch, x:x + cw]
+        h, w = self.scaled(*frame.shape[:2])
+        if (h, w) != frame.shape[:2]:
+            return cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+        return frame.copy()
+
+def output_transform(config):
+    return OutputTransform(config.crop, config.resize_width)
+
+class FrameEncoder:
+    # Frame -> bytes in the chosen format; -1 keeps OpenCV's default quality/level
+    def __init__(self, output_format="jpg", quality=-1, png_compression=-1, jpeg_optimize=False):
+        self.format = output_format
+        self.ext = OUTPUT_FORMATS[output_format]
+        self.params = []
+        if output_format == "jpg":
+            if quality >= 0:
+                self.params += [cv2.IMWRITE_JPEG_QUALITY, quality]
+            if jpeg_optimize:
+                self.params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        elif output_format == "webp" and quality >= 0:
+            self.params += [cv2.IMWRITE_WEBP_QUALITY, max(quality, 1)]
+        elif output_format == "png" and png_compression >= 0:
+            self.params += [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+
+    def describe(self):
+        settings = dict(zip(self.params[::2], self.params[1::2]))
+        parts = [self.format]
+        if cv2.IMWRITE_JPEG_QUALITY in settings and self.format == "jpg":
+            parts.append(f"q{settings[cv2.IMWRITE_JPEG_QUALITY]}")
+        if self.format == "webp" and settings:
+            parts.append(f"q{settings[cv2.IMWRITE_WEBP_QUALITY]}")
+        if self.format == "png" and settings:
+            parts.append(f"level {settings[cv2.IMWRITE_PNG_COMPRESSION]}")
+        if cv2.IMWRITE_JPEG_OPTIMIZE in settings and self.format == "jpg":
+            parts.append("optimized")
+        return " ".join(parts)
+
+    def encode(self, frame, backend):
+        if self.format == "npy":
+            # .npy header plus the raw pixels; np.load reads it back without decoding
+            buf = io.BytesIO()
+            np.save(buf, frame)
+            return True, buf.getbuffer()
+        return backend.encode(self.ext, frame, self.params)
+
+class FileStore:
+    # One file per frame, named by frame id (and timestamp when sampling by time)
+    def __init__(self, output_dir, encoder, timestamped=False):
+        self.output_dir = output_dir
+        self.encoder = encoder
+        self.timestamped = timestamped
+
+    def name(self, frame_id, timestamp=None):
+        return os.path.basename(frame_filename(self.output_dir, frame_id, self.encoder.ext, timestamp if self.timestamped else None))
+
+    def locate(self, frame_id, timestamp=None):
+        location = {"file": self.name(frame_id, timestamp)}
+        # Quality, PNG level or JPEG optimisation, when not OpenCV's defaults
+        if self.encoder.describe() != self.encoder.format:
+            location["encoding"] = self.encoder.describe()
+        return location
+
+    def encoded_here(self, location):
+        return location.get("encoding", self.encoder.format) == self.encoder.describe()
+
+    def holds(self, location, frame_id, timestamp=None):
+        # Whether an index record points at where this store would put the frame, encoded the same way
+        return "archive" not in location and location.get("file") == self.name(frame_id, timestamp) and self.encoded_here(location)
+
+    def write(self, frame_id, frame, backend, timestamp=None):
+        # Encoding and the file write both release the GIL. Returns the bytes
+        # written, their CRC32 and the stage timestamps; a failed encode or
+        # write raises, so the frame is never counted as saved
+        t0 = time.perf_counter()
+        ok, buf = self.encoder.encode(frame, backend)
+        t1 = time.perf_counter()
+        if not ok:
+            raise ValueError(f"Could not encode frame {frame_id} as {self.encoder.format}")
+        self.put(self.name(frame_id, timestamp), buf)
+        return len(buf), zlib.crc32(buf), t0, t1, time.perf_counter()
+
+    def put(self, name, buf):
+        with open(os.path.join(self.output_dir, name), "wb") as f:
+            f.write(buf)
+
+    def remove(self, record):
+        path = os.path.join(self.output_dir, record["file"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class ArchiveStore(FileStore):
+    # Frames packed into one uncompressed tar or zip per process, so millions of
+    # frames are a handful of files; the index says which archive holds each one
+    def __init__(self, output_dir, encoder, container, part=None, timestamped=False):
+        super().__init__(output_dir, encoder, timestamped)
+        self.container = container
+        self.path = archive_path(output_dir, container, part)
+        self.lock = threading.Lock()
+        self.archive = None
+
+    def locate(self, frame_id, timestamp=None):
+        return dict(super().locate(frame_id, timestamp), archive=os.path.basename(self.path))
+
+    def holds(self, location, frame_id, timestamp=None):
+        # Any worker's archive of this container counts, since parts differ between runs
+        return (location.get("archive", "").endswith(f".{self.container}") and location.get("file") == self.name(frame_id, timestamp)
+                and self.encoded_here(location))
+
+    def put(self, name, buf):
+        data = bytes(buf)
+        with self.lock:
+            if self.archive is None:
+                self.archive = tarfile.open(self.path, "a") if self.container == "tar" else zipfile.ZipFile(self.path, "a")
+            if self.container == "tar":
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = time.time()
+                self.archive.addfile(info, io.BytesIO(data))
+            else:
+                self.archive.writestr(name, data)
+
+    def remove(self, record):
+        # Archives are append-only; the index tombstone is what drops the frame
+        pass
+
+    def flush(self):
+        # The archive stays open between checkpoints: closing writes the tar end blocks /
+        # zip central directory, and reopening walks every member. Checkpoints only make
+        # the frames durable; after a crash repair_archives cuts off what the index lacks
+        with self.lock:
+            if self.archive is None:
+                return
+            f = self.archive.fileobj if self.container == "tar" else self.archive.fp
+            f.flush()
+            # Opened for writing, so this also works on Windows (FlushFileBuffers needs a writable handle)
+            os.fsync(f.fileno())
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.archive is None:
+                return
+            self.archive.close()
+            self.archive = None
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+class StackStore:
+    # Raw frames copied into one preallocated (slots, height, width, 3) .npy that
+    # every process maps; the slot is frame id // step, or the target index when
+    # sampling by time, so workers never share a slot
+    def __init__(self, output_dir, step, fps=None):
+        self.path = os.path.join(output_dir, STACK_FILE)
+        self.step = step
+        self.fps = fps
+        self.stack = np.load(self.path, mmap_mode="r+")
+
+    def slot(self, frame_id, timestamp=None):
+        if self.fps and timestamp is not None:
+            return target_index(timestamp, self.fps)
+        return frame_id // self.step
+
+    def locate(self, frame_id, timestamp=None):
+        return {"archive": STACK_FILE, "slot": self.slot(frame_id, timestamp)}
+
+    def holds(self, location, frame_id, timestamp=None):
+        return location.get("archive") == STACK_FILE and location.get("slot") == self.slot(frame_id, timestamp)
+
+    def write(self, frame_id, frame, backend, timestamp=None):
+        # No encode step: the copy into the mapped file is the whole write
+        t0 = time.perf_counter()
+        slot = self.slot(frame_id, timestamp)
+        if slot >= len(self.stack) or frame.shape != self.stack.shape[1:]:
+            raise ValueError(f"Frame {frame_id} ({frame.shape}) does not fit slot {slot} of '{self.path}'")
+        self.stack[slot] = frame
+        return frame.nbytes, zlib.crc32(self.stack[slot]), t0, t0, time.perf_counter()
+
+    def remove(self, record):
+        pass
+
+    def flush(self):
+        self.stack.flush()
+
+    def close(self):
+        self.flush()
+
+def archive_path(output_dir, container, part=None):
+    name = "frames" if part is None else f"frames.worker{part}"
+    return os.path.join(output_dir, f"{name}.{container}")
+
+def archive_paths(output_dir, container):
+    return [archive_path(output_dir, container)] + sorted(glob.glob(os.path.join(glob.escape(output_dir), f"frames.worker*.{container}")))
+
+def repair_archives(output_dir):
+    # Archives are only finalised when a run ends, so one that was still open in a
+    # crash ends in frames the index never recorded (maybe torn) and, for zip, has no
+    # central directory. Cut each back to its last indexed frame and finalise it
+    index = load_frame_index(output_dir)
+    for container, repair in (("tar", repair_tar), ("zip", repair_zip)):
+        for path in archive_paths(output_dir, container):
+            if os.path.exists(path):
+                name = os.path.basename(path)
+                repair(path, {record["file"] for record in index.values() if record.get("archive") == name})
+
+def repair_tar(path, names):
+    size = os.path.getsize(path)
+    end = 0
+    try:
+        with tarfile.open(path, "r") as tar:
+            while True:
+                member = tar.next()
+                if member is None:
+                    break
+                # Only the offsets are needed; millions of TarInfos would not fit in memory
+                tar.members.clear()
+                member_end = member.offset_data + -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                if member.name in names and member_end <= size:
+                    end = member_end
+    except tarfile.ReadError:
+        # Torn header at the tail
+        pass
+    if not end:
+        os.remove(path)
+        return
+    # Append mode looks for the end-of-archive blocks, so put them back after the last frame
+    with open(path, "r+b") as f:
+        f.truncate(end)
+        f.seek(end)
+        f.write(bytes(2 * tarfile.BLOCKSIZE))
+
+ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+def repair_zip(path, names):
+    # Walks the local file headers, which every frame has even without a central directory
+    size = os.path.getsize(path)
+    entries = []
+    end = 0
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            header = f.read(ZIP_LOCAL_HEADER.size)
+            if len(header) < ZIP_LOCAL_HEADER.size or header[:4] != zipfile.stringFileHeader:
+                break
+            (_, version, _, flags, compression, mtime, mdate, crc, compressed, file_size, name_size, extra_size) = ZIP_LOCAL_HEADER.unpack(header)
+            name = f.read(name_size).decode("utf-8" if flags & 0x800 else "cp437")
+            data_end = f.tell() + extra_size + compressed
+            if data_end > size:
+                break
+            if name in names:
+                info = zipfile.ZipInfo(name, ((mdate >> 9) + 1980, (mdate >> 5) & 0xF, mdate & 0x1F, mtime >> 11, (mtime >> 5) & 0x3F, (mtime & 0x1F) * 2))
+                info.header_offset, info.flag_bits, info.compress_type, info.extract_version = offset, flags, compression, version
+                info.CRC, info.compress_size, info.file_size = crc, compressed, file_size
+                entries.append(info)
+                end = data_end
+            f.seek(data_end)
+    with open(path, "r+b") as f:
+        f.truncate(end)
+    if not end:
+        os.remove(path)
+        return
+    # No longer a valid zip, so append mode writes a fresh central directory at the end;
+    # listing the kept frames in it makes them readable again
+    with zipfile.ZipFile(path, "a") as archive:
+        for info in entries:
+            archive.filelist.append(info)
+            archive.NameToInfo[info.filename] = info
+
+def open_frame_store(config, step, part=None):
+    if config.container == "stack":
+        return StackStore(config.output_dir, step, config.fps if config.timed else None)
+    encoder = FrameEncoder(config.output_format, config.quality, config.png_compression, config.jpeg_optimize)
+    if config.container in ("tar", "zip"):
+        return ArchiveStore(config.output_dir, encoder, config.container, part, config.timed)
+    return FileStore(config.output_dir, encoder, config.timed)
+
+def prepare_frame_store(config, total_frames, step, frame_shape, video_fps):
+    # The stack is allocated up front (sparse on disk) so every worker can map the same file
+    # Checked for every container, so a crop that doesn't fit fails before any decoding
+    frame_shape = output_transform(config).shape(frame_shape)
+    if config.container != "stack":
+        return
+    path = os.path.join(config.output_dir, STACK_FILE)
+    if config.timed:
+        # One slot per target time over the video's nominal duration, plus slack
+        # for a last frame whose timestamp runs past it
+        shape = (int(total_frames / video_fps * config.fps) + 2,) + tuple(frame_shape)
+    else:
+        shape = (-(-total_frames // step),) + tuple(frame_shape)
+    if os.path.exists(path):
+        existing = np.load(path, mmap_mode="r").shape
+        if existing != shape:
+            raise ValueError(f"'{path}' holds frames of shape {existing}, not {shape}; use reset to start over.")
+        return
+    np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape).flush()
+
+def reset_frame_store(output_dir):
+    # Packed outputs would otherwise be appended to; single files are simply overwritten
+    paths = [os.path.join(output_dir, STACK_FILE)]
+    for container in ("tar", "zip"):
+        paths += archive_paths(output_dir, container)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def current_rss():
+    # Resident bytes now; without /proc the peak stands in, which only errs towards throttling
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def peak_rss_mb(children=False):
+    # This process only, so each worker reports its own; children=True also covers reaped pool workers
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def memory_plan(config, frame_bytes, processes):
+    # (per-process share, encode queue cap) in bytes, or None without a budget
+    if not config.memory_budget_mb:
+        return None
+    share = config.memory_budget_mb * 1024 * 1024 // processes
+    queue_cap = share - PROCESS_BASE_MB * 1024 * 1024 - WORKING_SET_FRAMES * frame_bytes
+    return share, max(queue_cap, frame_bytes)
+
+def budget_worker_count(config, frame_bytes, worker_count, progress):
+    # Fewer workers rather than a budget that can't hold one frame per worker
+    if not config.memory_budget_mb:
+        return worker_count
+    per_worker = PROCESS_BASE_MB * 1024 * 1024 + (WORKING_SET_FRAMES + 1) * frame_bytes
+    fits = max(config.memory_budget_mb * 1024 * 1024 // per_worker, 1)
+    if fits < worker_count:
+        progress.log(f"🧠 Memory budget {config.memory_budget_mb} MB fits {fits} worker(s) at {frame_bytes / 1e6:.0f} MB per frame; "
+                     f"using {fits} instead of {worker_count}")
+        return fits
+    return worker_count
+
+class MemoryBudget:
+    # One process's share of the budget, checked against resident memory at most
+    # every MEMORY_CHECK_INTERVAL_SEC
+    def __init__(self, limit):
+        self.limit = limit
+        self.checked = 0.0
+        self.over = False
+        self.throttled = 0
+
+    def check(self):
+        now = time.perf_counter()
+        if now - self.checked >= MEMORY_CHECK_INTERVAL_SEC:
+            self.checked = now
+            self.over = current_rss() > self.limit
+            self.throttled += self.over
+        return self.over
+
+class FramePool:
+    # Decode buffers handed back once a frame has been scored or encoded, so
+    # large frames aren't reallocated (and page-faulted in) for every decode
+    def __init__(self, spare=FRAME_POOL_SPARE):
+        self.spare = spare
+        self.free = []
+        self.shape = None
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            return self.free.pop() if self.free else None
+
+    def recycle(self, frame):
+        # Only arrays the decoder allocated: views into the ring or a crop never come back
+        if not frame.flags.owndata or frame.shape != self.shape:
+            return
+        with self.lock:
+            if len(self.free) < self.spare:
+                self.free.append(frame)
+
+class PooledCapture:
+    # A capture that decodes into pooled buffers; everything else passes through
+    def __init__(self, cap, pool):
+        self.cap = cap
+        self.pool = pool
+
+    def retrieve(self):
+        ret, frame = self.cap.retrieve(self.pool.take())
+        if ret:
+            self.pool.shape = frame.shape
+        return ret, frame
+
+    def read(self):
+        if not self.cap.grab():
+            return False, None
+        return self.retrieve()
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+class FrameWriter:
+    def __init__(self, threads=ENCODER_THREADS, memory_cap=ENCODER_MEMORY_CAP_MB * 1024 * 1024, timer=None, backend=None, budget=None):
+        self.backend = backend or CPU_BACKEND
+        self.timer = timer or StageTimer()
+        self.memory_cap = memory_cap
+        self.budget = budget
+        self.pool = FramePool()
+        self.tasks = queue.Queue()
+        self.cond = threading.Condition()
+        self.pending_bytes = 0
+        self.pending_frames = 0
+        self.max_depth = 0
+        self.stall_time = 0.0
+        self.idle_time = 0.0
+        self.written = 0
+        self.bytes_written = 0
+        self.failed = 0
+        self.error = None
+        self.stores = set()
+        self.indexes = set()
+        self.threads = [threading.Thread(target=self._encode_loop, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, store, frame_id, frame, record=None, index=None, timestamp=None):
+        if self.error is not None:
+            # A frame already failed: stop decoding now rather than at the next checkpoint
+            self.drain()
+        size = frame.nbytes
+        cap = self.memory_cap
+        if self.budget is not None and self.budget.check():
+            # Over this process's share: wait for the queue to empty before adding a frame
+            cap = 0
+        with self.cond:
+            # Backpressure: block the decoder while queued frames exceed the memory cap
+            t0 = time.perf_counter()
+            stalled = False
+            while self.pending_frames and self.pending_bytes + size > cap:
+                self.cond.wait()
+                stalled = True
+            t1 = time.perf_counter()
+            self.stall_time += t1 - t0
+            if stalled:
+                self.timer.add("writer_stall", t0, t1)
+            self.pending_bytes += size
+            self.pending_frames += 1
+            self.max_depth = max(self.max_depth, self.pending_frames)
+            self.stores.add(store)
+            if index is not None:
+                self.indexes.add(index)
+        self.tasks.put((store, frame_id, frame, record, index, timestamp))
+
+    def _encode_loop(self):
+        while True:
+            wait_start = time.perf_counter()
+            task = self.tasks.get()
+            received = time.perf_counter()
+            idle = received - wait_start
+            if task is None:
+                break
+            store, frame_id, frame, record, index, timestamp = task
+            size = error = None
+            t0 = t1 = t2 = received
+            try:
+                size, checksum, t0, t1, t2 = store.write(frame_id, frame, self.backend, timestamp)
+                # Indexed only once the frame is fully written
+                if index is not None:
+                    index.add(dict(record, **store.locate(frame_id, timestamp), size=size, crc32=checksum))
+            except Exception as e:
+                # A failed encode or write (full disk, cv2.error) fails the frame and is
+                # raised from the next drain, instead of killing this thread
+                size, error = None, e
+            finally:
+                with self.cond:
+                    # Encoder threads share the timer, so they update it under the lock
+                    self.timer.add("encoder_idle", wait_start, received)
+                    self.timer.add("encode", t0, t1)
+                    self.timer.add("write", t1, t2)
+                    self.idle_time += idle
+                    self.written += size is not None
+                    self.bytes_written += size or 0
+                    self.failed += size is None
+                    self.error = self.error or error
+                    self.pending_bytes -= frame.nbytes
+                    self.pending_frames -= 1
+                    self.cond.notify_all()
+                self.pool.recycle(frame)
+
+    def drain(self):
+        with self.cond:
+            while self.pending_frames:
+                self.cond.wait()
+            error, self.error = self.error, None
+            failed = self.failed
+        if error is not None:
+            # Before the checkpoint is written, so the session never covers a frame that failed
+            # and the next run writes it again
+            raise ValueError(f"Saving frames failed ({failed} frame(s) not written): {error}") from error
+        # Checkpoints call this first, so the index never lags the session
+        # and never points past what the archives hold
+        for store in self.stores:
+            store.flush()
+        for index in self.indexes:
+            index.flush()
+
+    def close(self):
+        self.drain()
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        return self.stats()
+
+    def stats(self):
+        # Decoder stalling on a full queue means encode/disk is the bottleneck;
+        # encoders idling on an empty queue means decode is
+        bound = "I/O-bound" if self.stall_time > self.idle_time / len(self.threads) else "decode-bound"
+        return encode_stats(self.written, self.bytes_written, self.failed, self.max_depth, self.stall_time, self.idle_time, bound,
+                            self.budget.throttled if self.budget is not None else 0)
+
+def encode_stats(written=0, bytes_written=0, failed=0, max_depth=0, stall=0.0, idle=0.0, bound="-", throttled=0):
+    # Processes without a FrameWriter (ring decoder, inline ring encode) report the same shape
+    return {
+        "written": written,
+        "bytes": bytes_written,
+        "failed": failed,
+        "max_depth": max_depth,
+        "stall": round(stall, 2),
+        "idle": round(idle, 2),
+        "bound": bound,
+        "throttled": throttled
+    }
+
+def filter_stack(batch, apply):
+    # Run a 3x3 cv2 filter over N frames in one call by stacking them vertically;
+    # each frame gets its own reflected border rows, so the result matches
+    # filtering the frames one at a time
+    n, h, w = batch.shape
+    if n == 1:
+        return apply(batch[0])[None]
+    padded = np.pad(batch, ((0, 0), (1, 1), (0, 0)), mode="reflect")
+    out = apply(padded.reshape(n * (h + 2), w))
+    return out.reshape(n, h + 2, w)[:, 1:-1]
+
+def metric_laplacian(batch, ddepth=cv2.CV_64F):
+    lap = filter_stack(batch, lambda img: cv2.Laplacian(img, ddepth))
+    return lap.var(axis=(1, 2), dtype=np.float64)
+
+def metric_tenengrad(batch, ddepth=cv2.CV_64F):
+    gx = filter_stack(batch, lambda img: cv2.Sobel(img, ddepth, 1, 0))
+    gy = filter_stack(batch, lambda img: cv2.Sobel(img, ddepth, 0, 1))
+    return (gx * gx + gy * gy).mean(axis=(1, 2), dtype=np.float64)
+
+def metric_fft(batch, ddepth=cv2.CV_64F):
+    # Share of spectral energy above FFT_HIGH_FREQ_CUTOFF cycles/pixel, DC excluded
+    n, h, w = batch.shape
+    spectrum = np.abs(np.fft.rfft2(batch.astype(np.float32 if ddepth == cv2.CV_32F else np.float64), axes=(1, 2))) ** 2
+    radius = np.hypot(np.fft.fftfreq(h)[:, None], np.fft.rfftfreq(w)[None, :])
+    spectrum[:, 0, 0] = 0
+    total = spectrum.sum(axis=(1, 2))
+    high = spectrum[:, radius > FFT_HIGH_FREQ_CUTOFF].sum(axis=1)
+    return np.divide(high, total, out=np.zeros(n), where=total > 0)
+
+def metric_tile_max(batch, ddepth=cv2.CV_64F):
+    # Sharpest tile wins, so a frame with a focused subject and a soft background still passes
+    n, h, w = batch.shape
+    lap = filter_stack(batch, lambda img: cv2.Laplacian(img, ddepth))
+    th, tw = h // TILE_MAX_GRID, w // TILE_MAX_GRID
+    tiles = lap[:, :th * TILE_MAX_GRID, :tw * TILE_MAX_GRID].reshape(n, TILE_MAX_GRID, th, TILE_MAX_GRID, tw)
+    return tiles.var(axis=(2, 4), dtype=np.float64).max(axis=(1, 2))
+
+SHARPNESS_METRICS = {
+    "laplacian": metric_laplacian,
+    "tenengrad": metric_tenengrad,
+    "fft": metric_fft,
+    "tile_max": metric_tile_max,
+}
+
+def register_metric(name, fn):
+    SHARPNESS_METRICS[name] = fn
+
+def to_gray_stack(frames):
+    frames = np.asarray(frames)
+    if frames.ndim == 4:
+        return np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames])
+    return frames
+
+def score_frames(frames, metric="laplacian", depth="float64"):
+    # frames: (N, H, W) gray or (N, H, W, 3) BGR, scored in one vectorized call
+    ddepth = cv2.CV_32F if depth == "float32" else cv2.CV_64F
+    return SHARPNESS_METRICS[metric](to_gray_stack(frames), ddepth)
+
+def benchmark_metrics(video_path, samples=64, batch_size=16, scale=1.0):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < samples:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    if not frames:
+        return {}
+
+    stack = np.stack(frames)
+    results = {}
+    for name in SHARPNESS_METRICS:
+        start = time.perf_counter()
+        for i in range(0, len(stack), batch_size):
+            score_frames(stack[i:i + batch_size], name)
+        elapsed = time.perf_counter() - start
+        results[name] = round(len(stack) / elapsed, 1) if elapsed else 0.0
+    return results
+
+def capture_params(threads):
+    # FFmpeg's own decode threads; 0 leaves the backend's default
+    if threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+        return [cv2.CAP_PROP_N_THREADS, threads]
+    return []
+
+def apply_cv_threads(threads):
+    # OpenCV's worker threads for this process (colour conversion, filters, encode)
+    if threads:
+        cv2.setNumThreads(threads)
+
+class CPUBackend:
+    # Decode, grayscale/resize, Laplacian variance and encode on plain cv2/NumPy arrays
+    name = "CPU"
+
+    def __init__(self, note=""):
+        self.note = note
+
+    def describe(self):
+        return f"{self.name} ({self.note})" if self.note else self.name
+
+    def open_capture(self, video_path, threads=0):
+        params = capture_params(threads)
+        return cv2.VideoCapture(video_path, cv2.CAP_ANY, params) if params else cv2.VideoCapture(video_path)
+
+    def gray(self, region, size, gray, small):
+        cv2.cvtColor(region, cv2.COLOR_BGR2GRAY, dst=gray)
+        if small is None:
+            return gray
+        cv2.resize(gray, size, dst=small, interpolation=cv2.INTER_AREA)
+        return small
+
+    def laplacian_variance(self, src, ddepth, lap):
+        # Same result as metric_laplacian, into a reused buffer
+        cv2.Laplacian(src, ddepth, dst=lap)
+        _, std = cv2.meanStdDev(lap)
+        return float(std[0, 0]) ** 2
+
+    def to_host(self, src):
+        return src
+
+    def encode(self, ext, frame, params=()):
+        return cv2.imencode(ext, frame, params)
+
+class OpenCLBackend(CPUBackend):
+    # Same calls on cv2.UMat, which OpenCV dispatches to OpenCL kernels. Only the
+    # frame upload and the two meanStdDev numbers cross the bus; JPEG encoding
+    # has no OpenCL path in OpenCV and stays on the CPU
+    name = "OpenCL"
+
+    def open_capture(self, video_path, threads=0):
+        # Hardware decode where the OpenCV build and driver support it
+        if hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            cap = cv2.VideoCapture(video_path, cv2.CAP_ANY,
+                                   [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY] + capture_params(threads))
+            if cap.isOpened():
+                return cap
+        return super().open_capture(video_path, threads)
+
+    def gray(self, region, size, gray, small):
+        src = cv2.cvtColor(cv2.UMat(np.ascontiguousarray(region)), cv2.COLOR_BGR2GRAY)
+        if small is not None:
+            src = cv2.resize(src, size, interpolation=cv2.INTER_AREA)
+        return src
+
+    def laplacian_variance(self, src, ddepth, lap):
+        _, std = cv2.meanStdDev(cv2.Laplacian(src, ddepth))
+        # UMat in, UMat out: the 1x1 result is the only download
+        return float(std.get()[0, 0]) ** 2
+
+    def to_host(self, src):
+        return src.get()
+
+CPU_BACKEND = CPUBackend()
+
+def select_backend(processing_mode="CPU"):
+    # Called in the process that will use it, so no OpenCL context is shared across a fork
+    if processing_mode != "GPU":
+        return CPU_BACKEND
+    try:
+        if not cv2.ocl.haveOpenCL():
+            return CPUBackend("GPU requested, no OpenCL device")
+        cv2.ocl.setUseOpenCL(True)
+        if not cv2.ocl.useOpenCL():
+            return CPUBackend("GPU requested, OpenCL disabled")
+        return OpenCLBackend(cv2.ocl.Device.getDefault().name())
+    except cv2.error as e:
+        return CPUBackend(f"GPU requested, OpenCL failed: {e}")
+
+class SharpnessScorer:
+    def __init__(self, metric="laplacian", scale=1.0, roi="full", depth="float64", center_fraction=0.5, tiles=3, tile_fraction=0.5, calibration=None, backend=None):
+        self.metric = metric
+        self.scale = scale
+        self.roi = roi
+        self.ddepth = cv2.CV_32F if depth == "float32" else cv2.CV_64F
+        self.center_fraction = center_fraction
+        self.tiles = tiles
+        self.tile_fraction = tile_fraction
+        self.calibration = calibration
+        self.backend = backend or CPU_BACKEND
+        self.shape = None
+        self.regions = []
+        self.buffers = []
+
+    def _prepare(self, shape):
+        # Regions and scratch buffers are computed once per frame size and reused
+        h, w = shape[:2]
+        if self.roi == "center":
+            ch, cw = int(h * self.center_fraction), int(w * self.center_fraction)
+            y, x = (h - ch) // 2, (w - cw) // 2
+            self.regions = [(y, y + ch, x, x + cw)]
+        elif self.roi == "tiles":
+            # A tiles x tiles grid of windows, each covering tile_fraction of its cell
+            self.regions = []
+            cell_h, cell_w = h // self.tiles, w // self.tiles
+            th, tw = int(cell_h * self.tile_fraction), int(cell_w * self.tile_fraction)
+            for row in range(self.tiles):
+                for col in range(self.tiles):
+                    y = row * cell_h + (cell_h - th) // 2
+                    x = col * cell_w + (cell_w - tw) // 2
+                    self.regions.append((y, y + th, x, x + tw))
+        else:
+            self.regions = [(0, h, 0, w)]
+
+        self.buffers = []
+        for y0, y1, x0, x1 in self.regions:
+            gray = np.empty((y1 - y0, x1 - x0), np.uint8)
+            size = (max(int((x1 - x0) * self.scale), 1), max(int((y1 - y0) * self.scale), 1))
+            small = np.empty((size[1], size[0]), np.uint8) if self.scale != 1.0 else None
+            lap = None
+            if self.metric == "laplacian":
+                lap = np.empty((size[1], size[0]), np.float32 if self.ddepth == cv2.CV_32F else np.float64)
+            self.buffers.append((gray, small, size, lap))
+        self.shape = shape
+
+    def raw_score(self, frame):
+        if frame.shape != self.shape:
+            self._prepare(frame.shape)
+        scores = []
+        for (y0, y1, x0, x1), (gray, small, size, lap) in zip(self.regions, self.buffers):
+            src = self.backend.gray(frame[y0:y1, x0:x1], size, gray, small)
+            if lap is not None:
+                scores.append(self.backend.laplacian_variance(src, self.ddepth, lap))
+            else:
+                # The batched metrics are NumPy code and run on the host
+                scores.append(float(SHARPNESS_METRICS[self.metric](self.backend.to_host(src)[None], self.ddepth)[0]))
+        return sum(scores) / len(scores)
+
+    def score(self, frame):
+        # Mapped into the units of full-resolution Laplacian variance so blur_thresh keeps its meaning
+        return calibrated_score(self.raw_score(frame), self.calibration)
+
+def calibrate_sharpness(video_path, settings, samples=SHARPNESS_CALIBRATION_SAMPLES):
+    # Score frames spread across the video with the mode and with the exact
+    # full-frame float64 score, then pair the two by rank (quantile matching).
+    # Returns ([raw knots], [exact knots]), both ascending, or None
+    scorer = SharpnessScorer(**dict(settings, calibration=None))
+    reference = SharpnessScorer()
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    raw, exact = [], []
+    for i in range(samples):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames * i // samples)
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        raw.append(scorer.raw_score(frame))
+        exact.append(reference.raw_score(frame))
+    cap.release()
+    # One knot per raw value, so ties don't make the map jump
+    knots = dict(zip(sorted(raw), sorted(exact)))
+    if not knots or max(knots) <= 0:
+        return None
+    return [list(knots), list(knots.values())]
+
+def calibrated_score(raw, calibration):
+    # Piecewise linear between the knots and proportional beyond them, so the
+    # map is monotone and keeps scores outside the sampled range apart
+    if not calibration:
+        return raw
+    xs, ys = calibration
+    if raw >= xs[-1]:
+        return raw * ys[-1] / xs[-1] if xs[-1] > 0 else ys[-1]
+    if raw <= xs[0]:
+        return raw * ys[0] / xs[0] if xs[0] > 0 else ys[0]
+    return float(np.interp(raw, xs, ys))
+
+def map_blur_threshold(threshold, calibration):
+    # Threshold in a mode's raw score units that matches `threshold` at full resolution
+    return calibrated_score(threshold, calibration and calibration[::-1])
+
+def sharpness_settings(preset, video_path):
+    settings = dict(SHARPNESS_PRESETS[preset])
+    if settings:
+        settings["calibration"] = calibrate_sharpness(video_path, settings)
+    return settings
+
+def sketch_bin(score):
+    if score < SKETCH_MIN_SCORE:
+        return 0
+    return min(int(math.log(score / SKETCH_MIN_SCORE) / math.log(SKETCH_GAMMA)) + 1, SKETCH_BINS - 1)
+
+def sketch_value(b):
+    # Geometric middle of the bin
+    return 0.0 if b == 0 else SKETCH_MIN_SCORE * SKETCH_GAMMA ** (b - 0.5)
+
+def shared_sketches(job_count, worker_count):
+    # One row of bin counts per (video, worker); each worker only writes its own row
+    return mp.Array("q", job_count * worker_count * SKETCH_BINS, lock=False)
+
+def job_sketch(sketches, job_count, job_id, proc_id):
+    rows = np.frombuffer(sketches, dtype=np.int64).reshape(job_count, -1, SKETCH_BINS)[job_id]
+    return ScoreSketch(rows, proc_id)
+
+class ScoreSketch:
+    # Score distribution in fixed memory; merging is adding rows, so a quantile
+    # read from the shared rows covers every worker's frames so far
+    def __init__(self, rows=None, row=0):
+        self.rows = rows if rows is not None else np.zeros((1, SKETCH_BINS), np.int64)
+        self.counts = self.rows[row]
+
+    def add(self, score):
+        self.counts[sketch_bin(score)] += 1
+
+    def quantile(self, q):
+        # None until there are enough samples to trust
+        cumulative = np.cumsum(self.rows.sum(axis=0))
+        total = int(cumulative[-1])
+        if total < ADAPTIVE_MIN_SAMPLES:
+            return None
+        return sketch_value(int(np.searchsorted(cumulative, q * total)))
+
+    def total(self):
+        return int(self.rows.sum())
+
+class BlurGate:
+    # Whether a score is sharp enough: always above the fixed threshold, and in
+    # the adaptive modes also above the running percentile or local median
+    def __init__(self, blur_threshold, mode="fixed", keep_percent=50.0, local_ratio=1.0, sketch=None, step=1):
+        self.threshold = blur_threshold
+        self.mode = mode
+        self.keep_percent = keep_percent
+        self.local_ratio = local_ratio
+        self.sketch = sketch or ScoreSketch()
+        self.max_gap = ADAPTIVE_WINDOW * step
+        self.window = deque()
+        self.sorted = []
+        self.last_id = None
+        self.cutoff = None
+        self.since_refresh = ADAPTIVE_REFRESH
+
+    def keep(self, score, frame_id=None):
+        if self.mode == "fixed":
+            return score > self.threshold
+        self.sketch.add(score)
+        if self.mode == "percentile":
+            # Re-reading the shared sketch every few samples is plenty; it moves slowly
+            self.since_refresh += 1
+            if self.since_refresh >= ADAPTIVE_REFRESH:
+                self.cutoff = self.sketch.quantile(1.0 - self.keep_percent / 100.0)
+                self.since_refresh = 0
+            cutoff = self.cutoff
+        else:
+            cutoff = self.local_cutoff(frame_id)
+            self.push(score, frame_id)
+        return score > self.threshold and (cutoff is None or score >= cutoff)
+
+    def local_cutoff(self, frame_id):
+        # A jump to another part of the video (a new segment) starts a new window
+        if frame_id is not None and self.last_id is not None and not 0 < frame_id - self.last_id <= self.max_gap:
+            self.window.clear()
+            self.sorted.clear()
+        if len(self.window) >= ADAPTIVE_WINDOW // 2:
+            median = self.sorted[len(self.sorted) // 2]
+        else:
+            # Until the window fills, the run-wide median stands in
+            median = self.sketch.quantile(0.5)
+        return None if median is None else median * self.local_ratio
+
+    def push(self, score, frame_id):
+        self.last_id = frame_id
+        self.window.append(score)
+        bisect.insort(self.sorted, score)
+        if len(self.window) > ADAPTIVE_WINDOW:
+            del self.sorted[bisect.bisect_left(self.sorted, self.window.popleft())]
+
+def blur_gate(config, sketch=None, step=1):
+    return BlurGate(config.blur_threshold, config.blur_mode, config.keep_percent, config.local_ratio, sketch, step)
+
+def video_content_hash(video_path):
+    # Size plus evenly spaced 1 MB chunks: identifies the content without reading a multi-GB file
+    size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_path, "rb") as f:
+        for i in range(SCAN_HASH_CHUNKS):
+            f.seek(max(size - SCAN_HASH_CHUNK_BYTES, 0) * i // max(SCAN_HASH_CHUNKS - 1, 1))
+            digest.update(f.read(SCAN_HASH_CHUNK_BYTES))
+    return digest.hexdigest()
+
+def scan_path(video_path, blur_scoring=DEFAULT_BLUR_SCORING):
+    preset = blur_scoring.lower().replace(" ", "_")
+    return os.path.join(SCAN_CACHE_DIR, f"{video_content_hash(video_path)}.{preset}.v{SCAN_CACHE_VERSION}.npy")
+
+def frame_step(video_fps, fps):
+    # Rounded, not truncated: 29.97 fps at 10 fps is every 3rd frame, not every 2nd
+    return max(int(round(video_fps / fps)), 1)
+
+def run_scan_worker(video_path, path, sharpness, processing_mode, segments, counters, proc_id, stop=None):
+    # Scores every frame of each segment into the shared sidecar; frames that fail
+    # to decode keep score -1 and are never selected
+    backend = select_backend(processing_mode)
+    scorer = SharpnessScorer(**sharpness, backend=backend)
+    scan = np.load(path, mmap_mode="r+")
+    cap = backend.open_capture(video_path)
+    progress = WorkerCounters(counters, proc_id)
+    scanned = 0
+    while True:
+        task = segments.get()
+        if task is None:
+            break
+        if is_stopped(stop):
+            # Cancelled: skip what's left of the queue up to this worker's sentinel
+            continue
+        start, end = task
+        progress.set(seg_start=start, seg_end=end, seg_done=0)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for frame_id in range(start, end):
+            if is_stopped(stop) or not cap.grab():
+                break
+            keyframe = cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            scan[frame_id] = (scorer.score(frame), cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, keyframe)
+            scanned += 1
+            progress.set(frames=scanned, sampled=scanned, seg_done=frame_id + 1 - start)
+    cap.release()
+    scan.flush()
+
+def load_scan(config, progress, worker_count=1):
+    # Cached sidecar for this video and scoring preset, built on first use.
+    # None when the run is cancelled while scanning
+    path = scan_path(config.video_path, config.blur_scoring)
+    if os.path.exists(path):
+        progress.log(f"🗺 Using cached scan '{path}'")
+        return np.load(path, mmap_mode="r")
+
+    cap = cv2.VideoCapture(config.video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    gop = estimate_gop_size(cap, 0, video_fps)
+    cap.release()
+    sharpness = sharpness_settings(config.blur_scoring, config.video_path)
+    os.makedirs(SCAN_CACHE_DIR, exist_ok=True)
+    # Written under a temporary name and renamed once complete, so an interrupted scan is never reused
+    partial = f"{path[:-4]}.{os.getpid()}.partial.npy"
+    scan = np.lib.format.open_memmap(partial, mode="w+", dtype=SCAN_DTYPE, shape=(total_frames,))
+    scan["score"] = -1
+    scan["timestamp"] = np.nan
+    scan.flush()
+    del scan
+
+    segment_size = -(-max(MIN_SEGMENT_FRAMES, -(-total_frames // (worker_count * 4))) // gop) * gop
+    segments = split_segments([[0, total_frames]], segment_size)
+    worker_count = min(worker_count, len(segments))
+    task_queue = mp.Queue()
+    for segment in segments:
+        task_queue.put(segment)
+    for _ in range(worker_count):
+        task_queue.put(None)
+    counters = progress_counters(worker_count)
+    progress.log(f"🗺 Scanning {total_frames} frames with {worker_count} worker(s) (scoring '{config.blur_scoring}')")
+    progress.workers_started(worker_count)
+    start_time = time.time()
+    stop = mp.Event()
+    processes = [mp.Process(target=run_scan_worker, args=(config.video_path, partial, sharpness, config.processing_mode, task_queue, counters, i, stop))
+                 for i in range(worker_count)]
+    for p in processes:
+        p.start()
+    monitor_workers(processes, counters, progress, worker_count, total_frames, stop)
+    for p in processes:
+        p.join()
+    if stop.is_set():
+        # A partial scan is never cached; the next run scans again from the start
+        os.remove(partial)
+        progress.log("⏹ Scan cancelled")
+        return None
+    failed = [i for i, p in enumerate(processes) if p.exitcode != 0]
+    if failed:
+        # Segments a dead worker took are still unscored; caching them would drop their frames from every later run
+        os.remove(partial)
+        raise ValueError(f"Scan worker(s) {', '.join(map(str, failed))} exited with an error; the scan was not saved.")
+    os.replace(partial, path)
+    elapsed = time.time() - start_time
+    progress.log(f"🗺 Scan saved as '{path}' in {elapsed:.1f}s ({total_frames / elapsed if elapsed else 0:.0f} frames/s)")
+    return np.load(path, mmap_mode="r")
+
+class ScanSelection:
+    # The frames a scan keeps for one threshold, step and selection policy, found
+    # with NumPy over the whole sidecar instead of by decoding
+    def __init__(self, scan, step, config):
+        self.scores = scan["score"]
+        self.timestamps = scan["timestamp"] if config.timed else None
+        if config.selection == "best":
+            # Windows on absolute multiples of step, as in iter_best_of_window
+            padded = np.full(-(-len(self.scores) // step) * step, -np.inf, np.float32)
+            padded[:len(self.scores)] = self.scores
+            windows = padded.reshape(-1, step)
+            candidates = np.arange(len(windows)) * step + windows.argmax(axis=1)
+        elif config.timed:
+            # First frame at or after each target time, as TimeSampler picks while decoding
+            targets = np.floor(np.nan_to_num(scan["timestamp"], nan=-np.inf) * config.fps + 1e-6)
+            reached = np.maximum.accumulate(np.concatenate(([-1.0], targets)))[:-1]
+            candidates = np.flatnonzero(targets > reached)
+        else:
+            candidates = np.arange(0, len(self.scores), step)
+        self.ids = candidates[scan_keep_mask(self.scores[candidates], config, step)]
+        keyframes = np.flatnonzero(scan["keyframe"])
+        # Backends that flag most frames as keyframes aren't reporting real ones
+        self.keyframes = keyframes if len(keyframes) * 2 < len(self.scores) else keyframes[:0]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def between(self, start, end):
+        return self.ids[np.searchsorted(self.ids, start):np.searchsorted(self.ids, end)]
+
+    def should_seek(self, position, frame_id):
+        # A seek restarts decoding at the last keyframe before the target, so it only
+        # saves work when that keyframe lies past the current position
+        if frame_id < position:
+            return True
+        if frame_id - position < SCAN_MIN_SEEK_GAP:
+            return False
+        if not len(self.keyframes):
+            return True
+        i = np.searchsorted(self.keyframes, frame_id, side="right")
+        return i > 0 and self.keyframes[i - 1] > position
+
+def scan_keep_mask(scores, config, step):
+    # With the whole video's scores at hand the percentile is exact; the local
+    # median runs the same rolling window as a live extraction
+    scored = scores >= 0
+    if config.blur_mode == "percentile" and scored.any():
+        cutoff = np.quantile(scores[scored], 1.0 - config.keep_percent / 100.0)
+        return scored & (scores > config.blur_threshold) & (scores >= cutoff)
+    if config.blur_mode == "local":
+        gate = blur_gate(config)
+        keep = np.zeros(len(scores), bool)
+        for i in np.flatnonzero(scored):
+            keep[i] = gate.keep(float(scores[i]), int(i))
+        return keep
+    return scores > config.blur_threshold
+
+def iter_scanned_frames(cap, start_frame, end_frame, scan, timer):
+    position = None
+    for frame_id in scan.between(start_frame, end_frame):
+        frame_id = int(frame_id)
+        if position is None or scan.should_seek(position, frame_id):
+            t0 = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            timer.add("seek", t0, time.perf_counter())
+            position = frame_id
+        t0 = time.perf_counter()
+        while position < frame_id:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        timer.add("decode", t0, time.perf_counter())
+        timestamp = float(scan.timestamps[frame_id]) if scan.timestamps is not None else None
+        yield frame_id, frame, frame_id + 1, timestamp
+
+def iter_candidates(cap, start_frame, end_frame, step, mode, ranker, timer, scan=None, sampler=None):
+    # Yields (frame_id, frame, done_until, timestamp): the frame to test, how far the
+    # video is covered by it, and its decoder timestamp when sampling by time
+    if mode == "scan":
+        yield from iter_scanned_frames(cap, start_frame, end_frame, scan, timer)
+        return
+    if mode == "time":
+        for frame_id, frame, timestamp in sampler.frames(cap, start_frame, end_frame, timer):
+            yield frame_id, frame, frame_id + 1, timestamp
+        return
+    if mode == "best":
+        for frame_id, frame, done_until in iter_best_of_window(cap, start_frame, end_frame, step, ranker, timer):
+            yield frame_id, frame, done_until, None
+        return
+    for frame_id, frame in iter_sampled_frames(cap, start_frame, end_frame, step, mode, timer):
+        yield frame_id, frame, frame_id + 1, None
+
+def job_sampler(job):
+    if job["mode"] != "time":
+        return None
+    return TimeSampler(job["config"].fps, job["video_fps"])
+
+def frame_filename(output_dir, frame_id, ext=".jpg", timestamp=None):
+    # Time-sampled frames carry their timestamp so names sort and read as video time
+    if timestamp is not None:
+        return os.path.join(output_dir, f"frame_{frame_id:06}_{timestamp:010.3f}s{ext}")
+    return os.path.join(output_dir, f"frame_{frame_id:06}{ext}")
+
+def index_path(output_dir, part=None):
+    # Workers append to their own part file; the parent folds parts into the main index
+    name = INDEX_FILE if part is None else f"frames.worker{part}.jsonl"
+    return os.path.join(output_dir, name)
+
+def index_paths(output_dir):
+    return [index_path(output_dir)] + sorted(glob.glob(os.path.join(glob.escape(output_dir), "frames.worker*.jsonl")))
+
+def load_frame_index(output_dir):
+    # frame id -> latest record; a later "removed" entry drops the frame.
+    # A torn last line from a crash is skipped
+    frames = {}
+    for path in index_paths(output_dir):
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("removed"):
+                    frames.pop(record["id"], None)
+                else:
+                    frames[record["id"]] = record
+    return frames
+
+def merge_index_parts(output_dir):
+    parts = index_paths(output_dir)[1:]
+    if not parts:
+        return
+    with open(index_path(output_dir), "a") as main:
+        for part in parts:
+            with open(part, "r") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        main.write(line)
+        main.flush()
+        os.fsync(main.fileno())
+    for part in parts:
+        os.remove(part)
+
+def reset_frame_index(output_dir):
+    for path in index_paths(output_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+def frame_location(record):
+    return {key: record[key] for key in ("file", "archive", "slot", "encoding", "transform") if key in record}
+
+class FrameIndex:
+    # Which frames of an output folder are already on disk, answered from the
+    # index instead of a stat per frame; new frames are appended as they land
+    def __init__(self, output_dir, part=None, video_fps=0.0):
+        self.output_dir = output_dir
+        self.path = index_path(output_dir, part)
+        self.video_fps = video_fps
+        # Only where each frame is, so a large index stays small in memory
+        self.locations = {frame_id: frame_location(record) for frame_id, record in load_frame_index(output_dir).items()}
+        self.lock = threading.Lock()
+        self.file = None
+
+    def __contains__(self, frame_id):
+        return frame_id in self.locations
+
+    def __len__(self):
+        return len(self.locations)
+
+    def holds(self, frame_id, store, timestamp=None, transform=""):
+        # Indexed in the store this run writes to with the same crop/resize; a frame
+        # saved in another format, container or size is written again
+        location = self.locations.get(frame_id)
+        return location is not None and location.get("transform", "") == transform and store.holds(location, frame_id, timestamp)
+
+    def record(self, frame_id, score, timestamp=None, transform=""):
+        # The decoder's timestamp when there is one, otherwise the nominal one
+        if timestamp is None and self.video_fps:
+            timestamp = frame_id / self.video_fps
+        timestamp = round(timestamp, 3) if timestamp is not None else None
+        # The writer adds where the frame landed (file, archive or slot), its size and checksum
+        record = {"id": frame_id, "timestamp": timestamp, "score": round(score, 3)}
+        if transform:
+            record["transform"] = transform
+        return record
+
+    def _append(self, entry):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a")
+            self.file.write(json.dumps(entry) + "\n")
+
+    def add(self, entry):
+        self._append(entry)
+        self.locations[entry["id"]] = frame_location(entry)
+
+    def remove(self, frame_id):
+        self._append({"id": frame_id, "removed": True})
+        self.locations.pop(frame_id, None)
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def dhash(frame):
+    # 64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+class FrameDeduper:
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.first = None
+        self.last_hash = None
+        self.suppressed = 0
+
+    def is_duplicate(self, frame, frame_id):
+        # Compared against the last *kept* frame, so a slow drift still gets through eventually
+        h = dhash(frame)
+        if self.last_hash is not None and hamming(h, self.last_hash) <= self.max_distance:
+            self.suppressed += 1
+            return True
+        if self.first is None:
+            self.first = (h, frame_id)
+        self.last_hash = h
+        return False
+
+    def boundary(self):
+        if self.first is None:
+            return None
+        return {"first_hash": self.first[0], "first_id": self.first[1], "last_hash": self.last_hash}
+
+def merge_dedup_boundaries(boundaries, output_dir, store, max_distance=DEDUP_MAX_DISTANCE):
+    # Workers dedup within their own segments; the first kept frame of each
+    # segment is then checked against the last kept frame before it
+    removed = 0
+    previous = None
+    index = FrameIndex(output_dir)
+    records = load_frame_index(output_dir)
+    for start in sorted(boundaries.keys()):
+        boundary = boundaries[start]
+        if boundary is None:
+            continue
+        if previous is not None and hamming(boundary["first_hash"], previous) <= max_distance:
+            # Only frames actually in the index count; the caller takes them off the saved total
+            if boundary["first_id"] in index:
+                store.remove(records[boundary["first_id"]])
+                index.remove(boundary["first_id"])
+                removed += 1
+        previous = boundary["last_hash"]
+    index.close()
+    return removed
+
+def is_stopped(stop):
+    return stop is not None and stop.is_set()
+
+def process_ranges(cap, ranges, step, mode, output_dir, blur_threshold, checkpoint, writer, on_progress=None, scorer=None, ranker=None, deduper=None,
+                   index=None, store=None, scan=None, gate=None, sampler=None, transform=None, stop=None):
+    scorer = scorer or SharpnessScorer()
+    transform = transform or OutputTransform()
+    # Decoded frames land in buffers the writer hands back once they are scored or encoded
+    cap = PooledCapture(cap, writer.pool)
+    gate = gate or BlurGate(blur_threshold)
+    index = index if index is not None else FrameIndex(output_dir)
+    store = store or FileStore(output_dir, FrameEncoder())
+    # Decoding and scoring share the writer's timer so one summary covers the whole pipeline
+    timer = writer.timer
+    stats = {"sampled": 0, "saved": 0, "suppressed": 0, "stopped": False}
+    for range_start, range_end in ranges:
+        cursor = range_start
+        for frame_id, frame, done_until, timestamp in iter_candidates(cap, range_start, range_end, step, mode, ranker, timer, scan, sampler):
+            if is_stopped(stop):
+                # Only what was covered is marked done, so a later run resumes right here
+                stats["stopped"] = True
+                break
+            kept = 0
+            t0 = time.perf_counter()
+            # Scan-selected frames were already scored in the first pass
+            score = float(scan.scores[frame_id]) if scan is not None else scorer.score(frame)
+            if gate.keep(score, frame_id):
+                if deduper and deduper.is_duplicate(frame, frame_id):
+                    stats["suppressed"] += 1
+                else:
+                    kept = 1
+            timer.add("score", t0, time.perf_counter())
+            if kept and not index.holds(frame_id, store, timestamp, transform.describe()):
+                output = transform.apply(frame)
+                writer.submit(store, frame_id, output, index.record(frame_id, score, timestamp, transform.describe()), index, timestamp)
+                if output is not frame:
+                    writer.pool.recycle(frame)
+            else:
+                writer.pool.recycle(frame)
+            # Frames already in the index count as kept without being rewritten
+
+            stats["sampled"] += 1
+            stats["saved"] += kept
+            checkpoint.mark_done(cursor, done_until, kept)
+            if on_progress:
+                on_progress(done_until - cursor, stats)
+            cursor = done_until
+        if stats["stopped"]:
+            break
+
+        # Frames after the last sampled one in this range still count as completed
+        checkpoint.mark_done(cursor, range_end)
+        if on_progress and range_end > cursor:
+            on_progress(range_end - cursor, stats)
+
+    return stats
+
+class WorkerJob:
+    # Per-video state a pool worker keeps while it pulls that video's segments
+    def __init__(self, job, proc_id, writer=None, backend=None, sketch=None):
+        config = job["config"]
+        self.config = config
+        self.mode = job["mode"]
+        self.step = job["step"]
+        self.backend = backend or CPU_BACKEND
+        self.scorer = SharpnessScorer(**job["sharpness"], backend=self.backend)
+        self.ranker = window_ranker(job["sharpness"], self.backend)
+        self.index = FrameIndex(config.output_dir, proc_id, job["video_fps"])
+        self.store = open_frame_store(config, self.step, proc_id)
+        self.sampler = job_sampler(job)
+        self.transform = output_transform(config)
+        self.scan = None
+        self.gate = blur_gate(config, sketch, self.step)
+        if job["scan"]:
+            # The scan already applied the whole policy; only the fixed floor is left to check
+            self.scan = ScanSelection(np.load(job["scan"], mmap_mode="r"), self.step, config)
+            self.gate = BlurGate(config.blur_threshold)
+        self.cap = None
+        # Each worker checkpoints only its own work; the parent merges the files
+        self.checkpoint = SessionCheckpoint(dict(job["session"], completed=[], saved=0),
+                                            worker_session_path(proc_id, config.session_path),
+                                            before_flush=writer.drain if writer else self.flush_outputs)
+
+    def flush_outputs(self):
+        self.store.flush()
+        self.index.flush()
+
+    def open(self):
+        if self.cap is None:
+            self.cap = self.backend.open_capture(self.config.video_path, self.config.cv_threads)
+        return self.cap
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+def start_profiler(instrument, proc_id):
+    if instrument.get("profile_worker") != proc_id:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_process(name, trace_id, label, instrument, profiler, timer, start_time, backend, modes, totals, encode):
+    # Shared teardown of every pool process: profile and trace files, then the stats row
+    # that worker_stats_total and the CSV log read, with the same keys for every topology
+    elapsed = time.time() - start_time
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(instrument["profile_path"].format(name))
+    if instrument.get("trace_path"):
+        with open(worker_trace_path(name, instrument["trace_path"]), "w") as f:
+            json.dump(trace_events(timer, trace_id, label), f)
+    return {
+        "segments": totals.get("segments", 0),
+        "frames": totals.get("frames", 0),
+        "saved": totals.get("saved", 0),
+        "total": totals.get("sampled", 0),
+        "suppressed": totals.get("suppressed", 0),
+        "mode": "/".join(sorted(modes)) or "-",
+        "backend": backend.describe(),
+        "encode": encode,
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+        "time": round(elapsed, 2)
+    }
+
+def run_worker(jobs, segments, return_dict, counters, proc_id, dedup_boundaries=None, instrument=None, sketches=None, memory=None, stop=None):
+    instrument = instrument or {}
+    # Covers this process's main thread (decode, score, queueing); encoder threads are not sampled
+    profiler = start_profiler(instrument, proc_id)
+    start_time = time.time()
+    totals = {"segments": 0, "frames": 0, "saved": 0, "sampled": 0, "suppressed": 0}
+    timer = StageTimer(instrument.get("histogram", False), bool(instrument.get("trace_path")))
+    # Processing mode and thread settings are properties of the run, so the first job's settings apply
+    backend = select_backend(jobs[0]["config"].processing_mode)
+    apply_cv_threads(jobs[0]["config"].cv_threads)
+    if memory:
+        share, queue_cap = memory
+        writer = FrameWriter(memory_cap=queue_cap, timer=timer, backend=backend, budget=MemoryBudget(share))
+    else:
+        writer = FrameWriter(timer=timer, backend=backend)
+    contexts = {}
+    current = None
+    progress = WorkerCounters(counters, proc_id)
+
+    error = None
+    try:
+        # Pull segments until the queue hands out this worker's stop sentinel, so
+        # whoever finishes early keeps taking work that would otherwise wait.
+        # Segments of every video in the run share the one queue.
+        while True:
+            t0 = time.perf_counter()
+            task = segments.get()
+            timer.add("task_wait", t0, time.perf_counter())
+            if task is None:
+                break
+            if is_stopped(stop):
+                # Cancelled: skip what's left of the queue up to this worker's sentinel
+                continue
+            job_id, segment = task
+            seg_start, seg_end = segment
+            if job_id not in contexts:
+                contexts[job_id] = WorkerJob(jobs[job_id], proc_id, writer, backend, sketches and job_sketch(sketches, len(jobs), job_id, proc_id))
+            context = contexts[job_id]
+            # Only one decoder open at a time; segments arrive grouped by video
+            if current is not None and current is not context:
+                current.close()
+            current = context
+            output_dir = context.config.output_dir
+            seg_done = 0
+            progress.set(seg_start=seg_start, seg_end=seg_end, seg_done=0)
+
+            def report(frames, stats):
+                # 🔄 A few shared-memory stores per sampled frame; the monitor reads them on its own clock
+                nonlocal seg_done
+                seg_done += frames
+                progress.set(frames=totals["frames"] + seg_done, sampled=totals["sampled"] + stats["sampled"],
+                             kept=totals["saved"] + stats["saved"], bytes=writer.bytes_written, seg_done=seg_done)
+
+            # Per video: a batch can mix videos with and without dedup
+            deduper = FrameDeduper() if dedup_boundaries is not None and context.config.dedup else None
+            stats = process_ranges(context.open(), [segment], context.step, context.mode, output_dir, context.config.blur_threshold,
+                                   context.checkpoint, writer, report, context.scorer, context.ranker, deduper, context.index, context.store,
+                                   context.scan, context.gate, context.sampler, context.transform, stop)
+            if deduper:
+                dedup_boundaries[(job_id, seg_start)] = deduper.boundary()
+            totals["segments"] += 1
+            totals["frames"] += seg_end - seg_start
+            totals["saved"] += stats["saved"]
+            totals["sampled"] += stats["sampled"]
+            totals["suppressed"] += stats["suppressed"]
+
+        for context in contexts.values():
+            context.checkpoint.flush()
+    except Exception as e:
+        # A failed write or decode: checkpoints stay at the last successful drain, so the next
+        # run redoes the rest. Teardown and the stats row below still happen before re-raising
+        error = e
+    for context in contexts.values():
+        context.close()
+    try:
+        encode = writer.close()
+    except ValueError as e:
+        # Frames that failed after the first error
+        error = error or e
+        encode = writer.stats()
+    for context in contexts.values():
+        context.store.close()
+        context.index.close()
+    progress.set(bytes=encode["bytes"])
+    return_dict[proc_id] = finish_process(proc_id, proc_id, f"Worker {proc_id}", instrument, profiler, timer, start_time, backend,
+                                          {jobs[job_id]["mode"] for job_id in contexts}, totals, encode)
+    if error is not None:
+        raise error
+
+def ring_slot_count(slot_bytes, worker_count, memory_cap=RING_MEMORY_CAP_MB * 1024 * 1024):
+    # Enough slots that every worker can hold one while the decoder fills the next
+    by_memory = memory_cap // slot_bytes
+    return max(worker_count + 1, min(RING_SLOTS_PER_WORKER * worker_count, by_memory))
+
+def ring_view(ring, slot, slot_bytes, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=ring.buf, offset=slot * slot_bytes)
+
+def run_ring_decoder(jobs, ring_name, slot_bytes, free_slots, filled, worker_count, return_dict, instrument=None, stop=None):
+    # The only process that opens the videos: walks each one front to back and
+    # copies every candidate frame into a free ring slot. Blocks when no slot is
+    # free, so a slow pool throttles decoding instead of buffering without bound
+    instrument = instrument or {}
+    start_time = time.time()
+    ring = shared_memory.SharedMemory(name=ring_name)
+    timer = StageTimer(instrument.get("histogram", False), bool(instrument.get("trace_path")))
+    backend = select_backend(jobs[0]["config"].processing_mode)
+    totals = {"segments": 0, "sampled": 0}
+    error = None
+    try:
+        for job_id, job in enumerate(jobs):
+            if not job["segments"]:
+                continue
+            cap = backend.open_capture(job["config"].video_path)
+            ranker = window_ranker(job["sharpness"], backend)
+            sampler = job_sampler(job)
+            # Segments are contiguous for a single decoder, so only real gaps cost a seek
+            for range_start, range_end in merge_ranges(job["segments"]):
+                cursor = range_start
+                for frame_id, frame, done_until, timestamp in iter_candidates(cap, range_start, range_end, job["step"], job["mode"], ranker, timer,
+                                                                              sampler=sampler):
+                    if is_stopped(stop):
+                        break
+                    if frame.nbytes > slot_bytes:
+                        raise ValueError(f"Frame {frame_id} is larger than the ring slots ({frame.shape})")
+                    t0 = time.perf_counter()
+                    slot = free_slots.get()
+                    timer.add("ring_stall", t0, time.perf_counter())
+                    ring_view(ring, slot, slot_bytes, frame.shape)[...] = frame
+                    filled.put((job_id, slot, frame_id, frame.shape, cursor, done_until, timestamp))
+                    totals["sampled"] += 1
+                    cursor = done_until
+                if is_stopped(stop):
+                    break
+                # Frames after the last candidate still need marking as done
+                if range_end > cursor:
+                    filled.put((job_id, None, None, None, cursor, range_end, None))
+            totals["segments"] += len(job["segments"])
+            cap.release()
+            if is_stopped(stop):
+                break
+    except Exception as e:
+        # Reported like a worker's failure, after the stats row below
+        error = e
+    finally:
+        for _ in range(worker_count):
+            filled.put(None)
+        ring.close()
+
+    # Same shape as a worker's stats so totals and the CSV treat it as one more row; the samples it
+    # handed out are counted by the workers, so they only show up in its own "sampled" field
+    stats = finish_process("decoder", worker_count, "Decoder", instrument, None, timer, start_time, backend,
+                           {job["mode"] for job in jobs if job["segments"]}, {"segments": totals["segments"]}, encode_stats())
+    return_dict["decoder"] = dict(stats, sampled=totals["sampled"])
+    if error is not None:
+        raise error
+
+def run_ring_worker(jobs, ring_name, slot_bytes, free_slots, filled, return_dict, counters, proc_id, share, instrument=None, sketches=None):
+    # Scores frames in place in shared memory and encodes kept ones straight from
+    # the slot; nothing is pickled or copied on the way in
+    instrument = instrument or {}
+    profiler = start_profiler(instrument, proc_id)
+    start_time = time.time()
+    ring = shared_memory.SharedMemory(name=ring_name)
+    timer = StageTimer(instrument.get("histogram", False), bool(instrument.get("trace_path")))
+    totals = {"frames": 0, "saved": 0, "sampled": 0, "written": 0, "bytes": 0, "failed": 0}
+    backend = select_backend(jobs[0]["config"].processing_mode)
+    apply_cv_threads(jobs[0]["config"].cv_threads)
+    contexts = {}
+    error = None
+    progress = WorkerCounters(counters, proc_id)
+    # Frames are dealt out one at a time, so each worker's bar tracks its expected share
+    progress.set(seg_start=0, seg_end=share, seg_done=0)
+
+    while True:
+        t0 = time.perf_counter()
+        task = filled.get()
+        timer.add("task_wait", t0, time.perf_counter())
+        if task is None:
+            break
+        job_id, slot, frame_id, shape, cover_start, cover_end, timestamp = task
+        if error is not None:
+            # After a failed write: keep handing slots back so the decoder and the other
+            # workers finish, but mark nothing done, so the next run picks these frames up
+            if slot is not None:
+                free_slots.put(slot)
+            continue
+        if job_id not in contexts:
+            contexts[job_id] = WorkerJob(jobs[job_id], proc_id, backend=backend,
+                                         sketch=sketches and job_sketch(sketches, len(jobs), job_id, proc_id))
+        context = contexts[job_id]
+
+        kept = 0
+        if slot is not None:
+            frame = ring_view(ring, slot, slot_bytes, shape)
+            t0 = time.perf_counter()
+            score = context.scorer.score(frame)
+            kept = int(context.gate.keep(score, frame_id))
+            timer.add("score", t0, time.perf_counter())
+            if kept and not context.index.holds(frame_id, context.store, timestamp, context.transform.describe()):
+                try:
+                    size, checksum, t0, t1, t2 = context.store.write(frame_id, context.transform.apply(frame), backend, timestamp)
+                    context.index.add(dict(context.index.record(frame_id, score, timestamp, context.transform.describe()), **context.store.locate(frame_id, timestamp),
+                                           size=size, crc32=checksum))
+                    timer.add("encode", t0, t1)
+                    timer.add("write", t1, t2)
+                    totals["written"] += 1
+                    totals["bytes"] += size
+                except Exception as e:
+                    error = e
+                    totals["failed"] += 1
+            # The view has to go before the slot is handed back (and before the ring is closed)
+            del frame
+            free_slots.put(slot)
+            if error is not None:
+                continue
+            totals["sampled"] += 1
+
+        context.checkpoint.mark_done(cover_start, cover_end, kept)
+        totals["frames"] += cover_end - cover_start
+        totals["saved"] += kept
+        progress.set(frames=totals["frames"], sampled=totals["sampled"], kept=totals["saved"], bytes=totals["bytes"],
+                     seg_done=min(totals["frames"], share))
+
+    for context in contexts.values():
+        context.checkpoint.flush()
+        context.store.close()
+        context.index.close()
+    ring.close()
+    encode = encode_stats(totals["written"], totals["bytes"], totals["failed"], bound="inline")
+    return_dict[proc_id] = finish_process(proc_id, proc_id, f"Worker {proc_id}", instrument, profiler, timer, start_time, backend,
+                                          {jobs[job_id]["mode"] for job_id in contexts}, totals, encode)
+    if error is not None:
+        raise ValueError(f"Saving frames failed ({totals['failed']} frame(s) not written): {error}") from error
+
+def start_ring(jobs, worker_jobs, worker_count, return_dict, counters, instrument, progress, sketches=None, stop=None):
+    # Slots are sized for the largest video in the run
+    slot_bytes = max(int(np.prod(job["frame_shape"])) for job in jobs if job["segments"])
+    memory_cap = RING_MEMORY_CAP_MB * 1024 * 1024
+    memory = memory_plan(jobs[0]["config"], slot_bytes, worker_count + 1)
+    if memory:
+        # Ring workers encode inline, so the ring is the only frame queue the budget has to cover
+        memory_cap = min(memory_cap, memory[1] * (worker_count + 1))
+    slots = ring_slot_count(slot_bytes, worker_count, memory_cap)
+    ring = shared_memory.SharedMemory(create=True, size=slot_bytes * slots)
+    free_slots, filled = mp.Queue(), mp.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+    progress.log(f"🔁 Ring: {slots} slots × {slot_bytes / 1e6:.1f} MB shared by 1 decoder and {worker_count} workers")
+
+    decoder_jobs = [dict(worker_job, segments=job["segments"]) for worker_job, job in zip(worker_jobs, jobs)]
+    share = sum(end - start for job in jobs for start, end in job["segments"]) // worker_count
+    processes = [mp.Process(target=run_ring_decoder,
+                            args=(decoder_jobs, ring.name, slot_bytes, free_slots, filled, worker_count, return_dict, instrument, stop))]
+    for i in range(worker_count):
+        processes.append(mp.Process(target=run_ring_worker,
+                                    args=(worker_jobs, ring.name, slot_bytes, free_slots, filled, return_dict, counters, i, share, instrument,
+                                          sketches)))
+    for p in processes:
+        p.start()
+    return ring, processes
+
+def log_ring_stats(workers, progress):
+    # Decoder waiting on a full ring means scoring/encoding is the bottleneck; workers waiting on an empty one means decode is
+    decoder = workers.get("decoder")
+    if not decoder:
+        return
+    scorers = [stats for pid, stats in workers.items() if pid != "decoder"]
+    stall = decoder["stages"]["ring_stall"]["time"]
+    wait = sum(stats["stages"]["task_wait"]["time"] for stats in scorers) / max(len(scorers), 1)
+    bound = "score/encode-bound" if stall > wait else "decode-bound"
+    progress.log(f"🔁 Decoder: {decoder['sampled']} frames in {decoder['time']}s | stalled on a full ring {stall:.2f}s"
+                 f" | workers waited {wait:.2f}s on average ({bound})")
+
+def monitor_workers(processes, counters, progress, worker_count, total_frames, stop=None):
+    # Single aggregator: turns the workers' counters into callback updates at a fixed rate,
+    # so its cost doesn't grow with the number of frames already on disk
+    start_time = time.time()
+    rows = [WorkerCounters(counters, i) for i in range(worker_count)]
+    while True:
+        alive = any(p.is_alive() for p in processes)
+        done = 0
+        for i, row in enumerate(rows):
+            c = row.snapshot()
+            done += c["frames"]
+            seg_total = c["seg_end"] - c["seg_start"]
+            percent = int(c["seg_done"] * 100 / seg_total) if seg_total else 0
+            progress.worker_progress(i, percent, f"{percent}% | {c['kept']} kept / {c['sampled']} scored | {c['bytes'] / 1e6:.1f} MB")
+        if total_frames and done:
+            elapsed = time.time() - start_time
+            percent = min(int(done * 100 / total_frames), 100)
+            eta = format_eta(int((total_frames - done) * elapsed / done))
+            progress.progress(percent, f"{percent}% | ETA: {eta}")
+        if not alive:
+            break
+        if stop is not None and not stop.is_set() and progress.cancelled():
+            # Workers finish the frame in hand, save their session and exit
+            progress.log("⏹ Cancelling...")
+            stop.set()
+        time.sleep(PROGRESS_INTERVAL_SEC)
+
+def open_video(config, backend=None):
+    if not os.path.isfile(config.video_path) or not config.output_dir:
+        raise ValueError("Please select a valid video file and output folder.")
+
+    os.makedirs(config.output_dir, exist_ok=True)
+    cap = (backend or CPU_BACKEND).open_capture(config.video_path, config.cv_threads)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    step = frame_step(video_fps, config.fps)
+    return cap, total_frames, video_fps, step
+
+def config_session(config, total_frames):
+    if config.reset:
+        reset_frame_index(config.output_dir)
+        reset_frame_store(config.output_dir)
+    else:
+        # Parts left behind by an interrupted multi-core run
+        merge_index_parts(config.output_dir)
+        repair_archives(config.output_dir)
+    session = new_session(config.video_path, config.output_dir, config.fps, config.blur_threshold, total_frames,
+                          config.blur_scoring, config.selection, config.dedup, config.scan, config.blur_policy, config.sample_by,
+                          config.output_format, config.quality, config.png_compression, config.jpeg_optimize, config.container, config.crop,
+                          config.resize_width)
+    return prepare_session(session, config.reset, config.session_path)
+
+def log_sharpness(config, sharpness, progress):
+    if sharpness:
+        raw = map_blur_threshold(config.blur_threshold, sharpness["calibration"])
+        progress.log(f"🔍 Blur scoring '{config.blur_scoring}': threshold {config.blur_threshold} ≈ raw {raw:.2f}")
+
+def extract_frames(config, progress=None):
+    progress = progress or ProgressCallback()
+    if config.use_multicore:
+        return extract_frames_multicore(config, progress)
+    return extract_frames_singlecore(config, progress)
+
+def plan_job(config, progress):
+    # Resume state, segment plan and scorer calibration for one video
+    cap, total_frames, video_fps, step = open_video(config)
+    session = config_session(config, total_frames)
+    pending = subtract_ranges(0, total_frames, session_completed_ranges(session))
+    frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    prepare_frame_store(config, total_frames, step, frame_shape, video_fps)
+    job = {"config": config, "session": session, "total_frames": total_frames, "step": step, "video_fps": video_fps,
+           "segments": [], "mode": "-", "sharpness": {}, "frame_shape": frame_shape, "scan": None}
+    if not pending:
+        cap.release()
+        return job
+    if session["completed"]:
+        remaining = sum(end - start for start, end in pending)
+        progress.log(f"▶ Resuming: {remaining} / {total_frames} frames left in {len(pending)} range(s)")
+
+    job["segments"], job["mode"] = plan_segments(cap, pending, step, video_fps, "best" if config.selection == "best" else SAMPLING_MODE)
+    cap.release()
+    if config.timed:
+        # Timestamps are read off every grabbed frame, seeking only across long gaps
+        job["mode"] = "time"
+    if config.scan:
+        # Frames are picked from the sidecar, so the workers never score
+        scan = load_scan(config, progress, config.worker_count if config.use_multicore else 1)
+        if scan is None:
+            job["segments"] = []
+            return job
+        job["scan"], job["mode"] = scan_path(config.video_path, config.blur_scoring), "scan"
+        log_scan_selection(config, ScanSelection(scan, step, config), pending, progress)
+        return job
+    job["sharpness"] = sharpness_settings(config.blur_scoring, config.video_path)
+    log_sharpness(config, job["sharpness"], progress)
+    return job
+
+def preview_scan(config, progress=None, worker_count=1):
+    # Loads (or builds) the scan once; scan_kept_count then answers per setting without decoding
+    progress = progress or ProgressCallback()
+    if not os.path.isfile(config.video_path):
+        raise ValueError("Please select a valid video file.")
+    cap = cv2.VideoCapture(config.video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    scan = load_scan(config, progress, worker_count)
+    if scan is None:
+        raise ValueError("Scan cancelled.")
+    return scan, video_fps
+
+def scan_kept_count(scan, video_fps, config):
+    return len(ScanSelection(scan, frame_step(video_fps, config.fps), config))
+
+def log_scan_selection(config, scan, pending, progress):
+    selected = sum(len(scan.between(start, end)) for start, end in pending)
+    progress.log(f"🗺 Scan selects {len(scan)} frames at threshold {config.blur_threshold}, {config.blur_policy} ({selected} still to extract)")
+
+def instrumentation(config):
+    return {"histogram": config.instrument, "trace_path": config.trace_path, "profile_worker": config.profile_worker,
+            "profile_path": config.profile_path}
+
+def log_instrumentation_files(instrument, progress, worker_count=1):
+    if instrument["trace_path"]:
+        progress.log(f"🔬 Trace saved as '{instrument['trace_path']}' (open in chrome://tracing or ui.perfetto.dev)")
+    if 0 <= instrument["profile_worker"] < worker_count:
+        progress.log(f"🧬 cProfile stats saved as '{instrument['profile_path'].format(instrument['profile_worker'])}'")
+
+def job_frame_bytes(job):
+    return int(np.prod(job["frame_shape"]))
+
+def tuning_key(config, job):
+    # Machine and codec profile: what decode and score speed depend on, not the thresholds
+    cap = cv2.VideoCapture(config.video_path)
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    cap.release()
+    codec = fourcc.to_bytes(4, "little").decode("ascii", "replace").strip("\x00 ") or "unknown"
+    height, width = job["frame_shape"][:2]
+    return (f"{platform.node()} ({os.cpu_count()} cpus, OpenCV {cv2.__version__}) | {codec} {width}x{height} | "
+            f"{config.blur_scoring} | {config.processing_mode} | {job['mode']}")
+
+def load_tuning():
+    try:
+        with open(TUNING_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_tuning(key, entry):
+    tuning = load_tuning()
+    tuning[key] = entry
+    os.makedirs(os.path.dirname(TUNING_FILE), exist_ok=True)
+    write_json_atomic(TUNING_FILE, tuning)
+
+def tuning_candidates(cpus, max_workers):
+    # Powers of two up to the core count, each with single-threaded OpenCV and
+    # with the cores split evenly between workers
+    counts = sorted({count for count in (1, 2, 4, 8, 16, 32, 64) if count <= max_workers} | {max_workers})
+    return [(count, sorted({1, max(cpus // count, 1)})) for count in counts]
+
+def tuning_slices(job, count):
+    # Short slices spread evenly over what is left to extract
+    length = max(TUNING_SLICE_FRAMES, job["step"])
+    pieces = split_segments(job["segments"], length)
+    picks = sorted({i * len(pieces) // count for i in range(count)})
+    return [pieces[i] for i in picks]
+
+def run_tuning_worker(job, slices, threads, scratch, proc_id, ready, start, results):
+    # The per-frame work of a pool worker: decode, score, and encode and write frames
+    # that pass the threshold (always to the same scratch file)
+    config = job["config"]
+    apply_cv_threads(threads)
+    backend = select_backend(config.processing_mode)
+    scorer = SharpnessScorer(**job["sharpness"], backend=backend)
+    ranker = window_ranker(job["sharpness"], backend)
+    sampler = job_sampler(job)
+    scan = ScanSelection(np.load(job["scan"], mmap_mode="r"), job["step"], config) if job["scan"] else None
+    encoder = FrameEncoder(config.output_format, config.quality, config.png_compression, config.jpeg_optimize)
+    transform = output_transform(config)
+    timer = StageTimer()
+    cap = backend.open_capture(config.video_path, threads)
+    path = os.path.join(scratch, f"worker{proc_id}{encoder.ext}")
+    ready.put(proc_id)
+    start.wait()
+    frames = 0
+    while True:
+        task = slices.get()
+        if task is None:
+            break
+        slice_start, slice_end = task
+        for frame_id, frame, done_until, timestamp in iter_candidates(cap, slice_start, slice_end, job["step"], job["mode"], ranker, timer,
+                                                                      scan, sampler):
+            score = float(scan.scores[frame_id]) if scan is not None else scorer.score(frame)
+            if score > config.blur_threshold:
+                ret, buf = encoder.encode(transform.apply(frame), backend)
+                if ret:
+                    with open(path, "wb") as f:
+                        f.write(buf)
+        frames += slice_end - slice_start
+    cap.release()
+    results.put((frames, time.time()))
+
+def gather(source, processes, count, progress=None):
+    # count items from a queue the processes feed. One that dies without reporting
+    # (a decoder crash, an OpenCL init failure) raises instead of blocking forever;
+    # None once the run is cancelled
+    items = []
+    while len(items) < count:
+        if progress is not None and progress.cancelled():
+            return None
+        try:
+            items.append(source.get(timeout=1.0))
+            continue
+        except queue.Empty:
+            pass
+        failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+        if not failed and any(p.is_alive() for p in processes):
+            continue
+        try:
+            # Everyone exited; a report may still be on its way through the pipe
+            items.append(source.get(timeout=1.0))
+        except queue.Empty:
+            raise ValueError(f"a calibration process exited with code {failed[0] if failed else 0} without reporting")
+    return items
+
+def time_workers(job, slices, worker_count, threads, scratch, progress=None):
+    # Video frames covered per second by worker_count processes sharing the slices;
+    # timed from when every worker has its decoder open. None if cancelled
+    tasks, ready, results = mp.Queue(), mp.Queue(), mp.Queue()
+    start = mp.Event()
+    for piece in slices:
+        tasks.put(piece)
+    for _ in range(worker_count):
+        tasks.put(None)
+    processes = [mp.Process(target=run_tuning_worker, args=(job, tasks, threads, scratch, i, ready, start, results))
+                 for i in range(worker_count)]
+    for p in processes:
+        p.start()
+    reports = None
+    try:
+        if gather(ready, processes, worker_count, progress) is not None:
+            start_time = time.time()
+            start.set()
+            reports = gather(results, processes, worker_count, progress)
+    finally:
+        if reports is None:
+            # Failed or cancelled: the others may be waiting for a start signal that never comes
+            for p in processes:
+                p.terminate()
+        for p in processes:
+            p.join()
+    if reports is None:
+        return None
+    elapsed = max(end for _, end in reports) - start_time
+    return sum(frames for frames, _ in reports) / elapsed if elapsed > 0 else 0.0
+
+def tune_workers(config, job, progress):
+    # (worker count, OpenCV threads per worker) for this machine and video, from the cache or a calibration run
+    key = tuning_key(config, job)
+    cached = load_tuning().get(key)
+    if cached and not config.retune:
+        progress.log(f"⚙️ Auto workers: {cached['workers']} × {cached['threads']} OpenCV thread(s), "
+                     f"{cached['fps']} frames/s when calibrated {cached['created']} (cached)")
+        return cached["workers"], cached["threads"]
+
+    cpus = os.cpu_count() or 1
+    max_workers = budget_worker_count(config, job_frame_bytes(job), cpus, progress)
+    slices = tuning_slices(job, max_workers * TUNING_SLICES_PER_WORKER)
+    max_workers = min(max_workers, len(slices))
+    progress.status("⚙️ Calibrating worker count...")
+    progress.log(f"⚙️ Calibrating worker count on {len(slices)} slices of '{os.path.basename(config.video_path)}' ({cpus} cpus)")
+    best, trials = None, []
+    try:
+        with tempfile.TemporaryDirectory(prefix="frame_extractor_tune_") as scratch:
+            for worker_count, thread_options in tuning_candidates(cpus, max_workers):
+                rates = []
+                for threads in thread_options:
+                    rate = time_workers(job, slices, worker_count, threads, scratch, progress)
+                    if rate is None:
+                        break
+                    progress.log(f"   {worker_count:>2} worker(s) × {threads:>2} thread(s): {rate:.0f} frames/s")
+                    trials.append({"workers": worker_count, "threads": threads, "fps": round(rate, 1)})
+                    rates.append((rate, worker_count, threads))
+                if rate is None:
+                    break
+                top = max(rates)
+                if best is not None and top[0] < best[0] * TUNING_STOP_RATIO:
+                    # Oversubscribed: more workers only get slower from here
+                    break
+                best = max(best, top) if best is not None else top
+    except ValueError as e:
+        # Not cached, so the next run calibrates again
+        worker_count = budget_worker_count(config, job_frame_bytes(job), config.worker_count, progress)
+        progress.log(f"⚠️ Calibration failed ({e}); using {worker_count} worker(s)")
+        return worker_count, config.cv_threads
+    if progress.cancelled():
+        # The run stops before starting the pool, so nothing is calibrated or cached
+        progress.log("⏹ Calibration cancelled")
+        return config.worker_count, config.cv_threads
+    rate, worker_count, threads = best
+    save_tuning(key, {"workers": worker_count, "threads": threads, "fps": round(rate, 1),
+                      "created": time.strftime("%Y-%m-%d %H:%M"), "trials": trials})
+    progress.log(f"⚙️ Auto workers: {worker_count} × {threads} OpenCV thread(s) at {rate:.0f} frames/s (saved to '{TUNING_FILE}')")
+    return worker_count, threads
+
+def pool_topology(config, dedup, progress):
+    if config.topology == "ring" and dedup:
+        progress.log("⚠️ Near-duplicate suppression needs consecutive frames in one process; using the seek topology")
+        return "seek"
+    if config.topology == "ring" and config.scan:
+        progress.log("⚠️ Scan-selected frames are decoded where they are written; using the seek topology")
+        return "seek"
+    return config.topology
+
+def run_pool(jobs, worker_count, progress, dedup=False, instrument=None, topology="seek"):
+    # One process pool for every job; segments from all videos share a single queue
+    instrument = instrument or {"histogram": False, "trace_path": "", "profile_worker": -1, "profile_path": PROFILE_FILE}
+    manager = mp.Manager()
+    return_dict = manager.dict()
+    dedup_boundaries = manager.dict() if dedup else None
+    counters = progress_counters(worker_count)
+    total_frames = sum(end - start for job in jobs for start, end in job["segments"])
+    processes = []
+    # Shared only when some video uses an adaptive threshold
+    sketches = shared_sketches(len(jobs), worker_count) if any(job["config"].blur_mode != "fixed" for job in jobs) else None
+
+    progress.status(f"🚀 Launching {worker_count} processes...")
+    progress.workers_started(worker_count)
+
+    # Workers only need what they read; the segment lists stay in the parent
+    worker_jobs = [{key: job[key] for key in ("config", "session", "step", "video_fps", "mode", "sharpness", "scan")} for job in jobs]
+    # The budget is a property of the run, so the first video's setting applies to the pool
+    memory = memory_plan(jobs[0]["config"], max(job_frame_bytes(job) for job in jobs), worker_count)
+    stop = mp.Event()
+    ring = None
+    if topology == "ring":
+        ring, processes = start_ring(jobs, worker_jobs, worker_count, return_dict, counters, instrument, progress, sketches, stop)
+    else:
+        task_queue = mp.Queue()
+        for job_id, job in enumerate(jobs):
+            for segment in job["segments"]:
+                task_queue.put((job_id, segment))
+        for _ in range(worker_count):
+            task_queue.put(None)
+        for i in range(worker_count):
+            p = mp.Process(
+                target=run_worker,
+                args=(worker_jobs, task_queue, return_dict, counters, i, dedup_boundaries, instrument, sketches, memory, stop)
+            )
+            processes.append(p)
+            p.start()
+    if instrument["histogram"] or instrument["trace_path"] or instrument["profile_worker"] >= 0:
+        # PIDs for attaching an external sampler such as py-spy
+        progress.log("🔬 Worker PIDs: " + ", ".join(f"{i}={p.pid}" for i, p in enumerate(processes)))
+
+    # ✅ Start monitor thread only ONCE, after all workers are started
+    monitor_thread = threading.Thread(
+        target=lambda: monitor_workers(processes, counters, progress, worker_count, total_frames, stop),
+        daemon=True
+    )
+    monitor_thread.start()
+
+    for p in processes:
+        p.join()
+    monitor_thread.join()
+    # A process that raised (a failed write, a decode error) exits non-zero. Its checkpointed
+    # work is merged below like everyone else's and the rest stays pending for the next run
+    names = (["decoder"] if ring is not None else []) + list(range(worker_count))
+    failed = [str(name) for name, p in zip(names, processes) if p.exitcode != 0]
+    if ring is not None:
+        ring.close()
+        ring.unlink()
+    if instrument["trace_path"]:
+        merge_worker_traces(instrument["trace_path"], list(range(worker_count)) + ["decoder"])
+    log_instrumentation_files(instrument, progress, worker_count)
+
+    for job_id, job in enumerate(jobs):
+        config = job["config"]
+        merge_worker_sessions(job["session"], config.session_path)
+        # Before any dedup removals, so their entries land after the frames they remove
+        merge_index_parts(config.output_dir)
+        job["removed"] = 0
+        if dedup and config.dedup:
+            boundaries = {start: b for (owner, start), b in dedup_boundaries.items() if owner == job_id}
+            job["removed"] = merge_dedup_boundaries(boundaries, config.output_dir, open_frame_store(config, job["step"]))
+            job["session"]["saved"] -= job["removed"]
+            save_session(job["session"], config.session_path)
+        if sketches is not None and not job["scan"]:
+            log_adaptive(config, job_sketch(sketches, len(jobs), job_id, 0), progress)
+
+    if failed:
+        saved = sum(job["session"]["saved"] for job in jobs)
+        raise ValueError(f"Process(es) {', '.join(failed)} exited with an error; {saved} frames are saved, run again to resume the rest.")
+    return dict(return_dict)
+
+def log_adaptive(config, sketch, progress):
+    name = os.path.basename(config.video_path)
+    if config.blur_mode == "percentile":
+        cutoff = sketch.quantile(1.0 - config.keep_percent / 100.0)
+        if cutoff is not None:
+            progress.log(f"🎚 [{name}] Adaptive threshold: top {config.keep_percent:g}% of {sketch.total()} scores → score ≥ {cutoff:.2f}")
+    elif config.blur_mode == "local":
+        median = sketch.quantile(0.5)
+        if median is not None:
+            progress.log(f"🎚 [{name}] Adaptive threshold: {config.local_ratio:g} × median of the last {ADAPTIVE_WINDOW} samples "
+                         f"(overall median {median:.2f} over {sketch.total()} scores)")
+
+def workers_backend(workers):
+    # Each process picks its own backend; they normally all agree
+    return "/".join(sorted({stats["backend"] for stats in workers.values()})) or "-"
+
+def describe_output(config):
+    if config.container == "stack":
+        return f"raw frames in {STACK_FILE}"
+    encoder = FrameEncoder(config.output_format, config.quality, config.png_compression, config.jpeg_optimize)
+    if config.container == "files":
+        return f"{encoder.describe()}, one file per frame"
+    return f"{encoder.describe()} in {config.container} archives"
+
+def output_costs(stages, bytes_written):
+    # Per written frame: encode and write time in ms, and bytes on disk
+    written = stages["write"]["count"]
+    if not written:
+        return 0.0, 0.0, 0
+    return stages["encode"]["time"] * 1000 / written, stages["write"]["time"] * 1000 / written, bytes_written // written
+
+def log_output(description, stages, bytes_written, progress):
+    encode_ms, write_ms, frame_bytes = output_costs(stages, bytes_written)
+    progress.log(f"💾 Output: {description} | encode {encode_ms:.2f} ms + write {write_ms:.2f} ms per frame | {frame_bytes / 1024:.0f} KB/frame")
+
+def log_memory(config, peak, throttled, progress):
+    if peak is None:
+        return
+    budget = f" of a {config.memory_budget_mb} MB budget" if config.memory_budget_mb else ""
+    progress.log(f"🧠 Peak memory {peak:.0f} MB{budget} | Throttled {throttled} time(s)")
+
+def worker_stats_total(workers):
+    # One "all" row: counts summed, wall time is the slowest worker
+    rows = list(workers.values())
+    encodes = [stats["encode"] for stats in rows]
+    total = {key: sum(stats[key] for stats in rows) for key in ("segments", "frames", "saved", "total", "suppressed")}
+    total["time"] = max(stats["time"] for stats in rows)
+    peaks = [stats["peak_rss_mb"] for stats in rows if stats["peak_rss_mb"] is not None]
+    total["peak_rss_mb"] = max(peaks) if peaks else None
+    total["encode"] = {"max_depth": max(e["max_depth"] for e in encodes), "stall": round(sum(e["stall"] for e in encodes), 2),
+                       "idle": round(sum(e["idle"] for e in encodes), 2), "throttled": sum(e["throttled"] for e in encodes),
+                       "failed": sum(e["failed"] for e in encodes)}
+    total["stages"] = merge_stage_summaries(stats["stages"] for stats in rows)
+    return total
+
+def log_worker_stats(workers, progress, csv_path=""):
+    # CSV Export or Console Log Summary
+    for pid, stats in workers.items():
+        encode = stats["encode"]
+        if pid == "decoder":
+            progress.log(f"[Decoder] Segments: {stats['segments']} | Sampled: {stats['sampled']} | Mode: {stats['mode']} | Time: {stats['time']}s"
+                         f" | Peak {stats['peak_rss_mb']} MB")
+            continue
+        progress.log(f"[Worker {pid}] Segments: {stats['segments']} ({stats['frames']} frames) | Saved: {stats['saved']} | Mode: {stats['mode']} | Time: {stats['time']}s"
+                     f" | Encode queue max {encode['max_depth']}, stalled {encode['stall']}s ({encode['bound']}) | Failed writes {encode['failed']}"
+                     f" | Peak {stats['peak_rss_mb']} MB")
+    if not workers:
+        return
+    log_ring_stats(workers, progress)
+    progress.log(f"🖥 Processing backend: {workers_backend(workers)}")
+    total = worker_stats_total(workers)
+    progress.log(f"⏱ Stage time across workers: {format_stages(total['stages'])}")
+    if total["peak_rss_mb"] is not None:
+        progress.log(f"🧠 Peak memory {total['peak_rss_mb']:.0f} MB in one process | Throttled {total['encode']['throttled']} time(s)")
+    for line in format_histograms(total["stages"]):
+        progress.log(line)
+
+    if csv_path:
+        histograms = "histogram" in total["stages"][STAGES[0]]
+        header = ["Worker", "Segments", "Frames", "Saved Frames", "Total Processed", "Suppressed Duplicates", "Time (s)",
+                  "Encode Queue Max", "Encode Stall (s)", "Encoder Idle (s)", "Peak RSS (MB)", "Memory Throttled"] + [f"{stage} (s)" for stage in STAGES]
+        if histograms:
+            header += [f"{stage} p95 (ms)" for stage in STAGES]
+        with open(csv_path, "w") as f:
+            f.write(",".join(header) + "\n")
+            for pid, stats in list(workers.items()) + [("all", total)]:
+                encode = stats["encode"]
+                row = [pid, stats["segments"], stats["frames"], stats["saved"], stats["total"], stats["suppressed"], stats["time"],
+                       encode["max_depth"], encode["stall"], encode["idle"], stats["peak_rss_mb"], encode["throttled"]]
+                row += [stats["stages"][stage]["time"] for stage in STAGES]
+                if histograms:
+                    row += [histogram_percentile(stats["stages"][stage]["histogram"], 0.95) for stage in STAGES]
+                f.write(",".join(map(str, row)) + "\n")
+        progress.log(f"\n📁 Log saved as '{csv_path}'")
+
+def extract_frames_multicore(config, progress):
+    job = plan_job(config, progress)
+    session = job["session"]
+    if not job["segments"]:
+        if progress.cancelled():
+            progress.log(f"\n⏹ Cancelled with {session['saved']} frames saved; run again to resume.")
+        else:
+            progress.log(f"✅ Nothing left to do. Total saved: {session['saved']} frames.")
+            progress.progress(100, "Done")
+        return {"saved": session["saved"], "suppressed": 0, "frames": job["total_frames"], "time": 0.0, "workers": {},
+                "stages": StageTimer().summary(), "backend": "-", "cancelled": progress.cancelled()}
+
+    if config.auto_workers:
+        worker_count, threads = tune_workers(config, job, progress)
+        config = job["config"] = dataclasses.replace(config, worker_count=worker_count, cv_threads=threads)
+    if progress.cancelled():
+        progress.log(f"\n⏹ Cancelled with {session['saved']} frames saved; run again to resume.")
+        return {"saved": session["saved"], "suppressed": 0, "frames": job["total_frames"], "time": 0.0, "workers": {},
+                "stages": StageTimer().summary(), "backend": "-", "cancelled": True}
+    segments = job["segments"]
+    topology = pool_topology(config, config.dedup, progress)
+    # Ring workers are fed frame by frame, so the segment count doesn't cap them
+    worker_count = config.worker_count if topology == "ring" else min(config.worker_count, len(segments))
+    worker_count = budget_worker_count(config, job_frame_bytes(job), worker_count, progress)
+    progress.log(f"▶ {len(segments)} segments of up to {segments[0][1] - segments[0][0]} frames | Sampling: {job['mode']} | Topology: {topology}")
+    start_time = time.time()
+
+    workers = run_pool([job], worker_count, progress, config.dedup, instrumentation(config), topology)
+    suppressed = 0
+    if config.dedup:
+        suppressed = sum(stats["suppressed"] for stats in workers.values()) + job["removed"]
+        progress.log(f"🧹 Suppressed {suppressed} near-duplicate frames ({job['removed']} at segment boundaries)")
+    if progress.cancelled():
+        progress.log(f"\n⏹ Cancelled with {session['saved']} frames saved; run again to resume.")
+    else:
+        progress.log(f"\n✅ All processes complete! Total saved: {session['saved']} frames.")
+        progress.progress(100, "Done")
+    progress.log(f"🗂 Index: {len(load_frame_index(config.output_dir))} frames in '{index_path(config.output_dir)}'")
+    log_worker_stats(workers, progress, config.csv_log_path if config.save_csv_log else "")
+    stages = merge_stage_summaries(stats["stages"] for stats in workers.values())
+    log_output(describe_output(config), stages, sum(stats["encode"]["bytes"] for stats in workers.values()), progress)
+
+    return {"saved": session["saved"], "suppressed": suppressed, "frames": job["total_frames"],
+            "time": round(time.time() - start_time, 2), "workers": workers, "stages": stages, "backend": workers_backend(workers),
+            "cancelled": progress.cancelled()}
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+def collect_batch_videos(source):
+    # A folder, a glob pattern, or a manifest file listing one video per line
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    elif os.path.isfile(source) and not source.lower().endswith(VIDEO_EXTENSIONS):
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, "r") as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+        return [os.path.abspath(path) for path in paths if os.path.isfile(path)]
+    else:
+        paths = glob.glob(source)
+    return sorted(os.path.abspath(path) for path in paths if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS))
+
+def is_batch_source(source):
+    if os.path.isfile(source):
+        # An existing video is never a glob, even when its name has [, * or ?
+        return not source.lower().endswith(VIDEO_EXTENSIONS)
+    return os.path.isdir(source) or glob.has_magic(source)
+
+def batch_configs(source, output_root, base_config):
+    # Each video gets its own output subfolder, which also holds its session file
+    configs = []
+    used = set()
+    for video_path in collect_batch_videos(source):
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        unique, n = name, 2
+        while unique in used:
+            unique, n = f"{name}_{n}", n + 1
+        used.add(unique)
+        output_dir = os.path.join(output_root, unique)
+        configs.append(dataclasses.replace(base_config, video_path=video_path, output_dir=output_dir,
+                                           session_path=os.path.join(output_dir, SESSION_FILE)))
+    return configs
+
+def extract_batch(configs, worker_count, progress=None, save_csv_log=False):
+    progress = progress or ProgressCallback()
+    if not configs:
+        raise ValueError("No videos found for batch.")
+
+    start_time = time.time()
+    jobs = []
+    for config in configs:
+        if progress.cancelled():
+            # Videos not planned yet are left for the next run
+            break
+        progress.log(f"📂 {os.path.basename(config.video_path)} → {config.output_dir}")
+        jobs.append(plan_job(config, progress))
+
+    segment_count = sum(len(job["segments"]) for job in jobs)
+    workers = {}
+    if segment_count and configs[0].auto_workers:
+        # Calibrated on the first video with work left; the choice applies to the whole pool
+        first = next(job for job in jobs if job["segments"])
+        worker_count, threads = tune_workers(first["config"], first, progress)
+        for job in jobs:
+            job["config"] = dataclasses.replace(job["config"], worker_count=worker_count, cv_threads=threads)
+    if segment_count and not progress.cancelled():
+        worker_count = max(min(worker_count, segment_count), 1)
+        worker_count = budget_worker_count(configs[0], max(job_frame_bytes(job) for job in jobs), worker_count, progress)
+        progress.log(f"▶ {len(jobs)} videos | {segment_count} segments on {worker_count} workers")
+        # Instrumentation and topology are properties of the run, so the first video's settings apply to the pool.
+        # Dedup is only set up for the pool here; each worker applies it to the videos that asked for it
+        dedup = any(config.dedup for config in configs)
+        workers = run_pool(jobs, worker_count, progress, dedup, instrumentation(configs[0]), pool_topology(configs[0], dedup, progress))
+
+    elapsed = time.time() - start_time
+    videos = []
+    for job in jobs:
+        frames = sum(end - start for start, end in job["segments"])
+        videos.append({"video_path": job["config"].video_path, "output_dir": job["config"].output_dir,
+                       "frames": frames, "saved": job["session"]["saved"]})
+        progress.log(f"[{os.path.basename(job['config'].video_path)}] Saved: {job['session']['saved']} | Frames scanned: {frames}")
+
+    frames = sum(video["frames"] for video in videos)
+    saved = sum(video["saved"] for video in videos)
+    rate = frames / elapsed if elapsed else 0.0
+    if progress.cancelled():
+        progress.log(f"\n⏹ Batch cancelled: {len(videos)} videos | Total saved: {saved}; run again to resume")
+    else:
+        progress.log(f"\n📦 Batch complete: {len(videos)} videos | {frames} frames scanned in {elapsed:.1f}s ({rate:.1f} frames/s) | Total saved: {saved}")
+        progress.progress(100, "Done")
+    log_worker_stats(workers, progress, configs[0].csv_log_path if save_csv_log else "")
+    stages = merge_stage_summaries(stats["stages"] for stats in workers.values())
+    log_output(describe_output(configs[0]), stages, sum(stats["encode"]["bytes"] for stats in workers.values()), progress)
+
+    return {"saved": saved, "frames": frames, "time": round(elapsed, 2), "fps": round(rate, 1), "videos": videos, "workers": workers,
+            "stages": stages, "backend": workers_backend(workers), "cancelled": progress.cancelled()}
+
+def extract_frames_singlecore(config, progress):
+    backend = select_backend(config.processing_mode)
+    apply_cv_threads(config.cv_threads)
+    progress.log(f"🖥 Processing backend: {backend.describe()}")
+    cap, total_frames, video_fps, step = open_video(config, backend)
+    session = config_session(config, total_frames)
+    frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    prepare_frame_store(config, total_frames, step, frame_shape, video_fps)
+    scan = None
+    sharpness = {}
+    gate = blur_gate(config, step=step)
+    if config.scan:
+        scan = load_scan(config, progress)
+        if scan is None:
+            cap.release()
+            progress.log(f"\n⏹ Cancelled with {session['saved']} frames saved; run again to resume.")
+            return {"saved": session["saved"], "suppressed": 0, "frames": total_frames, "time": 0.0, "stages": StageTimer().summary(),
+                    "backend": backend.describe(), "cancelled": True}
+        scan = ScanSelection(scan, step, config)
+        gate = BlurGate(config.blur_threshold)
+    else:
+        sharpness = sharpness_settings(config.blur_scoring, config.video_path)
+        log_sharpness(config, sharpness, progress)
+
+    instrument = instrumentation(config)
+    timer = StageTimer(instrument["histogram"], bool(instrument["trace_path"]))
+    memory = memory_plan(config, int(np.prod(frame_shape)), 1)
+    if memory:
+        share, queue_cap = memory
+        writer = FrameWriter(memory_cap=queue_cap, timer=timer, backend=backend, budget=MemoryBudget(share))
+    else:
+        writer = FrameWriter(timer=timer, backend=backend)
+    checkpoint = SessionCheckpoint(session, config.session_path, before_flush=writer.drain)
+    pending = checkpoint.pending_ranges(0, total_frames)
+    resume_from = pending[0][0] if pending else total_frames
+    frames_done = total_frames - sum(end - start for start, end in pending)
+    if scan is not None:
+        mode = "scan"
+        log_scan_selection(config, scan, pending, progress)
+    elif config.timed:
+        mode = "time"
+    else:
+        mode = choose_sampling_mode(cap, resume_from, total_frames, step, "best" if config.selection == "best" else SAMPLING_MODE)
+
+    rate = f"{config.fps} per second of video" if config.timed else f"every {step} frames"
+    progress.log(f"▶ Starting from frame {resume_from} / {total_frames} | Saving {rate} | Sampling: {mode}")
+    start_time = time.time()
+    processed = 0
+    last_report = 0.0
+    stop = threading.Event()
+
+    def report(frames, stats):
+        # Same cadence as the multi-core monitor rather than once per sampled frame
+        nonlocal processed, last_report
+        processed += frames
+        now = time.time()
+        if now - last_report < PROGRESS_INTERVAL_SEC:
+            return
+        last_report = now
+        if progress.cancelled():
+            stop.set()
+        elapsed = now - start_time
+        remaining = int((total_frames - frames_done - processed) * elapsed / processed)
+        eta = format_eta(remaining)
+        percent = int(((frames_done + processed) / total_frames) * 100)
+        progress.progress(percent, f"{percent}% | ETA: {eta}")
+
+    deduper = FrameDeduper() if config.dedup else None
+    index = FrameIndex(config.output_dir, video_fps=video_fps)
+    store = open_frame_store(config, step)
+    # Single-core runs everything in this process; --profile-worker 0 profiles it
+    profiler = cProfile.Profile() if instrument["profile_worker"] == 0 else None
+    if profiler:
+        profiler.enable()
+    process_ranges(cap, pending, step, mode, config.output_dir, config.blur_threshold, checkpoint, writer, report,
+                   SharpnessScorer(**sharpness, backend=backend), window_ranker(sharpness, backend), deduper, index, store, scan, gate,
+                   TimeSampler(config.fps, video_fps) if mode == "time" else None, output_transform(config), stop)
+    checkpoint.flush()
+    cap.release()
+    encode = writer.close()
+    store.close()
+    index.close()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(instrument["profile_path"].format(0))
+    if instrument["trace_path"]:
+        write_trace(instrument["trace_path"], trace_events(timer, 0, "Main"))
+    if stop.is_set():
+        progress.log(f"\n⏹ Cancelled with {session['saved']} frames saved; run again to resume. ({checkpoint.flush_count} checkpoint writes)")
+    else:
+        progress.progress(100, "Done")
+        progress.log(f"\n✅ Done! Total saved: {session['saved']} frames. ({checkpoint.flush_count} checkpoint writes)")
+    progress.log(f"🗂 Index: {len(index)} frames in '{index.path}'")
+    if deduper:
+        progress.log(f"🧹 Suppressed {deduper.suppressed} near-duplicate frames")
+    if scan is None:
+        log_adaptive(config, gate.sketch, progress)
+    progress.log(f"📊 Encode queue max {encode['max_depth']} | Decoder stalled {encode['stall']}s | Encoders idle {encode['idle']}s ({encode['bound']})"
+                 f" | Failed writes {encode['failed']}")
+    peak = peak_rss_mb()
+    log_memory(config, peak, encode["throttled"], progress)
+    stages = timer.summary()
+    log_output(describe_output(config), stages, encode["bytes"], progress)
+    progress.log(f"⏱ Stage time: {format_stages(stages)}")
+    for line in format_histograms(stages):
+        progress.log(line)
+    log_instrumentation_files(instrument, progress)
+
+    return {"saved": session["saved"], "suppressed": deduper.suppressed if deduper else 0, "frames": total_frames,
+            "time": round(time.time() - start_time, 2), "encode": encode, "stages": stages, "backend": backend.describe(), "peak_rss_mb": peak,
+            "cancelled": stop.is_set()}
+
+def add_blur_mode_args(parser):
+    parser.add_argument("--blur-mode", choices=list(BLUR_MODES), default="fixed",
+                        help="also require a score in the top --keep-percent so far (percentile) or above --local-ratio x the local median (local)")
+    parser.add_argument("--keep-percent", type=float, default=50.0, help="percentile mode: share of frames to keep (default: 50)")
+    parser.add_argument("--local-ratio", type=float, default=1.0, help="local mode: minimum score relative to the rolling median (default: 1.0)")
+
+def add_sample_by_arg(parser):
+    parser.add_argument("--sample-by", choices=list(SAMPLE_BY), default="frame",
+                        help="every Nth frame, or the first frame at each 1/fps step of the video's timestamps (exact rate for 29.97 fps or variable frame rate)")
+
+def worker_count_arg(value):
+    if value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or 'auto', got '{value}'")
+
+def add_extraction_args(parser):
+    parser.add_argument("--fps", type=float, default=30, help="frames per second to extract (default: 30)")
+    add_sample_by_arg(parser)
+    parser.add_argument("--blur-threshold", type=float, default=5.0, help="minimum Laplacian variance to keep a frame (default: 5.0)")
+    parser.add_argument("--blur-scoring", choices=list(SHARPNESS_PRESETS), default=DEFAULT_BLUR_SCORING, help="blur scoring preset")
+    add_blur_mode_args(parser)
+    parser.add_argument("--best-of-window", action="store_true", help="keep the sharpest frame per interval")
+    parser.add_argument("--dedup", action="store_true", help="skip near-duplicate frames")
+    parser.add_argument("--reset", action="store_true", help="ignore any saved session and start over")
+    parser.add_argument("--workers", type=worker_count_arg, default=1,
+                        help="worker processes; more than 1 enables multi-core mode, 'auto' calibrates the count on the video (cached per machine and codec)")
+    parser.add_argument("--retune", action="store_true", help="with --workers auto, calibrate again instead of using the cached choice")
+    parser.add_argument("--cv-threads", type=int, default=0, metavar="N", help="OpenCV and FFmpeg decode threads per worker (default: OpenCV's)")
+    parser.add_argument("--csv-log", action="store_true", help=f"write per-worker stats to {LOG_CSV}")
+    parser.add_argument("--processing-mode", choices=list(PROCESSING_MODES), default="CPU",
+                        help="GPU runs scoring through OpenCL (cv2.UMat) with hardware decode, falling back to CPU without a device")
+    parser.add_argument("--topology", choices=list(TOPOLOGIES), default="seek",
+                        help="multi-core layout: every worker seeks and decodes its own segments, or one decoder feeds a shared-memory ring")
+    parser.add_argument("--instrument", action="store_true", help="record per-stage latency histograms (p50/p95/p99 in the log and CSV)")
+    parser.add_argument("--trace", default="", metavar="FILE", help="write a Chrome/Perfetto trace of every stage to FILE")
+    parser.add_argument("--profile-worker", type=int, default=-1, metavar="N",
+                        help=f"run worker N under cProfile and save {PROFILE_FILE.format('N')}")
+    parser.add_argument("--scan", action="store_true",
+                        help="pick frames from a cached sharpness scan of the whole video (built on first use) and decode only those")
+    parser.add_argument("--format", dest="output_format", choices=list(OUTPUT_FORMATS), default="jpg",
+                        help="image format of saved frames; npy stores raw pixels (default: jpg)")
+    parser.add_argument("--quality", type=int, default=-1, help="JPEG (0-100) or WebP (1-100) quality (default: OpenCV's)")
+    parser.add_argument("--png-compression", type=int, default=-1, metavar="LEVEL", help="PNG compression level 0-9 (default: OpenCV's)")
+    parser.add_argument("--jpeg-optimize", action="store_true", help="optimize JPEG Huffman tables (smaller files, slower encode)")
+    parser.add_argument("--container", choices=list(OUTPUT_CONTAINERS), default="files",
+                        help=f"one file per frame, frames packed into a tar/zip, or raw frames in one mmap-able {STACK_FILE}")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB",
+                        help="total memory for the run; caps frames in flight, fewer workers if it must, and throttles a process over its share")
+    parser.add_argument("--resize-width", type=int, default=0, metavar="PX", help="downscale saved frames to at most this width")
+    parser.add_argument("--crop", default="", metavar="W:H:X:Y", help="crop saved frames to this rectangle (before --resize-width)")
+
+def config_from_args(args, video_path, output_dir):
+    return ExtractionConfig(
+        video_path=video_path,
+        output_dir=output_dir,
+        fps=args.fps,
+        blur_threshold=args.blur_threshold,
+        blur_scoring=args.blur_scoring,
+        blur_mode=args.blur_mode,
+        keep_percent=args.keep_percent,
+        local_ratio=args.local_ratio,
+        best_of_window=args.best_of_window,
+        sample_by=args.sample_by,
+        dedup=args.dedup,
+        reset=args.reset,
+        use_multicore=args.workers == "auto" or args.workers > 1,
+        worker_count=(os.cpu_count() or 1) if args.workers == "auto" else args.workers,
+        auto_workers=args.workers == "auto",
+        retune=args.retune,
+        cv_threads=args.cv_threads,
+        save_csv_log=args.csv_log,
+        processing_mode=args.processing_mode,
+        topology=args.topology,
+        instrument=args.instrument,
+        trace_path=args.trace,
+        profile_worker=args.profile_worker,
+        scan=args.scan,
+        output_format=args.output_format,
+        quality=args.quality,
+        png_compression=args.png_compression,
+        jpeg_optimize=args.jpeg_optimize,
+        container=args.container,
+        memory_budget_mb=args.memory_budget,
+        resize_width=args.resize_width,
+        crop=args.crop
+    )
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Suites with their own modules are imported only when their command runs; they import this one
+    command = argv[0] if argv else ""
+    parser = argparse.ArgumentParser(prog="frame_extractor", description="Extract sharp frames from video without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="extract frames from one video")
+    extract.add_argument("video")
+    extract.add_argument("-o", "--output", required=True, help="output folder")
+    add_extraction_args(extract)
+
+    batch = commands.add_parser("batch", help="extract frames from a folder, glob or manifest of videos")
+    batch.add_argument("source", help="folder, glob pattern (quoted) or text file with one video path per line")
+    batch.add_argument("-o", "--output", required=True, help="output root; each video gets a subfolder")
+    add_extraction_args(batch)
+
+    scan = commands.add_parser("scan", help="build the cached sharpness scan of a video and preview how many frames thresholds keep")
+    scan.add_argument("video")
+    scan.add_argument("--fps", type=float, default=30, help="frames per second to extract (default: 30)")
+    add_sample_by_arg(scan)
+    scan.add_argument("--thresholds", default="5,10,20,50,100", help="comma-separated blur thresholds to preview")
+    scan.add_argument("--blur-scoring", choices=list(SHARPNESS_PRESETS), default=DEFAULT_BLUR_SCORING, help="blur scoring preset")
+    scan.add_argument("--best-of-window", action="store_true", help="keep the sharpest frame per interval")
+    add_blur_mode_args(scan)
+    scan.add_argument("--workers", type=int, default=1, help="worker processes for the scan")
+
+    bench = commands.add_parser("benchmark-metrics", help="report sharpness metric throughput on a video")
+    bench.add_argument("video")
+    bench.add_argument("--samples", type=int, default=64)
+    bench.add_argument("--batch-size", type=int, default=16)
+
+    suite = commands.add_parser("benchmark", help="run the pipeline over synthetic videos and a worker/step/scoring matrix")
+    if command == "benchmark":
+        import frame_benchmark
+        frame_benchmark.add_benchmark_args(suite)
+
+    serve = commands.add_parser("serve", help="run the local job service: a SQLite job queue behind an HTTP or Unix socket API")
+    jobs = commands.add_parser("jobs", help="submit, list, follow and cancel jobs on a running service")
+    if command in ("serve", "jobs"):
+        import frame_extractor_service
+        frame_extractor_service.add_serve_args(serve)
+        frame_extractor_service.add_jobs_args(jobs)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark-metrics":
+        for name, rate in benchmark_metrics(args.video, args.samples, args.batch_size).items():
+            print(f"{name:>10}: {rate} frames/s")
+        return 0
+
+    try:
+        if args.command == "scan":
+            config = ExtractionConfig(video_path=args.video, output_dir="", fps=args.fps, blur_scoring=args.blur_scoring,
+                                      best_of_window=args.best_of_window, blur_mode=args.blur_mode, keep_percent=args.keep_percent,
+                                      local_ratio=args.local_ratio, sample_by=args.sample_by)
+            scan, video_fps = preview_scan(config, ConsoleProgress(), args.workers)
+            for threshold in (float(t) for t in args.thresholds.split(",") if t):
+                kept = scan_kept_count(scan, video_fps, dataclasses.replace(config, blur_threshold=threshold))
+                print(f"{threshold:>10}: {kept} frames kept")
+            return 0
+        if args.command == "benchmark":
+            return frame_benchmark.run_benchmark(args)
+        if args.command == "serve":
+            return frame_extractor_service.run_service(args)
+        if args.command == "jobs":
+            return frame_extractor_service.run_jobs_command(args)
+        if args.command == "batch":
+            base = config_from_args(args, "", args.output)
+            extract_batch(batch_configs(args.source, args.output, base), base.worker_count, ConsoleProgress(), args.csv_log)
+        else:
+            extract_frames(config_from_args(args, args.video, args.output), ConsoleProgress())
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    sys.exit(main())
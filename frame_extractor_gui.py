@@ -1,18 +1,14 @@
 import os
 import sys
-import cv2
-import json
-import time
 import threading
 import multiprocessing as mp
-from tkinter import filedialog, StringVar, DoubleVar, IntVar, BooleanVar, Text, Scrollbar, END, VERTICAL, RIGHT, LEFT, Y, BOTH
+from tkinter import filedialog, StringVar, DoubleVar, IntVar, BooleanVar, Text, Scrollbar, END, VERTICAL, RIGHT, LEFT, Y, BOTH, TclError
 from ttkbootstrap import Window, Label, Button, Entry, Progressbar, Frame, Checkbutton, Scale, Combobox
 from ttkbootstrap import Combobox
+from frame_extractor import (ExtractionConfig, ProgressCallback, SHARPNESS_PRESETS, DEFAULT_BLUR_SCORING, PROCESSING_MODES, BLUR_MODES,
+                             extract_frames, extract_batch, batch_configs, is_batch_source, preview_scan, scan_kept_count)
 
-SESSION_FILE = "session.json"
-LOG_CSV = "log.csv"
-
-class FrameExtractorApp:
+class FrameExtractorApp(ProgressCallback):
     def __init__(self):
         self.root = Window(themename="darkly")
         self.root.title("Video Frame Extractor")
@@ -33,14 +29,23 @@ class FrameExtractorApp:
         # GUI State Variables
         self.video_path = StringVar()
         self.output_dir = StringVar()
-        self.fps = IntVar(value=30)
+        self.fps = DoubleVar(value=30.0)
+        self.best_of_window = BooleanVar()
+        self.sample_by_time = BooleanVar()
         self.blur_thresh = DoubleVar(value=5.0)
+        self.blur_scoring = StringVar(value=DEFAULT_BLUR_SCORING)
+        self.blur_mode = StringVar(value="fixed")
+        self.keep_percent = DoubleVar(value=50.0)
         self.progress_var = IntVar()
         self.reset = BooleanVar()
+        self.dedup = BooleanVar()
         self.use_multicore = BooleanVar()
-        self.worker_count = IntVar(value=4)
+        self.worker_count = StringVar(value="4")
         self.save_csv_log = BooleanVar()
         self.processing_mode = StringVar(value="CPU")
+        self.use_scan = BooleanVar()
+        # Sharpness scan of the current video, once previewed: (scan, video_fps)
+        self.scan = None
 
         self.build_ui()
     
@@ -84,26 +89,49 @@ class FrameExtractorApp:
 
         # Row 2-3: Settings
         Label(self.container, text="FPS (Frames Per Second):").grid(row=2, column=0, sticky="w", pady=5)
-        Entry(self.container, textvariable=self.fps, width=10).grid(row=2, column=1, sticky="w", pady=5)
+        fps_frame = Frame(self.container)
+        fps_frame.grid(row=2, column=1, pady=5, sticky="w")
+        Entry(fps_frame, textvariable=self.fps, width=10).pack(side="left", padx=(0, 10))
+        Checkbutton(fps_frame, text="Keep sharpest frame per interval", variable=self.best_of_window).pack(side="left")
+        Checkbutton(fps_frame, text="Sample by timestamp", variable=self.sample_by_time).pack(side="left", padx=(20, 0))
 
         Label(self.container, text="Blur Threshold:").grid(row=3, column=0, sticky="w", pady=5)
         blur_frame = Frame(self.container)
         blur_frame.grid(row=3, column=1, pady=5, sticky="w")
         Scale(blur_frame, variable=self.blur_thresh, from_=1.0, to=100.0, orient="horizontal", length=300).pack(side="left", padx=(0, 10))
         Entry(blur_frame, textvariable=self.blur_thresh, width=5).pack(side="left")
+        Combobox(blur_frame, textvariable=self.blur_scoring, values=list(SHARPNESS_PRESETS), width=8, state="readonly").pack(side="left", padx=(10, 0))
+        Combobox(blur_frame, textvariable=self.blur_mode, values=list(BLUR_MODES), width=9, state="readonly").pack(side="left", padx=(10, 0))
+        Label(blur_frame, text="Keep %:").pack(side="left", padx=(10, 0))
+        Entry(blur_frame, textvariable=self.keep_percent, width=5).pack(side="left", padx=(5, 0))
+        Button(blur_frame, text="Preview", command=self.start_preview).pack(side="left", padx=(10, 0))
+        self.preview_label = Label(blur_frame, text="")
+        self.preview_label.pack(side="left", padx=(10, 0))
+        # Once a scan is loaded the kept count follows the settings without decoding
+        for var in (self.blur_thresh, self.fps, self.best_of_window, self.sample_by_time, self.blur_mode, self.keep_percent):
+            var.trace_add("write", lambda *_: self.update_preview())
+        for var in (self.video_path, self.blur_scoring):
+            var.trace_add("write", lambda *_: self.clear_preview())
 
         # Row 4-7: Options
-        Checkbutton(self.container, text="Reset Session", variable=self.reset).grid(row=4, column=1, sticky="w", pady=10)
+        options_frame = Frame(self.container)
+        options_frame.grid(row=4, column=1, sticky="w", pady=10)
+        Checkbutton(options_frame, text="Reset Session", variable=self.reset).pack(side="left", padx=(0, 20))
+        Checkbutton(options_frame, text="Skip near-duplicate frames", variable=self.dedup).pack(side="left", padx=(0, 20))
+        Checkbutton(options_frame, text="Use scan index", variable=self.use_scan).pack(side="left")
         Checkbutton(self.container, text="Use Multi-Core Mode", variable=self.use_multicore, command=self.toggle_worker_dropdown).grid(row=5, column=1, sticky="w", pady=(10, 5))
         Label(self.container, text="Number of Workers:").grid(row=6, column=0, sticky="w")
-        self.worker_dropdown = Combobox(self.container, textvariable=self.worker_count, values=[4, 8, 16], width=5, state="disabled")
+        # "auto" calibrates on the video; the fixed choices follow this machine's core count
+        cpus = os.cpu_count() or 1
+        counts = sorted({count for count in (1, 2, 4, 8, 16, 32) if count <= cpus} | {cpus})
+        self.worker_dropdown = Combobox(self.container, textvariable=self.worker_count, values=["auto"] + counts, width=5, state="disabled")
         self.worker_dropdown.grid(row=6, column=1, sticky="w", pady=2)
 
         Checkbutton(self.container, text="Save CSV Log", variable=self.save_csv_log).grid(row=7, column=1, sticky="w", pady=(10, 5))
 
         # Row 8: Processing Mode
         Label(self.container, text="Processing Mode:").grid(row=8, column=0, sticky="w")
-        Combobox(self.container, textvariable=self.processing_mode, values=["CPU", "GPU"], width=8, state="readonly").grid(row=8, column=1, sticky="w")
+        Combobox(self.container, textvariable=self.processing_mode, values=list(PROCESSING_MODES), width=8, state="readonly").grid(row=8, column=1, sticky="w")
 
         # Row 9: Start Button
         Button(self.container, text="▶ Start Extraction", bootstyle="success", command=self.start_thread).grid(row=9, column=1, pady=15)
@@ -122,7 +150,7 @@ class FrameExtractorApp:
 
 
     def browse_video(self):
-        file = filedialog.askopenfilename(filetypes=[("Video Files", "*.mov *.mp4 *.avi *.mkv")])
+        file = filedialog.askopenfilename(filetypes=[("Video Files", "*.mov *.mp4 *.avi *.mkv"), ("Batch Manifest", "*.txt")])
         if file:
             self.video_path.set(file)
 
@@ -134,6 +162,41 @@ class FrameExtractorApp:
     def toggle_worker_dropdown(self):
         self.worker_dropdown.config(state="readonly" if self.use_multicore.get() else "disabled")
 
+    def start_preview(self):
+        self.preview_label.config(text="Scanning...")
+        threading.Thread(target=self.run_preview, daemon=True).start()
+
+    def run_preview(self):
+        # First preview of a video builds the cached scan; later ones load it instantly
+        try:
+            config = self.build_config()
+            workers = config.worker_count if config.use_multicore else 1
+            scan = preview_scan(config, self, workers)
+        except (ValueError, TclError) as e:
+            self.log(f"❌ {e}")
+            self.root.after(0, self.preview_label.config, {"text": ""})
+            return
+        self.root.after(0, self.set_scan, scan)
+
+    def set_scan(self, scan):
+        self.scan = scan
+        self.update_preview()
+
+    def clear_preview(self):
+        self.scan = None
+        self.preview_label.config(text="")
+
+    def update_preview(self):
+        if self.scan is None:
+            return
+        scan, video_fps = self.scan
+        try:
+            kept = scan_kept_count(scan, video_fps, self.build_config())
+        except (TclError, ValueError, ZeroDivisionError):
+            # Half-typed entry values
+            return
+        self.preview_label.config(text=f"≈ {kept} frames kept")
+
     def start_thread(self):
         thread = threading.Thread(target=self.run_extraction, daemon=True)
         thread.start()
@@ -150,464 +213,71 @@ class FrameExtractorApp:
     def run(self):
         self.root.mainloop()
     
+    # Callbacks arrive from the extraction and monitor threads; Tk widgets are
+    # only touched from the main loop, via root.after
+    def status(self, text):
+        self.root.after(0, self.set_status, text)
+
+    def progress(self, percent, text):
+        self.root.after(0, self.set_progress, percent, text)
+
+    def workers_started(self, count):
+        self.root.after(0, self.build_worker_progress, count)
+
+    def worker_progress(self, worker, percent, text):
+        self.root.after(0, self.set_worker_progress, worker, percent, text)
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    def set_progress(self, percent, text):
+        self.progress_var.set(percent)
+        self.progress_label.config(text=text)
+
+    def set_worker_progress(self, worker, percent, text):
+        if worker < len(self.worker_progress_bars):
+            self.worker_progress_bars[worker].config(value=percent)
+            self.worker_progress_labels[worker].config(text=f"[Worker {worker}] {text}")
+
+    def build_config(self):
+        auto = self.worker_count.get() == "auto"
+        # Fractional rates such as 0.5 (one frame every two seconds) are allowed
+        fps = self.fps.get()
+        if fps <= 0:
+            raise ValueError("FPS must be a positive number.")
+        return ExtractionConfig(
+            video_path=self.video_path.get(),
+            output_dir=self.output_dir.get(),
+            fps=fps,
+            blur_threshold=self.blur_thresh.get(),
+            blur_scoring=self.blur_scoring.get(),
+            blur_mode=self.blur_mode.get(),
+            keep_percent=self.keep_percent.get(),
+            best_of_window=self.best_of_window.get(),
+            sample_by="time" if self.sample_by_time.get() else "frame",
+            dedup=self.dedup.get(),
+            reset=self.reset.get(),
+            use_multicore=self.use_multicore.get(),
+            worker_count=(os.cpu_count() or 1) if auto else int(self.worker_count.get()),
+            auto_workers=auto,
+            save_csv_log=self.save_csv_log.get(),
+            processing_mode=self.processing_mode.get(),
+            scan=self.use_scan.get()
+        )
+
     def run_extraction(self):
-        extract_frames(self)
-
-def save_session(data):
-    with open(SESSION_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
-def load_session():
-    if os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, "r") as f:
-            return json.load(f)
-    return None
-
-def format_eta(seconds):
-    days, rem = divmod(seconds, 86400)
-    hours, rem = divmod(rem, 3600)
-    minutes, secs = divmod(rem, 60)
-    if days > 0:
-        return f"{days}d {hours:02}:{minutes:02}:{secs:02}"
-    elif hours > 0:
-        return f"{hours:02}:{minutes:02}:{secs:02}"
-    else:
-        return f"{minutes:02}:{secs:02}"
-
-def run_worker(video_path, output_dir, fps, blur_threshold, start_frame, end_frame, return_dict, proc_id):
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    frame_id = start_frame
-    saved = 0
-    start_time = time.time()
-
-    # Just record the range
-    return_dict[proc_id] = {
-        "start": start_frame,
-        "end": end_frame
-    }
-
-    while frame_id < end_frame:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_id % int(cap.get(cv2.CAP_PROP_FPS) / fps) == 0:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if lap_var > blur_threshold:
-                filename = os.path.join(output_dir, f"frame_{frame_id:06}.jpg")
-                if not os.path.exists(filename):
-                    cv2.imwrite(filename, frame)
-                saved += 1  # count even if already exists
-
-        frame_id += 1
-
-    elapsed = time.time() - start_time
-    return_dict[proc_id].update({
-        "saved": saved,
-        "time": round(elapsed, 2)
-    })
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    frame_id = start_frame
-    saved = 0
-    total_to_check = 0
-    start_time = time.time()
-
-    return_dict[proc_id] = {"done": 0, "total": 0}
-
-    while frame_id < end_frame:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_id % int(cap.get(cv2.CAP_PROP_FPS) / fps) == 0:
-            total_to_check += 1
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if lap_var > blur_threshold:
-                filename = os.path.join(output_dir, f"frame_{frame_id:06}.jpg")
-                if not os.path.exists(filename):
-                    cv2.imwrite(filename, frame)
-                saved += 1
-
-        frame_id += 1
-
-        if (frame_id - start_frame) % 10 == 0:
-            return_dict[proc_id]["done"] = saved
-            return_dict[proc_id]["total"] = total_to_check
-
-    elapsed = time.time() - start_time
-    return_dict[proc_id].update({
-        "start": start_frame,
-        "end": end_frame,
-        "saved": saved,
-        "time": round(elapsed, 2)
-    })
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    frame_id = start_frame
-    saved = 0
-    total_to_check = 0
-    start_time = time.time()
-
-    # Init dict BEFORE starting loop
-    return_dict[proc_id] = {"done": 0, "total": end_frame - start_frame}
-
-    while frame_id < end_frame:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_id % int(cap.get(cv2.CAP_PROP_FPS) / fps) == 0:
-            total_to_check += 1
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if lap_var > blur_threshold:
-                filename = os.path.join(output_dir, f"frame_{frame_id:06}.jpg")
-                if not os.path.exists(filename):
-                    cv2.imwrite(filename, frame)
-                saved += 1  # Count it even if already exists
-
-        frame_id += 1
-
-        if (frame_id - start_frame) % 10 == 0:
-            return_dict[proc_id]["done"] = saved
-            return_dict[proc_id]["total"] = total_to_check
-
-    elapsed = time.time() - start_time
-    return_dict[proc_id].update({
-        "start": start_frame,
-        "end": end_frame,
-        "saved": saved,
-        "time": round(elapsed, 2)
-    })
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    saved = 0
-    frame_id = start_frame
-    total = 0
-    start_time = time.time()
-
-    # 🔧 Initialize progress tracking
-    return_dict[proc_id] = {"done": 0, "total": end_frame - start_frame}
-
-    while frame_id < end_frame:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_id % int(cap.get(cv2.CAP_PROP_FPS) / fps) == 0:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if lap_var > blur_threshold:
-                filename = os.path.join(output_dir, f"frame_{frame_id:06}.jpg")
-                cv2.imwrite(filename, frame)
-                saved += 1
-        frame_id += 1
-        total += 1
-
-        # 🔄 Update progress every 10 frames
-        if (frame_id - start_frame) % 10 == 0:
-            return_dict[proc_id]["done"] = saved  # only count frames actually written
-
-
-    elapsed = time.time() - start_time
-    return_dict[proc_id].update({
-        "start": start_frame,
-        "end": end_frame,
-        "saved": saved,
-        "total": total,
-        "time": round(elapsed, 2)
-    })
-
-def monitor_workers(jobs, return_dict, app, worker_count):
-    output_dir = app.output_dir.get()
-
-    # Wait until all worker ranges are populated
-    while any(p.is_alive() for p in jobs) and len(return_dict.keys()) < worker_count:
-        time.sleep(0.2)
-
-    # Snapshot worker frame ranges
-    worker_ranges = {}
-    for i in range(worker_count):
-        start = return_dict.get(i, {}).get("start", 0)
-        end = return_dict.get(i, {}).get("end", 0)
-        worker_ranges[i] = (start, end)
-
-    while any(p.is_alive() for p in jobs):
         try:
-            files = [f for f in os.listdir(output_dir) if f.startswith("frame_") and f.endswith(".jpg")]
-        except:
-            continue  # skip temporarily if I/O error
-
-        for i in range(worker_count):
-            if i >= len(app.worker_progress_bars):
-                continue
-
-            start, end = worker_ranges.get(i, (0, 0))
-            total = end - start
-            count = sum(
-                1 for f in files
-                if f.startswith("frame_")
-                and start <= int(f[6:12]) < end
-            )
-            percent = int((count / total) * 100) if total else 0
-            status = f"{percent}% | {count} / {total}"
-
-            app.worker_progress_bars[i].config(value=percent)
-            app.worker_progress_labels[i].config(text=f"[Worker {i}] {status}")
-        time.sleep(0.5)
-    while any(p.is_alive() for p in jobs):
-        for i in range(worker_count):
-            if i in return_dict and i < len(app.worker_progress_bars):
-                done = return_dict[i].get("done", 0)
-                total = return_dict[i].get("total", 1)
-                percent = int((done / total) * 100) if total > 0 else 0
-                status = f"{percent}% | {done} / {total}" if total > 0 else "Starting..."
-
-                app.worker_progress_bars[i].config(value=percent)
-                app.worker_progress_labels[i].config(text=f"[Worker {i}] {status}")
-        time.sleep(0.5)
-    while any(p.is_alive() for p in jobs):
-        for i in range(worker_count):
-            if i in return_dict:
-                done = return_dict[i].get("done", 0)
-                total = return_dict[i].get("total", 1)
-                percent = int((done / total) * 100) if total > 0 else 0
-                status = f"{percent}% | {done} / {total}" if total > 0 else "Starting..."
-
-                app.worker_progress_bars[i].config(value=percent)
-                app.worker_progress_labels[i].config(text=f"[Worker {i}] {status}")
-        time.sleep(0.5)
-    while any(p.is_alive() for p in jobs):
-        for i in range(worker_count):
-            if i in return_dict:
-                done = return_dict[i].get("done", 0)
-                total = return_dict[i].get("total", 1)
-                percent = int((done / total) * 100) if total > 0 else 0
-                status = f"{percent}% | {done} / {total}" if total > 0 else "Starting..."
-
-                app.worker_progress_bars[i].config(value=percent)
-                app.worker_progress_labels[i].config(text=f"[Worker {i}] {status}")
-        time.sleep(0.5)
-
-def extract_frames(app):
-    video_path = app.video_path.get()
-    output_dir = app.output_dir.get()
-    fps = app.fps.get()
-    blur_threshold = app.blur_thresh.get()
-    reset = app.reset.get()
-    use_multicore = app.use_multicore.get()
-    worker_count = app.worker_count.get()
-    save_csv = app.save_csv_log.get()
-
-    if not os.path.isfile(video_path) or not output_dir:
-        app.log("❌ Please select a valid video file and output folder.")
-        return
-
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    step = max(int(video_fps / fps), 1)
-    cap.release()
-
-    if use_multicore:
-        chunk_size = total_frames // worker_count
-        manager = mp.Manager()
-        return_dict = manager.dict()
-        jobs = []
-
-        app.status_label.config(text=f"🚀 Launching {worker_count} processes...")
-        app.build_worker_progress(worker_count)
-        start_time = time.time()
-
-        for i in range(worker_count):
-            start_f = i * chunk_size
-            end_f = total_frames if i == worker_count - 1 else (i + 1) * chunk_size
-            p = mp.Process(
-                target=run_worker,
-                args=(video_path, output_dir, fps, blur_threshold, start_f, end_f, return_dict, i)
-            )
-            jobs.append(p)
-            p.start()
-
-        # ✅ Start monitor thread only ONCE, after all workers are started
-        monitor_thread = threading.Thread(
-            target=lambda: monitor_workers(jobs, return_dict, app, worker_count),
-            daemon=True
-        )
-        monitor_thread.start()
-
-        for job in jobs:
-            job.join()
-
-        total_saved = sum([v["saved"] for v in return_dict.values()])
-        app.log(f"\n✅ All processes complete! Total saved: {total_saved} frames.")
-        app.progress_var.set(100)
-        app.progress_label.config(text="Done")
-
-        # CSV Export or Console Log Summary
-        lines = []
-        for pid, stats in return_dict.items():
-            summary = f"[Worker {pid}] Frames {stats['start']}-{stats['end']} | Saved: {stats['saved']} | Time: {stats['time']}s"
-            lines.append(summary)
-            app.log(summary)
-
-        if save_csv:
-            with open(LOG_CSV, "w") as f:
-                f.write("Worker,Start Frame,End Frame,Saved Frames,Total Processed,Time (s)\n")
-                for pid, stats in return_dict.items():
-                    f.write(f"{pid},{stats['start']},{stats['end']},{stats['saved']},{stats['total']},{stats['time']}\n")
-            app.log(f"\n📁 Log saved as '{LOG_CSV}'")
-
-    else:
-        extract_frames_singlecore(app)
-    video_path = app.video_path.get()
-    output_dir = app.output_dir.get()
-    fps = app.fps.get()
-    blur_threshold = app.blur_thresh.get()
-    reset = app.reset.get()
-    use_multicore = app.use_multicore.get()
-    worker_count = app.worker_count.get()
-    save_csv = app.save_csv_log.get()
-
-    if not os.path.isfile(video_path) or not output_dir:
-        app.log("❌ Please select a valid video file and output folder.")
-        return
-
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    step = max(int(video_fps / fps), 1)
-    cap.release()
-
-    if use_multicore:
-        chunk_size = total_frames // worker_count
-        manager = mp.Manager()
-        return_dict = manager.dict()
-        jobs = []
-
-        app.status_label.config(text=f"🚀 Launching {worker_count} processes...")
-        app.build_worker_progress(worker_count)
-        start_time = time.time()
-
-        for i in range(worker_count):
-            start_f = i * chunk_size
-            end_f = total_frames if i == worker_count - 1 else (i + 1) * chunk_size
-            p = mp.Process(target=run_worker, args=(video_path, output_dir, fps, blur_threshold, start_f, end_f, return_dict, i))
-            jobs.append(p)
-            p.start()
-            monitor_thread = threading.Thread(
-                target=lambda: monitor_workers(jobs, return_dict, app, worker_count),
-                daemon=True
-            )
-            monitor_thread.start()
-
-        for job in jobs:
-            job.join()
-
-        total_saved = sum([v["saved"] for v in return_dict.values()])
-        app.log(f"\n✅ All processes complete! Total saved: {total_saved} frames.")
-        app.progress_var.set(100)
-        app.progress_label.config(text="Done")
-
-        # CSV Export or Console Log Summary
-        lines = []
-        for pid, stats in return_dict.items():
-            summary = f"[Worker {pid}] Frames {stats['start']}-{stats['end']} | Saved: {stats['saved']} | Time: {stats['time']}s"
-            lines.append(summary)
-            app.log(summary)
-
-        if save_csv:
-            with open(LOG_CSV, "w") as f:
-                f.write("Worker,Start Frame,End Frame,Saved Frames,Total Processed,Time (s)\n")
-                for pid, stats in return_dict.items():
-                    f.write(f"{pid},{stats['start']},{stats['end']},{stats['saved']},{stats['total']},{stats['time']}\n")
-            app.log(f"\n📁 Log saved as '{LOG_CSV}'")
-
-    else:
-        # fallback to single-threaded version (in part 3)
-        extract_frames_singlecore(app)
-
-def extract_frames_singlecore(app):
-    video_path = app.video_path.get()
-    output_dir = app.output_dir.get()
-    fps = app.fps.get()
-    blur_threshold = app.blur_thresh.get()
-    reset = app.reset.get()
-
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    step = max(int(video_fps / fps), 1)
-
-    # Session
-    session = {
-        "video_path": video_path,
-        "output_dir": output_dir,
-        "fps": fps,
-        "blur_threshold": blur_threshold,
-        "last_frame": 0
-    }
-
-    existing = load_session()
-    if existing and not reset and existing["video_path"] == video_path:
-        session["last_frame"] = existing["last_frame"]
-
-    start_frame = session["last_frame"]
-    saved = len([f for f in os.listdir(output_dir) if f.endswith(".jpg")])
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    frame_id = start_frame
-
-    app.log(f"▶ Starting from frame {start_frame} / {total_frames} | Saving every {step} frames")
-    start_time = time.time()
-    time_buffer = []
-
-    while frame_id < total_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_id % step == 0:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if lap_var > blur_threshold:
-                filename = os.path.join(output_dir, f"frame_{frame_id:06}.jpg")
-                if not os.path.exists(filename):
-                    cv2.imwrite(filename, frame)
-                    saved += 1
-                else:
-                    saved += 1  # Count it toward progress if already exists
-
-        frame_id += 1
-        session["last_frame"] = frame_id
-        save_session(session)
-
-        elapsed = time.time() - start_time
-        time_buffer.append(elapsed)
-        if len(time_buffer) > 10:
-            time_buffer.pop(0)
-
-        avg = sum(time_buffer) / len(time_buffer)
-        remaining = int((total_frames - frame_id) * (avg / step))
-        eta = format_eta(remaining)
-        percent = int((frame_id / total_frames) * 100)
-
-        app.progress_var.set(percent)
-        app.progress_label.config(text=f"{percent}% | ETA: {eta}")
-        app.root.update_idletasks()
-
-    cap.release()
-    app.progress_var.set(100)
-    app.progress_label.config(text="Done")
-    app.log(f"\n✅ Done! Total saved: {saved} frames.")
+            config = self.build_config()
+            # A folder, glob or manifest in the video field runs every video on one worker pool
+            if is_batch_source(config.video_path):
+                workers = config.worker_count if config.use_multicore else 1
+                extract_batch(batch_configs(config.video_path, config.output_dir, config), workers, self, config.save_csv_log)
+            else:
+                extract_frames(config, self)
+        except (ValueError, TclError) as e:
+            self.log(f"❌ {e}")
 
 if __name__ == "__main__":
     mp.freeze_support()
     app = FrameExtractorApp()
     app.run()
-
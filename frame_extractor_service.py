@@ -0,0 +1,575 @@
+import os
+import json
+import time
+import signal
+import socket
+import sqlite3
+import threading
+import dataclasses
+import http.client
+import multiprocessing as mp
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from socketserver import TCPServer, ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+from frame_extractor import (ExtractionConfig, ProgressCallback, LOG_CSV, PROFILE_FILE, SESSION_FILE, add_extraction_args, batch_configs, config_from_args,
+                             extract_batch, extract_frames, is_batch_source)
+
+# 🛰 Local job service: jobs wait in a SQLite queue and run one at a time per runner process.
+# Runners are started once and kept warm, so each job skips interpreter and OpenCV start-up
+SERVICE_DB = os.path.join(os.path.expanduser("~"), ".cache", "frame_extractor", "jobs.sqlite3")
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_RUNNERS = 1
+DISPATCH_INTERVAL_SEC = 1.0
+CLIENT_POLL_SEC = 0.5
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+# Summary fields kept from an extraction's return value; per-stage and per-worker detail stays in the job log
+RESULT_KEYS = ("saved", "suppressed", "frames", "time", "fps", "backend", "peak_rss_mb", "cancelled", "videos")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    state TEXT NOT NULL,
+    config TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    time REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_logs_job ON job_logs (job_id, seq);
+"""
+
+def job_config(payload):
+    # Same fields as ExtractionConfig; unknown keys are rejected rather than silently ignored
+    if not isinstance(payload, dict):
+        raise ValueError("Job must be a JSON object of extraction settings.")
+    fields = {field.name for field in dataclasses.fields(ExtractionConfig)}
+    unknown = sorted(set(payload) - fields)
+    if unknown:
+        raise ValueError(f"Unknown setting(s): {', '.join(unknown)}")
+    if not payload.get("video_path") or not payload.get("output_dir"):
+        raise ValueError("A job needs video_path and output_dir.")
+    config = ExtractionConfig(**payload)
+    if not is_batch_source(config.video_path) and not os.path.isfile(config.video_path):
+        raise ValueError(f"No video, folder or manifest at '{config.video_path}'.")
+    # Default session, CSV log and profile files are relative to the working directory, which every job shares here
+    for field, default in (("session_path", SESSION_FILE), ("csv_log_path", LOG_CSV), ("profile_path", PROFILE_FILE)):
+        if getattr(config, field) == default:
+            config = dataclasses.replace(config, **{field: os.path.join(config.output_dir, default)})
+    return config
+
+class JobQueue:
+    # Persistent queue: every state change is committed, so a restarted service picks up where it stopped
+    def __init__(self, path=SERVICE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def execute(self, sql, params=()):
+        with self.lock, self.db:
+            return self.db.execute(sql, params)
+
+    def submit(self, config):
+        return self.execute("INSERT INTO jobs (state, config, submitted) VALUES ('queued', ?, ?)",
+                            (json.dumps(dataclasses.asdict(config)), time.time())).lastrowid
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return job_record(row)
+
+    def list(self, state=None):
+        with self.lock:
+            if state:
+                rows = self.db.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)).fetchall()
+            else:
+                rows = self.db.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [job_record(row) for row in rows]
+
+    def claim_next(self):
+        with self.lock, self.db:
+            row = self.db.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE jobs SET state = 'running', started = ?, progress = 0, message = '' WHERE id = ?",
+                            (time.time(), row["id"]))
+        return job_record(row)
+
+    def recover(self):
+        # Jobs interrupted by a crash or shutdown run again; their session resumes them where they stopped
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE state = 'running' AND cancel_requested = 1", (time.time(),))
+            return self.db.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'").rowcount
+
+    def request_cancel(self, job_id):
+        # Queued jobs are cancelled on the spot; running ones are flagged and stop at the next progress report
+        with self.lock, self.db:
+            row = self.db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise KeyError(job_id)
+            if row["state"] == "queued":
+                self.db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ?", (time.time(), job_id))
+            elif row["state"] == "running":
+                self.db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            return row["state"]
+
+    def progress(self, job_id, percent, message):
+        self.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (percent, message, job_id))
+
+    def message(self, job_id, message):
+        self.execute("UPDATE jobs SET message = ? WHERE id = ?", (message, job_id))
+
+    def log(self, job_id, message):
+        self.execute("INSERT INTO job_logs (job_id, time, message) VALUES (?, ?, ?)", (job_id, time.time(), message))
+
+    def logs(self, job_id, after=0):
+        with self.lock:
+            rows = self.db.execute("SELECT seq, time, message FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq",
+                                   (job_id, after)).fetchall()
+        return [dict(row) for row in rows]
+
+    def finish(self, job_id, state, result=None, error=None):
+        progress = ", progress = 100" if state == "done" else ""
+        self.execute(f"UPDATE jobs SET state = ?, finished = ?, result = ?, error = ?{progress} WHERE id = ?",
+                     (state, time.time(), json.dumps(result) if result is not None else None, error, job_id))
+
+    def requeue(self, job_id):
+        self.execute("UPDATE jobs SET state = 'queued', started = NULL WHERE id = ?", (job_id,))
+
+def job_record(row):
+    job = dict(row)
+    job["config"] = json.loads(job["config"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+class ServiceProgress(ProgressCallback):
+    # Runs inside a runner; everything is forwarded to the service process, which owns the database
+    def __init__(self, job_id, events, cancel):
+        self.job_id = job_id
+        self.events = events
+        self.cancel = cancel
+
+    def log(self, msg):
+        self.events.put(("log", self.job_id, msg))
+
+    def status(self, text):
+        self.events.put(("status", self.job_id, text))
+
+    def progress(self, percent, text):
+        self.events.put(("progress", self.job_id, percent, text))
+
+    def cancelled(self):
+        return bool(self.cancel.value)
+
+def run_job(config, progress):
+    if is_batch_source(config.video_path):
+        configs = batch_configs(config.video_path, config.output_dir, config)
+        return extract_batch(configs, config.worker_count, progress, config.save_csv_log)
+    return extract_frames(config, progress)
+
+def run_runner(slot, tasks, events, cancel):
+    # Ctrl-C or a SIGTERM sent to the whole process group stops jobs through the cancel flag,
+    # so they checkpoint instead of dying mid-write; the pool workers a job starts inherit this
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    for job_id, payload in iter(tasks.get, None):
+        progress = ServiceProgress(job_id, events, cancel)
+        try:
+            result = run_job(ExtractionConfig(**payload), progress)
+            events.put(("finished", slot, job_id, {key: result[key] for key in RESULT_KEYS if key in result}, None))
+        except Exception as e:
+            events.put(("finished", slot, job_id, None, f"{type(e).__name__}: {e}"))
+
+class Runner:
+    # One warm process; multi-core jobs start their worker pool from it
+    def __init__(self, slot, events):
+        self.slot = slot
+        self.tasks = mp.Queue()
+        self.cancel = mp.Value("b", 0, lock=False)
+        self.job_id = None
+        self.process = mp.Process(target=run_runner, args=(slot, self.tasks, events, self.cancel), name=f"runner{slot}")
+        self.process.start()
+
+    def assign(self, job):
+        self.job_id = job["id"]
+        self.cancel.value = 0
+        self.tasks.put((job["id"], job["config"]))
+
+class JobService:
+    def __init__(self, queue, runner_count=SERVICE_RUNNERS, log=print):
+        self.queue = queue
+        self.log = log
+        self.closing = False
+        self.condition = threading.Condition()
+        self.events = mp.Queue()
+        recovered = queue.recover()
+        if recovered:
+            log(f"♻️ Re-queued {recovered} job(s) interrupted by the last shutdown")
+        self.runners = [Runner(slot, self.events) for slot in range(max(runner_count, 1))]
+        self.threads = [threading.Thread(target=self.pump_events, daemon=True), threading.Thread(target=self.dispatch, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        log(f"🛰 {len(self.runners)} runner(s) ready | queue '{queue.path}'")
+
+    def submit(self, payload):
+        job_id = self.queue.submit(job_config(payload))
+        with self.condition:
+            self.condition.notify()
+        return job_id
+
+    def cancel(self, job_id):
+        state = self.queue.request_cancel(job_id)
+        if state == "running":
+            with self.condition:
+                for runner in self.runners:
+                    if runner.job_id == job_id:
+                        runner.cancel.value = 1
+        return state
+
+    def dispatch(self):
+        with self.condition:
+            while not self.closing:
+                self.replace_dead_runners()
+                for runner in self.runners:
+                    if runner.job_id is not None:
+                        continue
+                    job = self.queue.claim_next()
+                    if job is None:
+                        break
+                    self.log(f"▶ Job {job['id']} started on runner {runner.slot}: {job['config']['video_path']}")
+                    runner.assign(job)
+                self.condition.wait(DISPATCH_INTERVAL_SEC)
+
+    def replace_dead_runners(self):
+        # A crash in native code takes the runner with it; fail its job and start a fresh one
+        for i, runner in enumerate(self.runners):
+            if runner.process.is_alive():
+                continue
+            if runner.job_id is not None:
+                self.queue.finish(runner.job_id, "failed", error=f"runner exited with code {runner.process.exitcode}")
+                self.log(f"❌ Job {runner.job_id} failed: runner {runner.slot} exited with code {runner.process.exitcode}")
+            self.runners[i] = Runner(runner.slot, self.events)
+
+    def pump_events(self):
+        for event in iter(self.events.get, None):
+            kind, job_id = event[0], event[1]
+            if kind == "log":
+                self.queue.log(job_id, event[2])
+            elif kind == "status":
+                self.queue.message(job_id, event[2])
+            elif kind == "progress":
+                self.queue.progress(job_id, event[2], event[3])
+            elif kind == "finished":
+                self.finished(*event[1:])
+
+    def finished(self, slot, job_id, result, error):
+        job = self.queue.get(job_id)
+        if error:
+            self.queue.finish(job_id, "failed", error=error)
+            self.log(f"❌ Job {job_id} failed: {error}")
+        elif result.get("cancelled") and not job["cancel_requested"]:
+            # Stopped by the service shutting down, not by a client: run the rest next time
+            self.queue.requeue(job_id)
+            self.log(f"⏸ Job {job_id} interrupted; re-queued")
+        else:
+            state = "cancelled" if result.get("cancelled") else "done"
+            self.queue.finish(job_id, state, result)
+            self.log(f"{'⏹' if state == 'cancelled' else '✅'} Job {job_id} {state}: {result.get('saved', 0)} frames saved")
+        with self.condition:
+            self.runners[slot].job_id = None
+            self.condition.notify()
+
+    def close(self):
+        # Running jobs checkpoint and stop; each runner exits once it has reported its job
+        with self.condition:
+            self.closing = True
+            for runner in self.runners:
+                if runner.job_id is not None:
+                    runner.cancel.value = 1
+                runner.tasks.put(None)
+            self.condition.notify()
+        for runner in self.runners:
+            runner.process.join()
+        self.events.put(None)
+        self.threads[0].join()
+        self.queue.close()
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # JSON over HTTP: POST /jobs, GET /jobs[?state=], GET /jobs/<id>, GET /jobs/<id>/log[?after=], POST /jobs/<id>/cancel
+    def log_message(self, format, *args):
+        pass  # Requests are not logged; job events are
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        job_id = None
+        if len(parts) > 1 and parts[0] == "jobs":
+            if not parts[1].isdigit():
+                raise KeyError(parts[1])
+            job_id = int(parts[1])
+        return parts, job_id, query
+
+    def do_GET(self):
+        service = self.server.service
+        try:
+            parts, job_id, query = self.route()
+            if parts == ["health"]:
+                self.send_json(200, {"status": "ok", "runners": len(service.runners), "busy": sum(r.job_id is not None for r in service.runners)})
+            elif parts == ["jobs"]:
+                self.send_json(200, {"jobs": service.queue.list(query.get("state"))})
+            elif len(parts) == 2:
+                self.send_json(200, service.queue.get(job_id))
+            elif len(parts) == 3 and parts[2] == "log":
+                service.queue.get(job_id)
+                self.send_json(200, {"lines": service.queue.logs(job_id, int(query.get("after", 0)))})
+            else:
+                self.send_json(404, {"error": f"no route for GET {self.path}"})
+        except KeyError as e:
+            self.send_json(404, {"error": f"no job {e.args[0]}"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            parts, job_id, query = self.route()
+            if parts == ["jobs"]:
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"null")
+                except ValueError:
+                    raise ValueError("Request body is not valid JSON.")
+                self.send_json(201, {"id": service.submit(payload)})
+            elif len(parts) == 3 and parts[2] == "cancel":
+                state = service.cancel(job_id)
+                if state in FINISHED_STATES:
+                    self.send_json(409, {"error": f"job {job_id} is already {state}"})
+                else:
+                    self.send_json(202, service.queue.get(job_id))
+            else:
+                self.send_json(404, {"error": f"no route for POST {self.path}"})
+        except KeyError as e:
+            self.send_json(404, {"error": f"no job {e.args[0]}"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+
+class UnixHTTPServer(ThreadingMixIn, HTTPServer):
+    address_family = getattr(socket, "AF_UNIX", None)  # Missing on Windows builds of CPython
+    daemon_threads = True
+
+    def server_bind(self):
+        # HTTPServer.server_bind looks up a host name, which a socket path doesn't have
+        TCPServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+def service_log(msg):
+    # Flushed per line, so nothing buffered is duplicated into forked runners and journald sees it live
+    print(msg, flush=True)
+
+def service_address(args):
+    return args.socket or f"http://{args.host}:{args.port}"
+
+def require_unix_sockets():
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValueError("Unix sockets are not available on this platform; use --host and --port.")
+
+def start_server(args, service):
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)  # Left behind by a service that didn't shut down
+        server = UnixHTTPServer(args.socket, ServiceHandler)
+        os.chmod(args.socket, 0o600)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def run_service(args):
+    if args.socket:
+        require_unix_sockets()  # Before any runner starts
+    queue = JobQueue(args.db)
+    service = JobService(queue, args.runners, service_log)
+    # SIGTERM (systemd, docker stop) shuts down the same way as Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server = start_server(args, service)
+    except OSError as e:
+        service.close()
+        raise ValueError(f"Cannot listen on {service_address(args)}: {e}")
+    service_log(f"🛰 Listening on {service_address(args)} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        service_log("\n⏹ Stopping: running jobs checkpoint and will resume on the next start")
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        service.close()
+    return 0
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+class ServiceClient:
+    # Talks to `serve` over TCP or a Unix socket; raises ValueError with the service's message on errors
+    def __init__(self, address=f"http://{SERVICE_HOST}:{SERVICE_PORT}"):
+        self.address = address
+
+    def connection(self):
+        if not self.address.startswith("http://"):
+            require_unix_sockets()
+            return UnixHTTPConnection(self.address)
+        url = urlsplit(self.address)
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+    def request(self, method, path, body=None):
+        conn = self.connection()
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"null")
+        except (ConnectionRefusedError, FileNotFoundError):
+            raise ValueError(f"No job service at {self.address}; start one with 'frame_extractor.py serve'.")
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise ValueError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def submit(self, settings):
+        return self.request("POST", "/jobs", settings)["id"]
+
+    def jobs(self, state=None):
+        return self.request("GET", f"/jobs?state={state}" if state else "/jobs")["jobs"]
+
+    def job(self, job_id):
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def logs(self, job_id, after=0):
+        return self.request("GET", f"/jobs/{job_id}/log?after={after}")["lines"]
+
+    def cancel(self, job_id):
+        return self.request("POST", f"/jobs/{job_id}/cancel")
+
+    def wait(self, job_id, on_log=None):
+        # Streams new log lines to on_log until the job reaches a final state
+        seq = 0
+        while True:
+            job = self.job(job_id)
+            for line in self.logs(job_id, seq):
+                seq = line["seq"]
+                if on_log:
+                    on_log(line["message"])
+            if job["state"] in FINISHED_STATES:
+                return job
+            time.sleep(CLIENT_POLL_SEC)
+
+def add_address_args(parser):
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"TCP address of the service (default: {SERVICE_HOST})")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"TCP port of the service (default: {SERVICE_PORT})")
+    parser.add_argument("--socket", default="", metavar="PATH", help="use a Unix socket at PATH instead of TCP")
+
+def add_serve_args(parser):
+    add_address_args(parser)
+    parser.add_argument("--db", default=SERVICE_DB, help=f"SQLite job queue (default: {SERVICE_DB})")
+    parser.add_argument("--runners", type=int, default=SERVICE_RUNNERS,
+                        help=f"jobs run at the same time, each in its own warm process (default: {SERVICE_RUNNERS})")
+
+def add_jobs_args(parser):
+    add_address_args(parser)
+    commands = parser.add_subparsers(dest="jobs_command", required=True)
+    submit = commands.add_parser("submit", help="queue an extraction; a folder, glob or manifest queues a batch")
+    submit.add_argument("video")
+    submit.add_argument("-o", "--output", required=True, help="output folder (output root for a batch)")
+    submit.add_argument("--wait", action="store_true", help="follow the job's log until it finishes")
+    add_extraction_args(submit)
+    listing = commands.add_parser("list", help="list jobs")
+    listing.add_argument("--state", choices=list(JOB_STATES))
+    status = commands.add_parser("status", help="show a job")
+    status.add_argument("id", type=int)
+    status.add_argument("--wait", action="store_true", help="follow the job's log until it finishes")
+    cancel = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel.add_argument("id", type=int)
+
+def format_job(job):
+    line = f"{job['id']:>5}  {job['state']:<9} {job['progress']:>3}%  {job['config']['video_path']}"
+    if job["error"]:
+        line += f"  ❌ {job['error']}"
+    elif job["result"]:
+        line += f"  ({job['result'].get('saved', 0)} saved)"
+    elif job["message"]:
+        line += f"  {job['message']}"
+    return line
+
+def job_exit_code(job):
+    return 0 if job["state"] == "done" else 1
+
+def run_jobs_command(args):
+    client = ServiceClient(service_address(args))
+    if args.jobs_command == "submit":
+        # Paths are resolved here, since the service may run from another working directory
+        config = config_from_args(args, os.path.abspath(args.video), os.path.abspath(args.output))
+        settings = dataclasses.asdict(config)
+        if config.trace_path:
+            settings["trace_path"] = os.path.abspath(config.trace_path)
+        job_id = client.submit(settings)
+        print(f"📥 Job {job_id} queued")
+        if not args.wait:
+            return 0
+        job = client.wait(job_id, print)
+    elif args.jobs_command == "list":
+        for job in client.jobs(args.state):
+            print(format_job(job))
+        return 0
+    elif args.jobs_command == "cancel":
+        job = client.cancel(args.id)
+        print(f"⏹ Job {args.id} {'cancelled' if job['state'] == 'cancelled' else 'stopping at the next checkpoint'}")
+        return 0
+    else:
+        job = client.wait(args.id, print) if args.wait else client.job(args.id)
+    print(format_job(job))
+    return job_exit_code(job) if job["state"] in FINISHED_STATES else 0
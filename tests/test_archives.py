@@ -0,0 +1,54 @@
+import tarfile
+import zipfile
+
+import pytest
+
+from frame_extractor import ArchiveStore, FrameEncoder, FrameIndex, archive_path, repair_archives
+
+def write_frames(store, index, frame_ids):
+    for frame_id in frame_ids:
+        name = store.name(frame_id)
+        store.put(name, bytes([frame_id]) * 100)
+        index.add({"id": frame_id, **store.locate(frame_id), "size": 100})
+
+@pytest.mark.parametrize("container", ["tar", "zip"])
+def test_repair_cuts_archive_back_to_indexed_frames(tmp_path, container):
+    store = ArchiveStore(str(tmp_path), FrameEncoder("npy"), container)
+    index = FrameIndex(str(tmp_path))
+    write_frames(store, index, range(5))
+    store.flush()
+    index.flush()
+    # Written after the last checkpoint, so never indexed, then a torn frame: the
+    # process dies without closing the archive
+    for frame_id in (5, 6):
+        store.put(store.name(frame_id), b"late" * 25)
+    fp = store.archive.fileobj if container == "tar" else store.archive.fp
+    fp.write(b"PK\x03\x04torn" if container == "zip" else b"\x01" * 700)
+    fp.close()
+    # Nothing finalises the archive later either (ZipFile would on garbage collection)
+    store.archive.fp = store.archive.fileobj = None
+
+    repair_archives(str(tmp_path))
+    path = archive_path(str(tmp_path), container)
+    if container == "tar":
+        with tarfile.open(path) as tar:
+            frames = {member.name: tar.extractfile(member).read() for member in tar}
+    else:
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            frames = {name: archive.read(name) for name in archive.namelist()}
+    assert frames == {store.name(frame_id): bytes([frame_id]) * 100 for frame_id in range(5)}
+
+    # The next run appends after the kept frames
+    store = ArchiveStore(str(tmp_path), FrameEncoder("npy"), container)
+    store.put(store.name(9), b"new")
+    store.close()
+    names = tarfile.open(path).getnames() if container == "tar" else zipfile.ZipFile(path).namelist()
+    assert names == [store.name(frame_id) for frame_id in (0, 1, 2, 3, 4, 9)]
+
+def test_repair_removes_archive_without_indexed_frames(tmp_path):
+    store = ArchiveStore(str(tmp_path), FrameEncoder("npy"), "zip")
+    store.put(store.name(0), b"never indexed")
+    store.flush()
+    repair_archives(str(tmp_path))
+    assert not (tmp_path / "frames.zip").exists()
@@ -0,0 +1,27 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_extractor import ExtractionConfig, extract_batch
+
+def make_still_video(path, frames=60, size=(64, 48)):
+    # The same sharp picture in every frame: all near-duplicates of each other
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    picture = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    for _ in range(frames):
+        writer.write(picture)
+    writer.release()
+    return str(path)
+
+def test_batch_applies_dedup_per_video(tmp_path):
+    configs = []
+    for name, dedup in (("deduped", True), ("plain", False)):
+        video = make_still_video(tmp_path / f"{name}.avi")
+        configs.append(ExtractionConfig(video_path=video, output_dir=str(tmp_path / name), fps=10, dedup=dedup,
+                                        use_multicore=True, worker_count=2, session_path=str(tmp_path / f"{name}.json")))
+    result = extract_batch(configs, 2)
+    saved = {video["output_dir"]: video["saved"] for video in result["videos"]}
+    assert saved[str(tmp_path / "plain")] == 20
+    assert saved[str(tmp_path / "deduped")] == 1
@@ -0,0 +1,29 @@
+from frame_extractor import FileStore, FrameEncoder, FrameIndex, load_frame_index, merge_dedup_boundaries
+
+def saved_frames(tmp_path, frame_ids):
+    store = FileStore(str(tmp_path), FrameEncoder())
+    index = FrameIndex(str(tmp_path))
+    for frame_id in frame_ids:
+        store.put(store.name(frame_id), b"jpeg")
+        index.add({"id": frame_id, **store.locate(frame_id), "size": 4})
+    index.close()
+    return store
+
+def test_merge_dedup_boundaries_removes_repeated_segment_starts(tmp_path):
+    store = saved_frames(tmp_path, [0, 100, 200, 300])
+    boundaries = {
+        0: {"first_hash": 0b1111, "first_id": 0, "last_hash": 0b1111},
+        # Same picture as the end of the previous segment: dropped
+        100: {"first_hash": 0b1110, "first_id": 100, "last_hash": 0xFFFF0000},
+        # Segment with nothing kept
+        150: None,
+        # Compared against the last segment that kept something
+        200: {"first_hash": 0xFFFF0000, "first_id": 200, "last_hash": 0xFFFF0000},
+        # A repeat whose frame never made it into the index is not counted
+        250: {"first_hash": 0xFFFF0000, "first_id": 250, "last_hash": 0xFFFF0000},
+        300: {"first_hash": 0x0F0F0F0F0F0F, "first_id": 300, "last_hash": 0x0F0F0F0F0F0F},
+    }
+    assert merge_dedup_boundaries(boundaries, str(tmp_path), store, max_distance=2) == 2
+    assert sorted(load_frame_index(str(tmp_path))) == [0, 300]
+    assert not (tmp_path / store.name(100)).exists()
+    assert (tmp_path / store.name(300)).exists()
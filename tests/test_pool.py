@@ -0,0 +1,66 @@
+import errno
+import os
+import queue
+
+import cv2
+import numpy as np
+import pytest
+
+import frame_extractor
+from frame_extractor import (ExtractionConfig, ProgressCallback, encode_stats, extract_frames, plan_job, progress_counters, run_worker,
+                             worker_trace_path)
+
+# What worker_stats_total and the CSV log read from every process's row
+STATS_FIELDS = {"segments", "frames", "saved", "total", "suppressed", "mode", "backend", "encode", "stages", "peak_rss_mb", "time"}
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clip") / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    rng = np.random.default_rng(0)
+    for _ in range(900):
+        writer.write(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+@pytest.mark.parametrize("topology", ["seek", "ring"])
+def test_every_process_reports_the_full_stats_schema(tmp_path, clip, topology):
+    config = ExtractionConfig(video_path=clip, output_dir=str(tmp_path / "out"), fps=10, output_format="npy", use_multicore=True,
+                              worker_count=2, topology=topology, session_path=str(tmp_path / "session.json"))
+    workers = extract_frames(config)["workers"]
+    assert set(workers) == ({0, 1, "decoder"} if topology == "ring" else {0, 1})
+    for stats in workers.values():
+        assert STATS_FIELDS <= set(stats)
+        assert set(stats["encode"]) == set(encode_stats())
+
+def test_worker_tears_down_and_reports_stats_after_a_failed_write(tmp_path, clip, monkeypatch):
+    write = frame_extractor.FileStore.write
+
+    def full_disk(store, frame_id, frame, backend, timestamp=None):
+        if frame_id == 90:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        return write(store, frame_id, frame, backend, timestamp)
+
+    monkeypatch.setattr(frame_extractor.FileStore, "write", full_disk)
+    config = ExtractionConfig(video_path=clip, output_dir=str(tmp_path / "out"), fps=10, output_format="npy", use_multicore=True,
+                              worker_count=1, session_path=str(tmp_path / "session.json"))
+    job = plan_job(config, ProgressCallback())
+    worker_jobs = [{key: job[key] for key in ("config", "session", "step", "video_fps", "mode", "sharpness", "scan")}]
+    segments = queue.Queue()
+    for segment in job["segments"]:
+        segments.put((0, segment))
+    segments.put(None)
+    instrument = {"histogram": False, "trace_path": str(tmp_path / "trace.json"), "profile_worker": 0,
+                  "profile_path": str(tmp_path / "worker{}.prof")}
+    return_dict = {}
+
+    # Run in this process, so the error and what the teardown left behind can be checked directly
+    with pytest.raises(ValueError, match="No space left"):
+        run_worker(worker_jobs, segments, return_dict, progress_counters(1), 0, instrument=instrument)
+    stats = return_dict[0]
+    assert STATS_FIELDS <= set(stats)
+    assert stats["encode"]["failed"] == 1
+    assert os.path.exists(worker_trace_path(0, instrument["trace_path"]))
+    assert os.path.exists(instrument["profile_path"].format(0))
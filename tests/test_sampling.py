@@ -0,0 +1,27 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_extractor import ExtractionConfig, extract_frames
+
+@pytest.fixture(scope="module")
+def ntsc_clip(tmp_path_factory):
+    # Just over a minute at 29.97 fps: the last frame is at 60.03s
+    path = str(tmp_path_factory.mktemp("clip") / "ntsc.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30000 / 1001, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    rng = np.random.default_rng(0)
+    for _ in range(1800):
+        writer.write(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+@pytest.mark.parametrize("fps, expected", [(10, 601), (0.2, 13)])
+@pytest.mark.parametrize("multicore", [False, True])
+def test_time_sampling_hits_the_exact_rate(tmp_path, ntsc_clip, fps, expected, multicore):
+    # Every Nth frame would drift (every 3rd frame of 29.97 fps is 9.99 fps); one frame
+    # per 1/fps of timestamps doesn't, and doesn't depend on where segments start
+    config = ExtractionConfig(video_path=ntsc_clip, output_dir=str(tmp_path / "out"), fps=fps, sample_by="time", blur_threshold=0,
+                              output_format="npy", use_multicore=multicore, worker_count=3, session_path=str(tmp_path / "session.json"))
+    assert extract_frames(config)["saved"] == expected
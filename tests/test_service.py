@@ -0,0 +1,151 @@
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import frame_extractor
+from frame_extractor_service import JobQueue, JobService, ServiceClient, start_server
+from frame_extractor import ExtractionConfig
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+def make_video(path, frames, size=(64, 48)):
+    # Noise frames, so every frame passes the blur threshold
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    rng = np.random.default_rng(0)
+    for _ in range(frames):
+        writer.write(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # Runners fork from here, so they see the scan cache moved out of the home folder
+    monkeypatch.setattr(frame_extractor, "SCAN_CACHE_DIR", str(tmp_path / "scans"))
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    service = JobService(queue, 1, log=lambda msg: None)
+    server = start_server(SimpleNamespace(socket=str(tmp_path / "svc.sock")), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, ServiceClient(str(tmp_path / "svc.sock"))
+    server.shutdown()
+    server.server_close()
+    if not service.closing:
+        service.close()
+
+def wait_for(client, job_id, condition, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.job(job_id)
+        if condition(job):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} stuck in state {job['state']}")
+
+def slow_job(tmp_path, name):
+    # Large, incompressible PNGs at every frame: long enough to cancel mid-run
+    video = tmp_path / "slow.avi"
+    if not video.exists():
+        make_video(video, 600, (640, 480))
+    return {"video_path": str(video), "output_dir": str(tmp_path / name), "output_format": "png", "png_compression": 9}
+
+def test_submit_runs_job_and_keeps_files_in_output_dir(tmp_path, service):
+    _, client = service
+    video = make_video(tmp_path / "clip.avi", 30)
+    assert client.health()["status"] == "ok"
+    job_id = client.submit({"video_path": video, "output_dir": str(tmp_path / "out"), "fps": 10, "save_csv_log": True,
+                            "use_multicore": True, "worker_count": 2})
+    job = client.wait(job_id)
+    assert job["state"] == "done", job["error"]
+    assert job["progress"] == 100
+    assert job["result"]["saved"] == 10
+    assert any("Log saved" in line["message"] for line in client.logs(job_id))
+    # Session and CSV log land in the job's own output folder, not the service's working directory
+    assert os.path.exists(tmp_path / "out" / "session.json")
+    assert os.path.exists(tmp_path / "out" / "log.csv")
+    assert [job["id"] for job in client.jobs("done")] == [job_id]
+
+def test_rejects_bad_jobs(tmp_path, service):
+    _, client = service
+    with pytest.raises(ValueError, match="Unknown setting"):
+        client.submit({"video_path": "x.mp4", "output_dir": "out", "bogus": 1})
+    with pytest.raises(ValueError, match="No video"):
+        client.submit({"video_path": str(tmp_path / "missing.mp4"), "output_dir": str(tmp_path / "out")})
+    with pytest.raises(ValueError, match="no job"):
+        client.job(999)
+
+def test_cancel_queued_and_running_jobs(tmp_path, service):
+    _, client = service
+    running = client.submit(slow_job(tmp_path, "a"))
+    queued = client.submit(slow_job(tmp_path, "b"))
+    assert client.cancel(queued)["state"] == "cancelled"
+    wait_for(client, running, lambda job: job["state"] == "running" and job["progress"] > 0)
+    client.cancel(running)
+    job = client.wait(running)
+    assert job["state"] == "cancelled"
+    assert job["result"]["cancelled"] and job["result"]["saved"] < 600
+    with pytest.raises(ValueError, match="already cancelled"):
+        client.cancel(running)
+    assert not os.path.exists(tmp_path / "b")
+
+def test_cancel_during_scan(tmp_path, service):
+    _, client = service
+    job_id = client.submit(dict(slow_job(tmp_path, "a"), scan=True))
+    wait_for(client, job_id, lambda job: job["progress"] > 0 and any("Scanning" in line["message"] for line in client.logs(job_id)))
+    client.cancel(job_id)
+    job = client.wait(job_id)
+    assert job["state"] == "cancelled", job["error"]
+    assert job["result"]["cancelled"] and job["result"]["saved"] == 0
+    assert any("Scan cancelled" in line["message"] for line in client.logs(job_id))
+    # An interrupted scan is never cached
+    assert os.listdir(tmp_path / "scans") == []
+
+def test_shutdown_requeues_running_job_and_restart_resumes_it(tmp_path, service):
+    first, client = service
+    job_id = client.submit(slow_job(tmp_path, "a"))
+    wait_for(client, job_id, lambda job: job["state"] == "running" and job["progress"] > 0)
+    first.close()
+    queue = JobQueue(first.queue.path)
+    assert queue.get(job_id)["state"] == "queued"
+    saved = ExtractionConfig(**queue.get(job_id)["config"]).session_path
+    assert os.path.exists(saved)
+
+    before = queue.logs(job_id)[-1]["seq"]
+    second = JobService(queue, 1, log=lambda msg: None)
+    try:
+        deadline = time.time() + 60
+        while not [line for line in queue.logs(job_id, before) if "Starting from frame" in line["message"]]:
+            assert time.time() < deadline
+            time.sleep(0.05)
+        start = [line["message"] for line in queue.logs(job_id, before) if "Starting from frame" in line["message"]][0]
+        assert not start.startswith("▶ Starting from frame 0 ")
+        second.cancel(job_id)
+    finally:
+        second.close()
+    queue = JobQueue(first.queue.path)
+    assert queue.get(job_id)["state"] == "cancelled"
+    queue.close()
+
+def test_recover_requeues_interrupted_jobs(tmp_path):
+    video = make_video(tmp_path / "clip.avi", 3)
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path)
+    interrupted = queue.submit(ExtractionConfig(video_path=video, output_dir=str(tmp_path / "a")))
+    cancelling = queue.submit(ExtractionConfig(video_path=video, output_dir=str(tmp_path / "b")))
+    queue.claim_next()
+    queue.claim_next()
+    queue.request_cancel(cancelling)
+    queue.close()
+
+    queue = JobQueue(path)
+    assert queue.recover() == 1
+    assert queue.get(interrupted)["state"] == "queued"
+    assert queue.get(cancelling)["state"] == "cancelled"
+    queue.close()
@@ -0,0 +1,131 @@
+import json
+import os
+
+from frame_extractor import (SessionCheckpoint, load_session, merge_ranges, merge_worker_sessions, new_session, prepare_session, save_session,
+                             session_completed_ranges, subtract_ranges, worker_session_path, worker_session_paths)
+
+def test_merge_ranges_sorts_joins_and_drops_empty():
+    assert merge_ranges([[10, 20], [0, 5], [5, 8], [18, 30], [40, 40], [50, 45]]) == [[0, 8], [10, 30]]
+    assert merge_ranges([]) == []
+
+def test_merge_ranges_keeps_gaps():
+    assert merge_ranges([[0, 5], [6, 10]]) == [[0, 5], [6, 10]]
+
+def test_subtract_ranges():
+    assert subtract_ranges(0, 100, []) == [[0, 100]]
+    assert subtract_ranges(0, 100, [[0, 100]]) == []
+    assert subtract_ranges(0, 100, [[10, 20], [15, 30], [90, 120]]) == [[0, 10], [30, 90]]
+
+def test_subtract_ranges_clips_to_window():
+    assert subtract_ranges(50, 60, [[0, 55], [58, 59], [100, 200]]) == [[55, 58], [59, 60]]
+
+def test_completed_ranges_reads_legacy_last_frame():
+    assert session_completed_ranges({"last_frame": 120}) == [[0, 120]]
+    assert session_completed_ranges({"last_frame": 0}) == []
+    assert session_completed_ranges({"last_frame": 50, "completed": [[40, 80], [100, 110]]}) == [[0, 80], [100, 110]]
+
+def test_checkpoint_flushes_by_frame_count(tmp_path):
+    path = tmp_path / "session.json"
+    session = {"completed": [], "saved": 0}
+    checkpoint = SessionCheckpoint(session, str(path), interval_sec=3600, interval_frames=10)
+    checkpoint.mark_done(0, 5, 1)
+    assert checkpoint.flush_count == 0 and not path.exists()
+    checkpoint.mark_done(5, 10, 1)
+    assert checkpoint.flush_count == 1
+    assert json.loads(path.read_text()) == {"completed": [[0, 10]], "saved": 2}
+
+def test_checkpoint_flushes_by_time(tmp_path):
+    path = tmp_path / "session.json"
+    checkpoint = SessionCheckpoint({"completed": []}, str(path), interval_sec=0, interval_frames=10 ** 9)
+    checkpoint.mark_done(0, 1)
+    checkpoint.mark_done(1, 2)
+    assert checkpoint.flush_count == 2
+    assert load_session(str(path))["completed"] == [[0, 2]]
+
+def test_checkpoint_runs_before_flush_first(tmp_path):
+    path = tmp_path / "session.json"
+    seen = []
+    checkpoint = SessionCheckpoint({"completed": []}, str(path), before_flush=lambda: seen.append(path.exists()))
+    checkpoint.mark_done(0, 3)
+    checkpoint.flush()
+    assert seen == [False]
+
+def test_checkpoint_coalesces_and_reports_pending(tmp_path):
+    session = {"completed": [[0, 10]], "saved": 4}
+    checkpoint = SessionCheckpoint(session, str(tmp_path / "session.json"), interval_sec=3600, interval_frames=10 ** 9)
+    for frame in range(20, 30):
+        checkpoint.mark_done(frame, frame + 1)
+    checkpoint.mark_done(40, 45, 2)
+    assert checkpoint.open_range == [40, 45]
+    assert checkpoint.completed_ranges() == [[0, 10], [20, 30], [40, 45]]
+    assert checkpoint.pending_ranges(0, 50) == [[10, 20], [30, 40], [45, 50]]
+    assert session["saved"] == 6
+
+def make_video(tmp_path, data=b"\0" * 1024):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(data)
+    return str(path)
+
+def saved_session(tmp_path, video, total_frames=100, **overrides):
+    session = dict(new_session(video, str(tmp_path / "out"), 2, 5.0, total_frames), completed=[[0, 40]], saved=7, **overrides)
+    path = str(tmp_path / "session.json")
+    save_session(session, path)
+    return path
+
+def test_merge_worker_sessions_folds_matching_workers(tmp_path):
+    video = make_video(tmp_path)
+    path = str(tmp_path / "session.json")
+    session = dict(new_session(video, str(tmp_path / "out"), 2, 5.0, 100), completed=[[0, 10]], saved=2)
+    save_session(dict(session, completed=[[10, 20], [30, 35]], saved=3), worker_session_path(0, path))
+    # Left by a run with other settings: neither its ranges nor its frames count
+    save_session(dict(session, fps=5, completed=[[50, 60]], saved=9), worker_session_path(1, path))
+
+    merged = merge_worker_sessions(session, path)
+    assert merged["completed"] == [[0, 20], [30, 35]]
+    assert merged["saved"] == 5
+    assert worker_session_paths(path) == []
+    assert load_session(path)["completed"] == [[0, 20], [30, 35]]
+
+def test_merge_worker_sessions_without_workers_leaves_disk_alone(tmp_path):
+    video = make_video(tmp_path)
+    path = str(tmp_path / "session.json")
+    session = dict(new_session(video, str(tmp_path / "out"), 2, 5.0, 100), completed=[[5, 10], [0, 5]])
+    assert merge_worker_sessions(session, path)["completed"] == [[0, 10]]
+    assert load_session(path) is None
+
+def test_prepare_session_resumes_unchanged_video(tmp_path):
+    video = make_video(tmp_path)
+    path = saved_session(tmp_path, video)
+    session = prepare_session(new_session(video, str(tmp_path / "out"), 2, 5.0, 100), False, path)
+    assert session["completed"] == [[0, 40]] and session["saved"] == 7
+
+def test_prepare_session_discards_changed_video(tmp_path):
+    video = make_video(tmp_path)
+    path = saved_session(tmp_path, video)
+    fresh = lambda total_frames=100: prepare_session(new_session(video, str(tmp_path / "out"), 2, 5.0, total_frames), False, path)
+    # Frame count
+    assert fresh(total_frames=101)["completed"] == []
+    # Modification time
+    stat = os.stat(video)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert fresh()["completed"] == []
+    # Size alone, with the modification time put back (a copy that kept the original's mtime)
+    path = saved_session(tmp_path, video)
+    stat = os.stat(video)
+    with open(video, "ab") as f:
+        f.write(b"\0")
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert fresh()["completed"] == []
+
+def test_prepare_session_discards_legacy_session_without_fingerprint(tmp_path):
+    video = make_video(tmp_path)
+    path = str(tmp_path / "session.json")
+    save_session({"video_path": video, "output_dir": str(tmp_path / "out"), "fps": 2, "blur_threshold": 5.0, "last_frame": 50}, path)
+    assert prepare_session(new_session(video, str(tmp_path / "out"), 2, 5.0, 100), False, path)["completed"] == []
+
+def test_prepare_session_discards_other_encode_settings(tmp_path):
+    video = make_video(tmp_path)
+    path = saved_session(tmp_path, video)
+    for settings in ({"quality": 50}, {"png_compression": 9}, {"jpeg_optimize": True}):
+        session = prepare_session(new_session(video, str(tmp_path / "out"), 2, 5.0, 100, **settings), False, path)
+        assert session["completed"] == [], settings
@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_extractor import (SHARPNESS_METRICS, SHARPNESS_PRESETS, SharpnessScorer, calibrated_score, map_blur_threshold, score_frames,
+                             sharpness_settings)
+
+def make_blur_clip(path, frames=72, size=(320, 240)):
+    # One texture at blur levels from sharp to very soft, in shuffled order so the
+    # calibration samples see the whole range
+    rng = np.random.default_rng(7)
+    base = cv2.resize(rng.integers(0, 256, (size[1] // 4, size[0] // 4, 3), dtype=np.uint8), size, interpolation=cv2.INTER_NEAREST)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    sigmas = np.linspace(0, 4, frames)
+    rng.shuffle(sigmas)
+    for sigma in sigmas:
+        writer.write(base if sigma < 0.2 else cv2.GaussianBlur(base, (0, 0), sigma))
+    writer.release()
+    return str(path)
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+@pytest.mark.parametrize("preset", [name for name in SHARPNESS_PRESETS if name != "Exact"])
+def test_presets_keep_the_same_frames_as_exact(tmp_path, preset):
+    video = make_blur_clip(tmp_path / "clip.avi")
+    frames = read_frames(video)
+    exact = np.array([SharpnessScorer().score(frame) for frame in frames])
+    scorer = SharpnessScorer(**sharpness_settings(preset, video))
+    scores = np.array([scorer.score(frame) for frame in frames])
+    for q in (25, 50, 75):
+        threshold = np.percentile(exact, q)
+        expected, kept = set(np.flatnonzero(exact >= threshold)), set(np.flatnonzero(scores >= threshold))
+        assert len(expected & kept) / len(expected | kept) >= 0.8, (preset, q, sorted(expected ^ kept))
+
+def test_calibration_is_monotone_and_invertible():
+    calibration = [[0.1, 0.2, 0.4], [10.0, 50.0, 200.0]]
+    assert calibrated_score(0.3, calibration) == pytest.approx(125.0)
+    # Proportional outside the knots
+    assert calibrated_score(0.8, calibration) == pytest.approx(400.0)
+    assert calibrated_score(0.05, calibration) == pytest.approx(5.0)
+    assert map_blur_threshold(125.0, calibration) == pytest.approx(0.3)
+    assert calibrated_score(7.0, None) == 7.0
+
+@pytest.mark.parametrize("metric", list(SHARPNESS_METRICS))
+@pytest.mark.parametrize("depth", ["float64", "float32"])
+def test_batched_scores_select_the_same_frames_as_per_frame(tmp_path, metric, depth):
+    # Frames are filtered stacked in one call; the border rows must not leak between them
+    frames = np.array(read_frames(make_blur_clip(tmp_path / "clip.avi", frames=24)))
+    batched = score_frames(frames, metric, depth)
+    single = np.array([score_frames(frame[None], metric, depth)[0] for frame in frames])
+    assert batched == pytest.approx(single, rel=1e-4 if depth == "float32" else 1e-9)
+    for q in (25, 50, 75):
+        threshold = np.percentile(single, q)
+        assert np.array_equal(batched > threshold, single > threshold), (metric, depth, q)
+
+def test_stacked_laplacian_matches_opencv_per_frame(tmp_path):
+    frames = read_frames(make_blur_clip(tmp_path / "clip.avi", frames=8))
+    expected = [cv2.Laplacian(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var() for frame in frames]
+    assert score_frames(np.array(frames)) == pytest.approx(expected, rel=1e-9)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from frame_extractor import SKETCH_BINS, SKETCH_GAMMA, BlurGate, ScoreSketch
+
+# A value is reported as the geometric middle of its bin
+RELATIVE_ERROR = SKETCH_GAMMA ** 0.5 - 1
+
+def sharpness_scores(count, seed=0):
+    # Laplacian variances span orders of magnitude; log-normal is a fair stand-in
+    return np.random.default_rng(seed).lognormal(mean=4.0, sigma=1.5, size=count)
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+def test_quantiles_match_numpy_within_documented_error(q):
+    scores = sharpness_scores(20000)
+    sketch = ScoreSketch()
+    for score in scores:
+        sketch.add(score)
+    exact = np.percentile(scores, q * 100, method="inverted_cdf")
+    assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ERROR)
+
+def test_merged_rows_cover_every_worker():
+    scores = sharpness_scores(9000, seed=1)
+    rows = np.zeros((3, SKETCH_BINS), np.int64)
+    for row, part in enumerate(np.array_split(scores, 3)):
+        sketch = ScoreSketch(rows, row)
+        for score in part:
+            sketch.add(score)
+    assert ScoreSketch(rows).quantile(0.5) == pytest.approx(np.percentile(scores, 50, method="inverted_cdf"), rel=RELATIVE_ERROR)
+    assert ScoreSketch(rows).total() == len(scores)
+
+def test_percentile_mode_keeps_the_requested_share():
+    scores = sharpness_scores(20000, seed=2)
+    gate = BlurGate(0.0, "percentile", keep_percent=30)
+    kept = np.array([gate.keep(score) for score in scores])
+    # The first samples are kept while the sketch warms up
+    assert kept[1000:].mean() == pytest.approx(0.30, abs=0.02)
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_extractor import ExtractionConfig, SharpnessScorer, extract_frames, frame_step, load_frame_index
+
+@pytest.fixture(scope="module")
+def blur_clip(tmp_path_factory):
+    # Sharp and blurred frames mixed, so a threshold keeps some of every segment
+    path = str(tmp_path_factory.mktemp("clip") / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("MJPG writer unavailable in this OpenCV build")
+    rng = np.random.default_rng(3)
+    base = cv2.resize(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8), (160, 120), interpolation=cv2.INTER_NEAREST)
+    for sigma in rng.uniform(0, 3, 600):
+        writer.write(base if sigma < 0.2 else cv2.GaussianBlur(base, (0, 0), sigma))
+    writer.release()
+    return path
+
+def sampled_scores(path, step):
+    cap = cv2.VideoCapture(path)
+    scorer = SharpnessScorer()
+    scores = []
+    frame_id = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_id % step == 0:
+            scores.append(scorer.score(frame))
+        frame_id += 1
+    cap.release()
+    return np.array(scores)
+
+@pytest.mark.parametrize("q", [30, 70])
+def test_topologies_save_the_same_frames(tmp_path, blur_clip, q):
+    threshold = float(np.percentile(sampled_scores(blur_clip, frame_step(30, 10)), q))
+    saved = {}
+    for name, multicore, topology in (("single", False, "seek"), ("seek", True, "seek"), ("ring", True, "ring")):
+        output_dir = str(tmp_path / name)
+        config = ExtractionConfig(video_path=blur_clip, output_dir=output_dir, fps=10, blur_threshold=threshold, output_format="npy",
+                                  use_multicore=multicore, worker_count=3, topology=topology, session_path=str(tmp_path / f"{name}.json"))
+        extract_frames(config)
+        saved[name] = sorted(load_frame_index(output_dir))
+    assert 0 < len(saved["single"]) < 200
+    assert saved["seek"] == saved["single"]
+    assert saved["ring"] == saved["single"]
@@ -0,0 +1,36 @@
+import multiprocessing as mp
+import os
+import time
+
+import pytest
+
+from frame_extractor import ProgressCallback, gather
+
+def test_gather_collects_reports():
+    results = mp.Queue()
+    processes = [mp.Process(target=results.put, args=(i,)) for i in range(3)]
+    for p in processes:
+        p.start()
+    assert sorted(gather(results, processes, 3)) == [0, 1, 2]
+    for p in processes:
+        p.join()
+
+def test_gather_raises_when_a_process_dies_without_reporting():
+    results = mp.Queue()
+    process = mp.Process(target=os._exit, args=(3,))
+    process.start()
+    with pytest.raises(ValueError, match="code 3"):
+        gather(results, [process], 1)
+    process.join()
+
+class Cancelled(ProgressCallback):
+    def cancelled(self):
+        return True
+
+def test_gather_stops_when_cancelled():
+    results = mp.Queue()
+    process = mp.Process(target=time.sleep, args=(30,))
+    process.start()
+    assert gather(results, [process], 1, Cancelled()) is None
+    process.terminate()
+    process.join()
@@ -0,0 +1,83 @@
+import errno
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from frame_extractor import FileStore, FrameEncoder, FrameIndex, FrameWriter, SessionCheckpoint, load_frame_index, load_session
+
+class FullDiskStore(FileStore):
+    # Writes fail for the given frames as they would on a full disk
+    def __init__(self, output_dir, failing=()):
+        super().__init__(output_dir, FrameEncoder("npy"))
+        self.failing = set(failing)
+
+    def write(self, frame_id, frame, backend, timestamp=None):
+        if frame_id in self.failing:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        return super().write(frame_id, frame, backend, timestamp)
+
+class GatedStore(FileStore):
+    # Holds every write until the test opens the gate
+    def __init__(self, output_dir):
+        super().__init__(output_dir, FrameEncoder("npy"))
+        self.gate = threading.Event()
+
+    def write(self, frame_id, frame, backend, timestamp=None):
+        self.gate.wait()
+        return super().write(frame_id, frame, backend, timestamp)
+
+def frame():
+    return np.zeros((48, 64, 3), np.uint8)
+
+def save_frames(writer, checkpoint, store, index, frame_ids):
+    for frame_id in frame_ids:
+        writer.submit(store, frame_id, frame(), {"id": frame_id}, index)
+        checkpoint.mark_done(frame_id, frame_id + 1, 1)
+
+def test_failed_write_raises_from_drain_and_checkpoint_does_not_advance(tmp_path):
+    store = FullDiskStore(str(tmp_path), failing={3})
+    index = FrameIndex(str(tmp_path))
+    writer = FrameWriter(threads=2)
+    path = str(tmp_path / "session.json")
+    checkpoint = SessionCheckpoint({"completed": [], "saved": 0}, path, interval_sec=3600, interval_frames=10 ** 9,
+                                   before_flush=writer.drain)
+    save_frames(writer, checkpoint, store, index, range(3))
+    checkpoint.flush()
+    assert load_session(path)["completed"] == [[0, 3]]
+
+    with pytest.raises(ValueError, match=r"1 frame\(s\) not written.*No space left"):
+        # Raised by the checkpoint, or earlier by a submit once the failure is seen
+        save_frames(writer, checkpoint, store, index, range(3, 6))
+        checkpoint.flush()
+    # The session on disk still ends before the frame that failed, so the next run redoes it
+    assert load_session(path)["completed"] == [[0, 3]]
+    assert writer.stats()["failed"] == 1
+    index.close()
+    assert 3 not in load_frame_index(str(tmp_path))
+
+def test_submit_stops_the_decoder_once_a_write_failed(tmp_path):
+    store = FullDiskStore(str(tmp_path), failing={0})
+    writer = FrameWriter(threads=1)
+    writer.submit(store, 0, frame())
+    deadline = time.time() + 10
+    while writer.failed == 0:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    with pytest.raises(ValueError, match="not written"):
+        writer.submit(store, 1, frame())
+
+def test_queue_blocks_the_decoder_at_the_memory_cap(tmp_path):
+    store = GatedStore(str(tmp_path))
+    writer = FrameWriter(threads=1, memory_cap=3 * frame().nbytes)
+    submitter = threading.Thread(target=lambda: [writer.submit(store, frame_id, frame()) for frame_id in range(10)])
+    submitter.start()
+    time.sleep(0.3)
+    # Three frames fit under the cap; the decoder waits on the fourth
+    assert submitter.is_alive()
+    assert writer.pending_frames == 3
+    store.gate.set()
+    submitter.join(10)
+    stats = writer.close()
+    assert stats["written"] == 10 and stats["max_depth"] == 3 and stats["stall"] > 0